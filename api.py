@@ -0,0 +1,195 @@
+# ----------------------------------------------------------------------------#
+# JSON API.
+# ----------------------------------------------------------------------------#
+"""Versioned JSON API for machine clients.
+
+Every list endpoint takes:
+
+* ``?fields=id,name`` -- return (and select) only these fields.
+* ``?ids=1,2,3`` -- fetch exactly these records, in one query.
+* ``?per_page=`` and ``?after=`` -- keyset pagination, ``after`` is the
+  ``next_cursor`` of the previous page.
+
+``/venues`` and ``/artists`` also take ``?genre=``, ``/shows`` takes
+``?from=`` and ``?to=`` like the HTML feed.
+"""
+
+import json
+
+from flask import Blueprint, Response, current_app, request
+from werkzeug.exceptions import BadRequest
+
+from models import Artist, Genre, Show, Venue, db
+from queries import after_cursor, encode_cursor, with_genre
+from views import parse_date
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+api = Blueprint("api", __name__, url_prefix="/api/v1")
+
+
+def dumps(payload):
+    """Serialize payload to JSON bytes, with orjson when it is installed"""
+    if orjson is not None:
+        return orjson.dumps(payload)
+    return json.dumps(
+        payload, separators=(",", ":"), default=lambda o: o.isoformat()
+    ).encode("utf-8")
+
+
+def _json(payload, status=200):
+    return Response(dumps(payload), status=status, mimetype="application/json")
+
+
+@api.errorhandler(BadRequest)
+def bad_request(error):
+    return _json({"error": error.description}, 400)
+
+
+def _fields(available, default):
+    """The fields asked for with ?fields=, id always included"""
+    fields = request.args.get("fields")
+    if not fields:
+        return default
+    fields = [f.strip() for f in fields.split(",") if f.strip()]
+    unknown = [f for f in fields if f not in available]
+    if unknown:
+        raise BadRequest(f"Unknown fields: {', '.join(unknown)}")
+    return ["id"] + [f for f in fields if f != "id"]
+
+
+def _ids():
+    """The ids asked for with ?ids=, or None"""
+    ids = request.args.get("ids")
+    if ids is None:
+        return None
+    try:
+        ids = [int(i) for i in ids.split(",") if i.strip()]
+    except ValueError:
+        raise BadRequest("ids must be a comma separated list of integers")
+    if len(ids) > current_app.config["API_PER_PAGE_MAX"]:
+        raise BadRequest(f"At most {current_app.config['API_PER_PAGE_MAX']} ids")
+    return ids
+
+
+def _per_page():
+    per_page = request.args.get(
+        "per_page", current_app.config["API_PER_PAGE"], type=int
+    )
+    return max(1, min(per_page, current_app.config["API_PER_PAGE_MAX"]))
+
+
+def _date(name):
+    value = request.args.get(name)
+    if value is None:
+        return None
+    try:
+        return parse_date(value)
+    except ValueError:
+        raise BadRequest(f"{name} must be an ISO 8601 date")
+
+
+def _page(query, per_page, *order):
+    """Run query for one page, and the cursor of the page after it"""
+    rows = query.limit(per_page + 1).all()
+    page = rows[:per_page]
+    cursor = None
+    if len(rows) > per_page:
+        cursor = encode_cursor(*(getattr(page[-1], c.key) for c in order))
+    return page, cursor
+
+
+def _genres_of(model, ids):
+    """{id: [genre names]} for the given ids of model, in one query"""
+    association = model.genre_list.property.secondary
+    owner_id = association.c[f"{model.__tablename__}_id"]
+    genres = {id: [] for id in ids}
+    rows = (
+        db.session.query(owner_id, Genre.name)
+        .join(Genre, Genre.id == association.c.genre_id)
+        .filter(owner_id.in_(ids))
+        .order_by(Genre.name)
+    )
+    for id, name in rows:
+        genres[id].append(name)
+    return genres
+
+
+def _entities(model):
+    """List endpoint shared by venues and artists"""
+    columns = {c.key: getattr(model, c.key) for c in model.__table__.columns}
+    fields = _fields(set(columns) | {"genres"}, ["id", "name", "city", "state"])
+    query = db.session.query(*(columns[f] for f in fields if f in columns))
+    query = with_genre(query, model, request.args.get("genre"))
+    ids = _ids()
+    if ids is not None:
+        query = query.filter(model.id.in_(ids))
+    after = request.args.get("after")
+    if after:
+        query = after_cursor(query, after, model.id)
+    rows, cursor = _page(query.order_by(model.id), _per_page(), model.id)
+    data = [row._asdict() for row in rows]
+    if "genres" in fields:
+        genres = _genres_of(model, [d["id"] for d in data])
+        for d in data:
+            d["genres"] = genres[d["id"]]
+    return _json({"data": data, "next_cursor": cursor})
+
+
+@api.route("/venues")
+def venues():
+    return _entities(Venue)
+
+
+@api.route("/artists")
+def artists():
+    return _entities(Artist)
+
+
+# Fields of a show that live on its venue or artist
+SHOW_JOINED_FIELDS = {
+    "venue_name": Venue.name,
+    "venue_image_link": Venue.image_link,
+    "artist_name": Artist.name,
+    "artist_image_link": Artist.image_link,
+}
+
+
+@api.route("/shows")
+def shows():
+    columns = {c.key: getattr(Show, c.key) for c in Show.__table__.columns}
+    available = {**columns, **SHOW_JOINED_FIELDS}
+    fields = _fields(
+        set(available),
+        ["id", "venue_id", "venue_name", "artist_id", "artist_name", "start_time"],
+    )
+    # The keyset needs start_time even if the client did not ask for it
+    selected = fields + (["start_time"] if "start_time" not in fields else [])
+    query = db.session.query(*(available[f].label(f) for f in selected))
+    if any(f.startswith("venue_") and f != "venue_id" for f in fields):
+        query = query.outerjoin(Venue, Venue.id == Show.venue_id)
+    if any(f.startswith("artist_") and f != "artist_id" for f in fields):
+        query = query.outerjoin(Artist, Artist.id == Show.artist_id)
+    query = query.filter(Show.start_time.isnot(None))
+    ids = _ids()
+    if ids is not None:
+        query = query.filter(Show.id.in_(ids))
+    start, end = _date("from"), _date("to")
+    if start is not None:
+        query = query.filter(Show.start_time >= start)
+    if end is not None:
+        query = query.filter(Show.start_time < end)
+    after = request.args.get("after")
+    if after:
+        query = after_cursor(query, after, Show.start_time, Show.id)
+    rows, cursor = _page(
+        query.order_by(Show.start_time, Show.id),
+        _per_page(),
+        Show.start_time,
+        Show.id,
+    )
+    data = [{f: getattr(row, f) for f in fields} for row in rows]
+    return _json({"data": data, "next_cursor": cursor})
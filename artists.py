@@ -0,0 +1,185 @@
+# ----------------------------------------------------------------------------#
+# Artists.
+# ----------------------------------------------------------------------------#
+"""The artist pages and forms, the ``artists`` blueprint."""
+
+from flask import (
+    Blueprint,
+    current_app,
+    flash,
+    redirect,
+    render_template,
+    request,
+    url_for,
+)
+
+from cache import page_cache
+from models import Artist, Show, db
+from queries import (
+    artist_list_query,
+    counterpart_ids,
+    detail_page,
+    detail_statements,
+    fetch_all,
+    search_results,
+)
+from search import search_engine
+from views import (
+    as_dict,
+    indexes_changed,
+    not_found_error,
+    pages_changed,
+    past_shows_since,
+)
+
+artist_pages = Blueprint("artists", __name__)
+
+
+@artist_pages.route("/artists")
+def artists():
+    data = [
+        {
+            "id": a["id"],
+            "name": a["name"],
+        }
+        for a in db.session.execute(artist_list_query(request.args.get("genre")))
+    ]
+    return render_template("pages/artists.html", artists=data)
+
+
+@artist_pages.route("/artists/search", methods=["POST"])
+def search_artists():
+    search_term = request.form.get("search_term", "")
+    response = search_results(
+        Artist,
+        search_engine.matches(Artist, search_term),
+        limit=request.args.get("limit", type=int),
+        offset=request.args.get("offset", 0, type=int),
+    )
+    return render_template(
+        "pages/search_artists.html",
+        results=response,
+        search_term=request.form.get("search_term", ""),
+    )
+
+
+@artist_pages.route("/artists/<int:artist_id>")
+@page_cache.cached("artist", "artist_id")
+def show_artist(artist_id):
+    # shows the artist page with the given artist_id
+    since = past_shows_since()
+    statements = detail_statements(
+        "artist",
+        artist_id,
+        past_limit=current_app.config["PAST_SHOWS_LIMIT"],
+        past_since=since,
+    )
+    data = detail_page("artist", fetch_all(statements), since)
+    if data is None:
+        return not_found_error(f"Artist with id {artist_id} not found")
+    return render_template("pages/show_artist.html", artist=data)
+
+
+#  Update
+#  ----------------------------------------------------------------
+
+
+@artist_pages.route("/artists/<int:artist_id>/edit", methods=["GET"])
+def edit_artist(artist_id):
+    from forms import ArtistForm
+
+    artist = Artist.query.get(artist_id)
+    if artist is None:
+        return not_found_error(f"Artist with id {artist_id} not found")
+    form = ArtistForm(obj=artist)
+    return render_template("forms/edit_artist.html", form=form, artist=artist)
+
+
+@artist_pages.route("/artists/<int:artist_id>/edit", methods=["POST"])
+def edit_artist_submission(artist_id):
+    from forms import ArtistForm
+
+    artist = Artist.query.get(artist_id)
+    if artist is None:
+        return not_found_error(f"Artist with id {artist_id} not found")
+    form = ArtistForm(data=as_dict(artist))
+    form.populate_obj(artist)
+    try:
+        db.session.add(artist)
+        # The artist's name and image also show on the pages of its venues
+        pages_changed("artist", artist_id, counterparts=True)
+        indexes_changed("artist", artist_id)
+        db.session.commit()
+        flash("Artist " + request.form["name"] + " was successfully edited!")
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.info(e)
+        flash(
+            f'An error occurred. Edited artist {request.form["name"]} could not be saved.',
+            "error",
+        )
+    return redirect(url_for(".show_artist", artist_id=artist_id))
+
+
+#  Create Artist
+#  ----------------------------------------------------------------
+
+
+@artist_pages.route("/artists/create", methods=["GET"])
+def create_artist_form():
+    from forms import NewArtistForm
+
+    form = NewArtistForm()
+    return render_template("forms/new_artist.html", form=form)
+
+
+@artist_pages.route("/artists/create", methods=["POST"])
+def create_artist_submission():
+    # called upon submitting the new artist listing form
+    from forms import NewArtistForm
+
+    form = NewArtistForm()
+    artist = Artist()
+    form.populate_obj(artist)
+    try:
+        db.session.add(artist)
+        db.session.flush()
+        indexes_changed("artist", artist.id)
+        db.session.commit()
+        # on successful db insert, flash success
+        flash("Artist was successfully listed!")
+    except Exception as e:
+        current_app.logger.warn(e)
+        flash("Artist was not successfully listed!", "error")
+        db.session.rollback()
+    return render_template("pages/home.html")
+
+
+#  Delete Artist
+#  ----------------------------------------------------------------
+
+
+@artist_pages.route("/artists/<artist_id>", methods=["DELETE"])
+def delete_artist(artist_id):
+    artist = Artist.query.get(artist_id)
+    if artist is None:
+        return not_found_error(f"Artist with id {artist_id} not found")
+    venue_ids = counterpart_ids(Show.artist_id, Show.venue_id, artist.id)
+    try:
+        db.session.delete(artist)
+        pages_changed("artist", artist.id)
+        pages_changed("venue", *venue_ids)
+        indexes_changed("artist", artist.id)
+        db.session.commit()
+        flash("Artist " + request.form["name"] + " was successfully deleted!")
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.info(e)
+        flash(
+            f'An error occurred. Artist {request.form["name"]} could not be deleted.',
+            "error",
+        )
+
+    # A response, so that the deleting client is pinned to the primary; 303 as
+    # a 302 would be followed with DELETE
+    return redirect(url_for("index"), 303)
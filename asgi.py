@@ -0,0 +1,358 @@
+# ----------------------------------------------------------------------------#
+# ASGI entry point.
+# ----------------------------------------------------------------------------#
+"""Serve the app over ASGI, e.g. ``uvicorn asgi:application``.
+
+The read routes (the venue and artist listings, searches and detail pages)
+are served with async database access through the ``databases`` package,
+asyncpg on PostgreSQL and aiosqlite on SQLite, so one worker keeps serving
+other requests while these wait on the database.  Their views are generators
+that yield ``{name: statement}`` and get ``{name: rows}`` back; the statements
+of one yield run concurrently, e.g. the venue or artist with its shows and
+its genres on a detail page.  They build on the same statements
+(``queries.py``), templates, page cache, replicas and SQL metrics as the
+Flask views.
+
+Every other route, the forms included, runs through the Flask (WSGI) app on a
+pool of ``ASGI_THREADS`` threads.  ``python app.py runserver`` keeps serving
+everything over WSGI as before.
+"""
+
+import asyncio
+import io
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from flask import current_app, g, render_template, request
+from sqlalchemy.engine.url import make_url
+from werkzeug.exceptions import HTTPException
+
+from app import create_app
+from cache import page_cache
+from models import Artist, Venue
+from queries import (
+    artist_list_query,
+    detail_page,
+    detail_statements,
+    group_areas,
+    search_page,
+    search_statements,
+    venue_areas_query,
+)
+from routing import current_replica
+from search import search_engine
+from views import not_found_error, past_shows_since
+
+# ----------------------------------------------------------------------------#
+# Read views, by endpoint.
+# ----------------------------------------------------------------------------#
+
+VIEWS = {}
+
+
+def read_view(endpoint):
+    """Serve the Flask endpoint with the decorated generator view"""
+
+    def decorator(view):
+        VIEWS[endpoint] = view
+        return view
+
+    return decorator
+
+
+@read_view("venues.venues")
+def venues():
+    rows = yield {"areas": venue_areas_query(request.args.get("genre"))}
+    return render_template("pages/venues.html", areas=group_areas(rows["areas"]))
+
+
+def _search(model, template):
+    search_term = request.form.get("search_term", "")
+    offset = request.args.get("offset", 0, type=int)
+    page, count = search_statements(
+        model,
+        search_engine.matches(model, search_term),
+        limit=request.args.get("limit", type=int),
+        offset=offset,
+    )
+    rows = (yield {"page": page})["page"]
+    total = 0
+    if not rows and offset:
+        total = (yield {"count": count})["count"][0]["total"]
+    return render_template(
+        template, results=search_page(rows, total), search_term=search_term
+    )
+
+
+@read_view("venues.search_venues")
+def search_venues():
+    return (yield from _search(Venue, "pages/search_venues.html"))
+
+
+@read_view("artists.artists")
+def artists():
+    rows = yield {"artists": artist_list_query(request.args.get("genre"))}
+    data = [{"id": a["id"], "name": a["name"]} for a in rows["artists"]]
+    return render_template("pages/artists.html", artists=data)
+
+
+@read_view("artists.search_artists")
+def search_artists():
+    return (yield from _search(Artist, "pages/search_artists.html"))
+
+
+def _detail(kind, owner_id, template):
+    cacheable = page_cache.cacheable()
+    if cacheable:
+        page = page_cache.lookup(kind, owner_id)
+        if page is not None:
+            return page
+    since = past_shows_since()
+    statements = detail_statements(
+        kind,
+        owner_id,
+        past_limit=current_app.config["PAST_SHOWS_LIMIT"],
+        past_since=since,
+    )
+    data = detail_page(kind, (yield statements), since)
+    if data is None:
+        return not_found_error(f"{kind.title()} with id {owner_id} not found")
+    page = render_template(template, **{kind: data})
+    if cacheable:
+        page_cache.store(kind, owner_id, page)
+    return page
+
+
+@read_view("venues.show_venue")
+def show_venue(venue_id):
+    return (yield from _detail("venue", venue_id, "pages/show_venue.html"))
+
+
+@read_view("artists.show_artist")
+def show_artist(artist_id):
+    return (yield from _detail("artist", artist_id, "pages/show_artist.html"))
+
+
+# ----------------------------------------------------------------------------#
+# ASGI application.
+# ----------------------------------------------------------------------------#
+
+
+def _environ(scope, body):
+    """The WSGI environ of an ASGI http request"""
+    server = scope.get("server") or ("localhost", 80)
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", "").encode("utf-8").decode("latin-1"),
+        "PATH_INFO": scope["path"].encode("utf-8").decode("latin-1"),
+        "QUERY_STRING": scope["query_string"].decode("latin-1"),
+        "SERVER_NAME": server[0],
+        "SERVER_PORT": str(server[1]),
+        "SERVER_PROTOCOL": f"HTTP/{scope.get('http_version', '1.1')}",
+        "REMOTE_ADDR": (scope.get("client") or ("", 0))[0],
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": io.BytesIO(body),
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": True,
+        "wsgi.run_once": False,
+    }
+    for name, value in scope["headers"]:
+        name = name.decode("latin-1").upper().replace("-", "_")
+        if name not in ("CONTENT_TYPE", "CONTENT_LENGTH"):
+            name = f"HTTP_{name}"
+        value = value.decode("latin-1")
+        environ[name] = f"{environ[name]},{value}" if name in environ else value
+    return environ
+
+
+@contextmanager
+def _pushed(app_ctx, request_ctx):
+    """Push the contexts of a request for one synchronous stretch of its view.
+
+    Flask's context locals are per thread, so the contexts must never stay
+    pushed across an await; the app context, and with it ``g``, carries over
+    from one stretch to the next.
+    """
+    app_ctx.push()
+    request_ctx.push()
+    try:
+        yield
+    finally:
+        request_ctx.pop()
+        app_ctx.pop()
+
+
+def _materialize(response):
+    """(status, headers, body) of a WSGI response"""
+    try:
+        return response.status_code, response.headers.to_wsgi_list(), response.data
+    finally:
+        response.close()
+
+
+class ASGIApp:
+    """The Flask app behind an ASGI interface, with async read views"""
+
+    def __init__(self, app, views):
+        self.app = app
+        self.views = views
+        self.databases = {}
+        self._connecting = None
+        self._executor = ThreadPoolExecutor(
+            app.config.get("ASGI_THREADS", 10), thread_name_prefix="wsgi"
+        )
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            return await self._lifespan(receive, send)
+        if scope["type"] != "http":
+            raise RuntimeError(f"Unsupported ASGI scope {scope['type']}")
+        body = b""
+        while True:
+            message = await receive()
+            body += message.get("body", b"")
+            if not message.get("more_body"):
+                break
+        environ = _environ(scope, body)
+        try:
+            endpoint, args = self.app.url_map.bind_to_environ(environ).match()
+        except HTTPException:
+            # Not found, not allowed or a redirect: Flask has its answers
+            endpoint, args = None, {}
+        view = self.views.get(endpoint)
+        if view is None:
+            loop = asyncio.get_running_loop()
+            status, headers, body = await loop.run_in_executor(
+                self._executor, self._call_wsgi, environ
+            )
+        else:
+            status, headers, body = await self._dispatch(view, args, environ)
+        await send(
+            {
+                "type": "http.response.start",
+                "status": status,
+                "headers": [
+                    (k.encode("latin-1"), v.encode("latin-1")) for k, v in headers
+                ],
+            }
+        )
+        await send({"type": "http.response.body", "body": body})
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await self._connect()
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                for database in self.databases.values():
+                    await database.disconnect()
+                self._executor.shutdown()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def _connect(self):
+        """Connect to the primary and the replicas, once"""
+        if self._connecting is None:
+            self._connecting = asyncio.ensure_future(self._open_databases())
+        await self._connecting
+
+    async def _open_databases(self):
+        try:
+            from databases import Database
+        except ImportError:
+            raise RuntimeError(
+                "asgi.py needs the databases package, with asyncpg or aiosqlite"
+            )
+        config = self.app.config
+        uris = {None: config["SQLALCHEMY_DATABASE_URI"]}
+        uris.update(config.get("SQLALCHEMY_BINDS") or {})
+        for bind, uri in uris.items():
+            options, url = {}, make_url(uri)
+            if url.drivername.startswith("postgresql"):
+                options["max_size"] = config["DB_POOL_SIZE"]
+                # e.g. the socket directory, which asyncpg takes as a keyword
+                if "host" in url.query:
+                    options["host"] = url.query["host"]
+                if config["DB_STATEMENT_TIMEOUT"]:
+                    options["server_settings"] = {
+                        "statement_timeout": str(int(config["DB_STATEMENT_TIMEOUT"]))
+                    }
+            database = Database(uri, **options)
+            await database.connect()
+            self.databases[bind] = database
+
+    def _call_wsgi(self, environ):
+        """Run one request through the Flask app, in a pool thread"""
+        started = {}
+
+        def start_response(status, headers, exc_info=None):
+            started["status"], started["headers"] = int(status.split()[0]), headers
+
+        chunks = self.app(environ, start_response)
+        try:
+            body = b"".join(chunks)
+        finally:
+            if hasattr(chunks, "close"):
+                chunks.close()
+        return started["status"], started["headers"], body
+
+    async def _fetch(self, bind, statements):
+        """Run the statements concurrently, returns ({name: rows}, timings)"""
+        await self._connect()
+        database = self.databases[bind]
+
+        async def fetch(statement):
+            started = time.perf_counter()
+            rows = await database.fetch_all(statement)
+            return rows, time.perf_counter() - started
+
+        # Each task gets its own connection from the pool
+        done = await asyncio.gather(*(fetch(s) for s in statements.values()))
+        results = {name: rows for name, (rows, _) in zip(statements, done)}
+        timings = [(s, seconds) for s, (_, seconds) in zip(statements.values(), done)]
+        return results, timings
+
+    async def _dispatch(self, view, args, environ):
+        """Run a read view like Flask would, awaiting the statements it yields"""
+        app_ctx = self.app.app_context()
+        request_ctx = self.app.request_context(environ)
+        steps, sent, error, timings = None, None, None, []
+        while True:
+            with _pushed(app_ctx, request_ctx):
+                try:
+                    stats = g.get("sql_stats")
+                    if stats is not None:
+                        for statement, seconds in timings:
+                            stats.record(str(statement), seconds)
+                    try:
+                        rv = None
+                        if steps is None:
+                            rv = self.app.preprocess_request()
+                            if rv is None:
+                                steps = view(**args)
+                        if rv is None:
+                            statements = (
+                                steps.throw(error) if error else steps.send(sent)
+                            )
+                            bind = current_replica()
+                    except StopIteration as stop:
+                        rv = stop.value
+                    except Exception as e:
+                        rv = self.app.handle_user_exception(e)
+                    if rv is not None:
+                        return _materialize(self.app.finalize_request(rv))
+                except Exception as e:
+                    return _materialize(self.app.handle_exception(e))
+            try:
+                sent, timings = await self._fetch(bind, statements)
+                error = None
+            except Exception as e:
+                sent, timings, error = None, [], e
+
+
+application = ASGIApp(create_app(), VIEWS)
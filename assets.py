@@ -0,0 +1,262 @@
+# ----------------------------------------------------------------------------#
+# Static assets.
+# ----------------------------------------------------------------------------#
+"""Fingerprinted, precompressed static assets.
+
+``python app.py assets build`` writes to ``static/dist``:
+
+* every entry of ``BUNDLES``, its source files concatenated and minified,
+* a copy of every other file under ``static/``,
+
+each named after a hash of its content (``bundles/main.3f2a9c1e0b7d.css``), with
+a ``.gz`` (and a ``.br`` when the ``brotli`` package is installed) next to
+every compressible one, and ``manifest.json`` mapping the source names to the
+built ones.  Files of earlier builds are kept, pages rendered before a deploy
+keep finding their assets.
+
+Templates link assets through ``asset_urls(bundle)`` and ``asset_url(path)``.
+With a manifest these point at ``/assets/<built name>``, served in the best
+precompressed encoding the client accepts with ``Cache-Control: immutable``,
+so repeat visitors request no assets at all.  Without one, e.g. in a fresh
+checkout, they point at the source files under ``/static``.
+"""
+
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import posixpath
+import re
+
+from flask import abort, current_app, request, send_file, url_for
+from flask_script import Command, Manager, Option
+from werkzeug.security import safe_join
+
+# Bundles by name, and their source files in order, relative to static/.
+# Bundle names must not clash with a file under static/.
+BUNDLES = {
+    "bundles/main.css": [
+        "css/bootstrap.min.css",
+        "css/layout.main.css",
+        "css/main.css",
+        "css/main.responsive.css",
+        "css/main.quickfix.css",
+    ],
+    "bundles/head.js": ["js/libs/modernizr-2.8.2.min.js", "js/libs/moment.min.js"],
+    "bundles/main.js": [
+        "js/script.js",
+        "js/libs/bootstrap-3.1.1.min.js",
+        "js/plugins.js",
+    ],
+}
+
+# Worth compressing; images and woff fonts are compressed already
+COMPRESSIBLE = {".css", ".js", ".map", ".json", ".svg", ".eot", ".ttf", ".otf"}
+
+MANIFEST = "manifest.json"
+
+_CSS_COMMENT = re.compile(r"/\*.*?\*/", re.DOTALL)
+_CSS_SPACE = re.compile(r"\s+")
+_CSS_PUNCTUATION = re.compile(r"\s*([{};,>])\s*")
+_CSS_URL = re.compile(r"""url\(\s*(['"]?)([^'")]+)\1\s*\)""")
+
+
+def minify_css(text):
+    """Drop the comments and the whitespace CSS does not need"""
+    text = _CSS_COMMENT.sub("", text)
+    text = _CSS_SPACE.sub(" ", text)
+    text = _CSS_PUNCTUATION.sub(r"\1", text)
+    return text.replace(": ", ":").replace(";}", "}").strip()
+
+
+def minify_js(text):
+    """Drop indentation, blank lines and whole line comments.
+
+    Deliberately conservative: without a parser anything more could break a
+    string or a regex.  The libraries ship minified already.
+    """
+    lines = (line.strip() for line in text.splitlines())
+    return "\n".join(line for line in lines if line and not line.startswith("//"))
+
+
+def _compress(data):
+    """{suffix: compressed data} of the encodings that make data smaller"""
+    variants = {".gz": gzip.compress(data, compresslevel=9, mtime=0)}
+    try:
+        import brotli
+    except ImportError:
+        pass
+    else:
+        variants[".br"] = brotli.compress(data, quality=11)
+    return {suffix: v for suffix, v in variants.items() if len(v) < len(data)}
+
+
+class Builder:
+    """Writes the fingerprinted files and the manifest of one build"""
+
+    def __init__(self, source, output, url_path):
+        self.source = source
+        self.output = output
+        self.url_path = url_path
+        self.manifest = {}
+
+    def write(self, name, data):
+        """Store data as the fingerprinted copy of name, returns the built name"""
+        root, ext = posixpath.splitext(name)
+        built = f"{root}.{hashlib.sha256(data).hexdigest()[:12]}{ext}"
+        path = os.path.join(self.output, *built.split("/"))
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            variants = _compress(data) if ext in COMPRESSIBLE else {}
+            # The plain file last: if it exists, so do its variants
+            for suffix, variant in variants.items():
+                with open(path + suffix, "wb") as f:
+                    f.write(variant)
+            with open(path, "wb") as f:
+                f.write(data)
+        self.manifest[name] = built
+        return built
+
+    def _read(self, name):
+        with open(os.path.join(self.source, *name.split("/")), "rb") as f:
+            return f.read()
+
+    def _rebase_urls(self, name, css):
+        """Point the relative url()s of a source CSS file at the built files"""
+
+        def rebase(match):
+            url = match.group(2)
+            if re.match(r"([a-z]+:|/|#)", url):
+                return match.group(0)
+            path, sep, rest = (re.split(r"([?#])", url, maxsplit=1) + ["", ""])[:3]
+            target = posixpath.normpath(posixpath.join(posixpath.dirname(name), path))
+            if target in self.manifest:
+                return f'url("{self.url_path}/{self.manifest[target]}{sep}{rest}")'
+            return f'url("/static/{target}{sep}{rest}")'
+
+        return _CSS_URL.sub(rebase, css)
+
+    def bundle(self, name, sources):
+        """Concatenate and minify the sources of a bundle"""
+        texts = [self._read(source).decode("utf-8") for source in sources]
+        if name.endswith(".css"):
+            texts = [self._rebase_urls(s, t) for s, t in zip(sources, texts)]
+            return "\n".join(minify_css(t) for t in texts).encode("utf-8")
+        # Guard against sources that end without a semicolon
+        return "\n;\n".join(minify_js(t) for t in texts).encode("utf-8")
+
+    def build(self):
+        # Every static file first, so the bundles can point at their copies
+        output = os.path.abspath(self.output)
+        for folder, dirs, files in os.walk(self.source):
+            dirs[:] = sorted(
+                d
+                for d in dirs
+                if not d.startswith(".")
+                and os.path.abspath(os.path.join(folder, d)) != output
+            )
+            for filename in sorted(files):
+                if filename.startswith("."):
+                    continue
+                path = os.path.join(folder, filename)
+                name = os.path.relpath(path, self.source).replace(os.sep, "/")
+                self.write(name, self._read(name))
+        for name, sources in BUNDLES.items():
+            self.write(name, self.bundle(name, sources))
+        with open(os.path.join(self.output, MANIFEST), "w") as f:
+            json.dump(self.manifest, f, indent=2, sort_keys=True)
+        return self.manifest
+
+
+class Assets:
+    """Flask extension serving the built assets and linking them in templates"""
+
+    def __init__(self, app=None):
+        self.folder = None
+        self.url_path = "/assets"
+        self.max_age = 365 * 24 * 3600
+        self.manifest = {}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault("ASSETS_FOLDER", os.path.join(app.static_folder, "dist"))
+        app.config.setdefault("ASSETS_URL_PATH", "/assets")
+        app.config.setdefault("ASSETS_MAX_AGE", 365 * 24 * 3600)
+        self.folder = app.config["ASSETS_FOLDER"]
+        self.url_path = app.config["ASSETS_URL_PATH"]
+        self.max_age = app.config["ASSETS_MAX_AGE"]
+        self.reload()
+        app.add_url_rule(f"{self.url_path}/<path:filename>", "assets", self.serve)
+        app.jinja_env.globals.update(asset_url=self.url, asset_urls=self.urls)
+        app.extensions["assets"] = self
+
+    def reload(self):
+        """Read the manifest of the last build, if there is one"""
+        try:
+            with open(os.path.join(self.folder, MANIFEST)) as f:
+                self.manifest = json.load(f)
+        except FileNotFoundError:
+            self.manifest = {}
+
+    def build(self, app):
+        """Build the assets of app's static folder, and use them"""
+        manifest = Builder(app.static_folder, self.folder, self.url_path).build()
+        self.reload()
+        return manifest
+
+    def url(self, name):
+        """URL of the static file name, fingerprinted once built"""
+        if name in self.manifest:
+            return url_for("assets", filename=self.manifest[name])
+        return url_for("static", filename=name)
+
+    def urls(self, bundle):
+        """URLs to load a bundle from: the built bundle, or all of its sources"""
+        if bundle in self.manifest:
+            return [self.url(bundle)]
+        return [url_for("static", filename=source) for source in BUNDLES[bundle]]
+
+    def serve(self, filename):
+        path = safe_join(self.folder, filename)
+        if path is None or not os.path.isfile(path):
+            abort(404)
+        mimetype = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+        for encoding, suffix in (("br", ".br"), ("gzip", ".gz")):
+            if request.accept_encodings[encoding] and os.path.isfile(path + suffix):
+                response = send_file(path + suffix, mimetype=mimetype, conditional=True)
+                response.headers["Content-Encoding"] = encoding
+                break
+        else:
+            response = send_file(path, mimetype=mimetype, conditional=True)
+        response.headers["Vary"] = "Accept-Encoding"
+        # The name changes with the content, so it never needs revalidating
+        response.headers["Cache-Control"] = f"public, max-age={self.max_age}, immutable"
+        return response
+
+
+static_assets = Assets()
+
+# ----------------------------------------------------------------------------#
+# Commands, registered as "python app.py assets ..."
+# ----------------------------------------------------------------------------#
+
+
+class Build(Command):
+    """Bundle, fingerprint and precompress the static files"""
+
+    option_list = (
+        Option("--quiet", action="store_true", help="do not list the files"),
+    )
+
+    def run(self, quiet):
+        manifest = static_assets.build(current_app)
+        if not quiet:
+            for name in BUNDLES:
+                print(f"{name} -> {manifest[name]}")
+        print(f"Built {len(manifest)} assets into {static_assets.folder}")
+
+
+commands = Manager(usage="Build the static assets")
+commands.add_command("build", Build())
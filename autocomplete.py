@@ -0,0 +1,286 @@
+# ----------------------------------------------------------------------------#
+# Autocomplete.
+# ----------------------------------------------------------------------------#
+"""Type-ahead suggestions of venue and artist names.
+
+``/autocomplete?q=&type=venue|artist`` is answered from an index held in the
+process, not the database: a sorted list with an entry per word a name can
+be typed from ("The Blue Lounge" is found by "the b", "blue l" and "lou"),
+searched with bisect.  Suggestions are ranked by upcoming show count, at
+most ``AUTOCOMPLETE_LIMIT`` of them.
+
+* The best ids of every prefix matching more than ``SCAN_LIMIT`` entries are
+  kept, computed from those of the longer prefixes, and any other prefix
+  ranks its few entries on the spot: a lookup takes microseconds however
+  short the prefix is.
+* The index is read in one pass over the venues and artists, in the
+  background, when a process serves its first request, and read again every
+  ``AUTOCOMPLETE_REFRESH`` seconds to pick up the counts the sweep moved and
+  the writes of other processes.
+* The create, edit and delete routes have ``autocomplete.changed(kind,
+  *ids)`` called after they commit, by a job on a thread of this process,
+  which updates its index.
+* Its approximate size in bytes is served at ``/metrics``
+  (``fyyur_autocomplete_bytes``).
+"""
+
+import bisect
+import heapq
+import re
+import sys
+import threading
+from array import array
+
+from flask import jsonify, request
+
+from counters import upcoming_column
+from inprocess import ProcessIndex
+from metrics import Gauge, sql_metrics
+from models import Artist, ShowCount, Venue, db
+
+MODELS = {"venue": Venue, "artist": Artist}
+
+# Prefixes matching at most this many entries are ranked by scanning them
+SCAN_LIMIT = 64
+
+_WORD = re.compile(r"\w+", re.UNICODE)
+# Sorts after every key starting with a given prefix
+_LAST = chr(sys.maxunicode)
+
+
+def normalize(text):
+    """text casefolded, its words separated by single spaces"""
+    return " ".join(_WORD.findall((text or "").casefold()))
+
+
+def keys(name):
+    """The index entries of a name: its normalized text from each word on"""
+    words = _WORD.findall((name or "").casefold())
+    return {" ".join(words[i:]) for i in range(len(words))}
+
+
+class PrefixIndex:
+    """The names of one kind by every word they start at, best first per prefix"""
+
+    def __init__(self, size=10):
+        self.size = size
+        self._keys = []  # sorted
+        self._ids = array("q")  # the id of each key
+        self._names = {}
+        self._upcoming = {}
+        self._best = {}  # prefix -> the best ids starting with it, if many do
+        self._bytes = None
+        self._lock = threading.RLock()
+
+    @classmethod
+    def build(cls, rows, size=10):
+        """An index of (id, name, upcoming show count) rows"""
+        index = cls(size)
+        entries = []
+        for id, name, upcoming in rows:
+            index._names[id] = name
+            index._upcoming[id] = upcoming
+            entries.extend((key, id) for key in keys(name))
+        entries.sort()
+        index._keys = [key for key, _ in entries]
+        index._ids = array("q", (id for _, id in entries))
+        index._top("", 0, len(entries))
+        return index
+
+    def __len__(self):
+        return len(self._names)
+
+    def _rank(self, id):
+        return -self._upcoming[id], self._names[id], id
+
+    def _top(self, prefix, lo, hi):
+        """The best ids of the entries lo:hi, all of which start with prefix"""
+        if hi - lo <= SCAN_LIMIT:
+            return heapq.nsmallest(self.size, set(self._ids[lo:hi]), key=self._rank)
+        best = self._best.get(prefix)
+        if best is not None:
+            return best
+        # The best of each longer prefix are the only candidates
+        candidates = set()
+        depth = len(prefix)
+        i = lo
+        while i < hi:
+            key = self._keys[i]
+            if len(key) == depth:
+                j = bisect.bisect_right(self._keys, key, i, hi)
+                candidates.update(self._ids[i:j])
+            else:
+                longer = key[: depth + 1]
+                j = bisect.bisect_left(self._keys, longer + _LAST, i, hi)
+                candidates.update(self._top(longer, i, j))
+            i = j
+        best = heapq.nsmallest(self.size, candidates, key=self._rank)
+        self._best[prefix] = best
+        return best
+
+    def search(self, text, limit=None):
+        """[(id, name, upcoming)] of the best names with a word starting with text"""
+        prefix = normalize(text)
+        if not prefix:
+            return []
+        with self._lock:
+            lo = bisect.bisect_left(self._keys, prefix)
+            hi = bisect.bisect_left(self._keys, prefix + _LAST, lo)
+            return [
+                (id, self._names[id], self._upcoming[id])
+                for id in self._top(prefix, lo, hi)[:limit]
+            ]
+
+    def _kept(self, key):
+        """The prefixes of key whose best ids are kept"""
+        return [p for p in (key[:n] for n in range(len(key) + 1)) if p in self._best]
+
+    def _offer(self, id):
+        """Rank id, new or with more upcoming shows, into the kept prefixes"""
+        rank = self._rank(id)
+        for key in keys(self._names[id]):
+            for prefix in self._kept(key):
+                best = self._best[prefix]
+                if id not in best:
+                    if len(best) == self.size and rank > self._rank(best[-1]):
+                        continue
+                    best.append(id)
+                best.sort(key=self._rank)
+                del best[self.size :]
+
+    def _forget(self, id):
+        """Drop the kept prefixes that rank id, they are worked out again"""
+        for key in keys(self._names[id]):
+            for prefix in self._kept(key):
+                if id in self._best[prefix]:
+                    del self._best[prefix]
+
+    def put(self, id, name, upcoming):
+        """Add a venue or artist, or update its name and upcoming show count"""
+        with self._lock:
+            if self._names.get(id) == name:
+                if upcoming < self._upcoming[id]:
+                    self._forget(id)
+                self._upcoming[id] = upcoming
+                self._offer(id)
+                return
+            if id in self._names:
+                self.remove(id)
+            self._names[id] = name
+            self._upcoming[id] = upcoming
+            for key in keys(name):
+                i = bisect.bisect_right(self._keys, key)
+                self._keys.insert(i, key)
+                self._ids.insert(i, id)
+            self._offer(id)
+            self._bytes = None
+
+    def remove(self, id):
+        """Drop a venue or artist, if it is indexed"""
+        with self._lock:
+            if id not in self._names:
+                return
+            self._forget(id)
+            for key in keys(self._names[id]):
+                i = bisect.bisect_left(self._keys, key)
+                while self._ids[i] != id:
+                    i += 1
+                del self._keys[i]
+                del self._ids[i]
+            del self._names[id]
+            del self._upcoming[id]
+            self._bytes = None
+
+    def footprint(self):
+        """Approximate bytes held by the index, counted again after a change"""
+        with self._lock:
+            if self._bytes is None:
+                size = sys.getsizeof
+                self._bytes = (
+                    size(self._keys)
+                    + sum(map(size, self._keys))
+                    + size(self._ids)
+                    + sum(
+                        size(d) + sum(map(size, d)) for d in (self._names, self._best)
+                    )
+                    + sum(map(size, self._names.values()))
+                    + size(self._upcoming)
+                    + sum(map(size, self._best.values()))
+                )
+            return self._bytes
+
+
+class Autocomplete(ProcessIndex):
+    """Flask extension serving /autocomplete from a PrefixIndex per kind"""
+
+    name = "autocomplete index"
+
+    def __init__(self, app=None):
+        super().__init__()
+        self.size = 10
+        sql_metrics.register(
+            Gauge(
+                "fyyur_autocomplete_bytes",
+                "Approximate memory held by the autocomplete index.",
+                lambda: {k: i.footprint() for k, i in (self.data or {}).items()},
+                label="type",
+            )
+        )
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault("AUTOCOMPLETE_LIMIT", 10)
+        app.config.setdefault("AUTOCOMPLETE_REFRESH", 300)
+        self.size = app.config["AUTOCOMPLETE_LIMIT"]
+        super().init_app(app, app.config["AUTOCOMPLETE_REFRESH"])
+        app.add_url_rule("/autocomplete", "autocomplete", self.suggest)
+        app.extensions["autocomplete"] = self
+
+    def _rows(self, kind):
+        model = MODELS[kind]
+        on, upcoming = upcoming_column(kind, model)
+        return (
+            db.session.query(model.id, model.name, upcoming)
+            .outerjoin(ShowCount, on)
+            .yield_per(10000)
+        )
+
+    def load(self):
+        return {kind: PrefixIndex.build(self._rows(kind), self.size) for kind in MODELS}
+
+    def update(self, kind, ids):
+        rows = self._rows(kind).filter(MODELS[kind].id.in_(ids)).all()
+        index = self.data[kind]
+        for id, name, upcoming in rows:
+            index.put(id, name, upcoming)
+        for id in {int(id) for id in ids} - {row.id for row in rows}:
+            index.remove(id)
+
+    def describe(self, data):
+        return "autocomplete index of %s, %.1f MB" % (
+            ", ".join(f"{len(i)} {kind}s" for kind, i in data.items()),
+            sum(i.footprint() for i in data.values()) / 2**20,
+        )
+
+    def suggest(self):
+        kind = request.args.get("type", "venue")
+        if kind not in MODELS:
+            return jsonify({"error": "type must be venue or artist"}), 400
+        limit = max(1, min(request.args.get("limit", self.size, type=int), self.size))
+        # None until a build succeeds
+        index = (self.current() or {}).get(kind) or PrefixIndex(self.size)
+        term = request.args.get("q", "")
+        return jsonify(
+            {
+                "q": term,
+                "type": kind,
+                "results": [
+                    {"id": id, "name": name, "num_upcoming_shows": upcoming}
+                    for id, name, upcoming in index.search(term, limit)
+                ],
+            }
+        )
+
+
+autocomplete = Autocomplete()
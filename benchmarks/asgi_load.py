@@ -0,0 +1,187 @@
+"""Requests per second of one worker, WSGI against ASGI (asgi.py).
+
+Generates a synthetic dataset (see generate_data.py) unless the database
+already has venues, then starts one server process per mode on the same
+database and keeps ``--concurrency`` requests in flight against each read
+route for ``--seconds``:
+
+* ``wsgi`` -- the Flask app on Werkzeug's server, one request at a time like
+  ``python app.py runserver`` or a synchronous gunicorn worker.
+* ``asgi`` -- ``asgi:application`` on uvicorn, one process.
+
+    python -m benchmarks.asgi_load --concurrency 32 --seconds 10
+
+Needs uvicorn, and the databases package with aiosqlite (or asyncpg when
+BENCH_DATABASE_URL points to PostgreSQL).
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.parse
+
+from benchmarks.common import ROUTES, make_app, route_ids
+from benchmarks.routes import percentile
+
+# The routes asgi.py serves with async views
+ASYNC_ROUTES = [
+    "venues.venues",
+    "venues.search_venues",
+    "venues.show_venue",
+    "artists.artists",
+    "artists.search_artists",
+    "artists.show_artist",
+]
+
+
+def serve(mode, port):
+    """Run one worker of the given mode in this process, until killed"""
+    if mode == "asgi":
+        import uvicorn
+
+        uvicorn.run("asgi:application", port=port, log_level="warning")
+    else:
+        from werkzeug.serving import run_simple
+
+        from app import create_app
+
+        logging.getLogger("werkzeug").setLevel(logging.WARNING)
+        run_simple("127.0.0.1", port, create_app(), threaded=False)
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+async def request(port, method, url, data):
+    """Status and latency of one request on a new connection"""
+    body = urllib.parse.urlencode(data).encode() if data else b""
+    head = f"{method} {url} HTTP/1.1\r\nHost: localhost\r\nConnection: close\r\n"
+    if data:
+        head += (
+            "Content-Type: application/x-www-form-urlencoded\r\n"
+            f"Content-Length: {len(body)}\r\n"
+        )
+    started = time.perf_counter()
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(head.encode() + b"\r\n" + body)
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    status = int(response.split(b" ", 2)[1]) if response else 0
+    return status, time.perf_counter() - started
+
+
+async def load(port, method, url, data, concurrency, seconds):
+    """Keep concurrency requests in flight for seconds, returns the stats"""
+    latencies, failures = [], 0
+    deadline = time.perf_counter() + seconds
+
+    async def client():
+        nonlocal failures
+        while time.perf_counter() < deadline:
+            status, latency = await request(port, method, url, data)
+            latencies.append(latency * 1000)
+            failures += status != 200
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    return {
+        "rps": len(latencies) / elapsed,
+        "p50_ms": percentile(latencies, 50),
+        "p99_ms": percentile(latencies, 99),
+        "mean_ms": statistics.mean(latencies),
+        "failures": failures,
+    }
+
+
+async def wait_for(port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            _, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.close()
+            return
+        except OSError:
+            if time.monotonic() > deadline:
+                raise
+            await asyncio.sleep(0.2)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--venues", type=int, default=2000)
+    parser.add_argument("--artists", type=int, default=4000)
+    parser.add_argument("--shows", type=int, default=40000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--seconds", type=float, default=5, help="per route")
+    parser.add_argument("--routes", help="comma separated subset of ROUTES")
+    parser.add_argument("--serve", choices=["wsgi", "asgi"], help=argparse.SUPPRESS)
+    parser.add_argument("--port", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.serve:
+        serve(args.serve, args.port)
+        return 0
+
+    app = make_app()
+    from generate_data import generate
+    from models import Venue, db
+
+    with app.app_context():
+        if not db.session.query(Venue.id).first():
+            generate(db, args.venues, args.artists, args.shows, log=lambda m: None)
+        ids = route_ids()
+        db.engine.dispose()
+
+    routes = args.routes.split(",") if args.routes else ASYNC_ROUTES
+    results = {}
+    for mode in ("wsgi", "asgi"):
+        port = free_port()
+        # make_app() put the benchmark database and cache backend in environ
+        server = subprocess.Popen(
+            [sys.executable, "-m", "benchmarks.asgi_load"]
+            + ["--serve", mode, "--port", str(port)],
+            env=os.environ.copy(),
+        )
+        try:
+            asyncio.run(wait_for(port))
+            for name in routes:
+                method, url, data = ROUTES[name]
+                url = url.format(**ids)
+                # Warm up: one-off setup should not count against the route
+                asyncio.run(load(port, method, url, data, 1, 0.5))
+                results[mode, name] = asyncio.run(
+                    load(port, method, url, data, args.concurrency, args.seconds)
+                )
+        finally:
+            server.terminate()
+            server.wait()
+
+    print(f"{args.concurrency} requests in flight, one worker per mode")
+    print(
+        f"{'route':<16} {'wsgi rps':>9} {'asgi rps':>9} {'x':>6}"
+        f" {'wsgi p99':>9} {'asgi p99':>9} {'failed':>7}"
+    )
+    for name in routes:
+        wsgi, asgi = results["wsgi", name], results["asgi", name]
+        print(
+            f"{name:<16} {wsgi['rps']:>9.1f} {asgi['rps']:>9.1f}"
+            f" {asgi['rps'] / wsgi['rps']:>6.2f}"
+            f" {wsgi['p99_ms']:>9.1f} {asgi['p99_ms']:>9.1f}"
+            f" {wsgi['failures'] + asgi['failures']:>7}"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
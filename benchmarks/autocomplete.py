@@ -0,0 +1,114 @@
+"""Time the autocomplete index (autocomplete.PrefixIndex) over many names.
+
+Builds the index of a million generated venue names with Zipf distributed
+upcoming show counts, reports its size and how long it took, then times
+lookups of prefixes one to six characters long and the incremental updates
+the write routes make.  Every lookup is also checked against a brute force
+ranking of the names, after the updates too; a difference fails the run.
+
+    python -m benchmarks.autocomplete [--rows 1000000] [--repeat 200]
+"""
+
+import argparse
+import random
+import statistics
+import sys
+import time
+
+from autocomplete import PrefixIndex, normalize
+from generate_data import VENUE_NOUNS, _name
+
+
+def expected(names, upcoming, text, limit):
+    # A word of the name starts with the prefix
+    prefix = " " + normalize(text)
+    hits = [i for i, name in names.items() if prefix in " " + normalize(name)]
+    hits.sort(key=lambda i: (-upcoming[i], names[i], i))
+    return hits[:limit]
+
+
+def timed(repeat, call):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        call()
+        samples.append((time.perf_counter() - started) * 1e6)
+    return statistics.median(samples), max(samples)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1000000)
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--limit", type=int, default=10)
+    parser.add_argument("--checks", type=int, default=20)
+    args = parser.parse_args(argv)
+
+    rng = random.Random(42)
+    names = {i: _name(rng, VENUE_NOUNS, i) for i in range(1, args.rows + 1)}
+    upcoming = {i: int(rng.paretovariate(1.2)) - 1 for i in names}
+
+    started = time.perf_counter()
+    index = PrefixIndex.build(
+        ((i, names[i], upcoming[i]) for i in names), size=args.limit
+    )
+    seconds = time.perf_counter() - started
+    print(
+        f"{len(index)} names indexed in {seconds:.1f} s,"
+        f" {index.footprint() / 2**20:.0f} MB"
+    )
+
+    failures = 0
+    prefixes = ["t", "th", "the l", "bl", "lou", "golden ga", "12", "4711", "neon r"]
+
+    def check(label):
+        nonlocal failures
+        for text in prefixes + rng.sample(list(names.values()), 3):
+            got = [i for i, _, _ in index.search(text, args.limit)]
+            want = expected(names, upcoming, text, args.limit)
+            if got != want:
+                failures += 1
+                print(f"MISMATCH {label} {text!r}: {got} != {want}")
+
+    check("after build")
+
+    print(f"{'prefix':<12} {'p50 us':>8} {'max us':>8}")
+    for text in ("t", "th", "the", "the b", "lo", "lou", "mid", "12", "4711", "xyz"):
+        # The first lookup of a prefix may rank it, the rest are served kept
+        index.search(text, args.limit)
+        p50, worst = timed(args.repeat, lambda: index.search(text, args.limit))
+        print(f"{text!r:<12} {p50:>8.1f} {worst:>8.1f}")
+
+    ids = list(names)
+    updates = {
+        "rename": lambda i: (f"The Neon Rooftop {i}", upcoming[i]),
+        "more shows": lambda i: (names[i], upcoming[i] + rng.randint(1, 500)),
+        "fewer shows": lambda i: (names[i], max(0, upcoming[i] - 1)),
+    }
+    print(f"{'update':<12} {'p50 us':>8} {'max us':>8}")
+    for label, change in updates.items():
+
+        def update():
+            i = rng.choice(ids)
+            names[i], upcoming[i] = change(i)
+            index.put(i, names[i], upcoming[i])
+            prefixes[-1] = names[i][:8]
+
+        p50, worst = timed(args.checks, update)
+        print(f"{label:<12} {p50:>8.1f} {worst:>8.1f}")
+
+    def remove():
+        i = ids.pop(rng.randrange(len(ids)))
+        del names[i]
+        index.remove(i)
+
+    p50, worst = timed(args.checks, remove)
+    print(f"{'remove':<12} {p50:>8.1f} {worst:>8.1f}")
+
+    check("after updates")
+    print("ok" if not failures else f"{failures} lookups differ from brute force")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
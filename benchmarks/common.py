@@ -0,0 +1,114 @@
+"""Shared helpers for the benchmark scripts.
+
+The scripts are meant to be run from the repository root, e.g.
+``python -m benchmarks.venue_listing``.  They use a throwaway SQLite database
+unless ``BENCH_DATABASE_URL`` points somewhere else, and measure the views
+uncached unless ``BENCH_CACHE_BACKEND`` names a page cache backend.  The
+in-process indexes are loaded before ``make_app()`` returns, and the web
+process does not poll the job table, so neither adds statements to the
+measured requests.
+"""
+
+import os
+import tempfile
+from contextlib import contextmanager
+
+from sqlalchemy import event
+
+# Every read route, by endpoint (":variant" when requested more than one way),
+# as (method, url, form data).  {venue_id}/{artist_id} come from route_ids().
+ROUTES = {
+    "index": ("GET", "/", None),
+    "venues.venues": ("GET", "/venues", None),
+    "venues.venues:genre": ("GET", "/venues?genre=Jazz", None),
+    "venues.search_venues": ("POST", "/venues/search", {"search_term": "velvet"}),
+    "venues.show_venue": ("GET", "/venues/{venue_id}", None),
+    "venues.venue_availability": (
+        "GET",
+        "/venues/{venue_id}/availability?from={next_month}",
+        None,
+    ),
+    "venues.edit_venue": ("GET", "/venues/{venue_id}/edit", None),
+    "venues.create_venue_form": ("GET", "/venues/create", None),
+    "artists.artists": ("GET", "/artists", None),
+    "artists.artists:genre": ("GET", "/artists?genre=Jazz", None),
+    "artists.search_artists": ("POST", "/artists/search", {"search_term": "velvet"}),
+    "artists.show_artist": ("GET", "/artists/{artist_id}", None),
+    "artists.edit_artist": ("GET", "/artists/{artist_id}/edit", None),
+    "artists.create_artist_form": ("GET", "/artists/create", None),
+    "shows.shows": ("GET", "/shows", None),
+    "shows.shows:window": ("GET", "/shows?from={next_month}&to={next_year}", None),
+    "shows.create_shows": ("GET", "/shows/create", None),
+    "api.venues": ("GET", "/api/v1/venues?fields=name,genres", None),
+    "api.artists": ("GET", "/api/v1/artists", None),
+    "api.shows": ("GET", "/api/v1/shows", None),
+}
+
+
+def make_app():
+    """Import the app against the benchmark database and create the tables"""
+    url = os.environ.get("BENCH_DATABASE_URL")
+    if url is None:
+        fd, path = tempfile.mkstemp(prefix="fyyur-bench-", suffix=".db")
+        os.close(fd)
+        url = f"sqlite:///{path}"
+    os.environ["DATABASE_URL"] = url
+    os.environ["CACHE_BACKEND"] = os.environ.get("BENCH_CACHE_BACKEND", "null")
+    # No polling of the job table in the background of the measured requests
+    os.environ["JOBS_IN_PROCESS"] = "0"
+
+    from app import create_app
+    from inprocess import ProcessIndex
+    from models import db
+
+    app = create_app()
+
+    with app.app_context():
+        db.create_all()
+
+    # The first request loads the in-process indexes in the background: have
+    # it done, and waited for, before anything is measured
+    app.test_client().get("/")
+    for extension in app.extensions.values():
+        if isinstance(extension, ProcessIndex):
+            extension.current()
+    return app
+
+
+def route_ids():
+    """Values for the placeholders in ROUTES: the busiest venue and artist"""
+    from datetime import date
+
+    from models import Show, db
+
+    def busiest(column):
+        return (
+            db.session.query(column)
+            .group_by(column)
+            .order_by(db.func.count().desc())
+            .limit(1)
+            .scalar()
+        )
+
+    today = date.today()
+    return {
+        "venue_id": busiest(Show.venue_id) or 1,
+        "artist_id": busiest(Show.artist_id) or 1,
+        "next_month": today.replace(day=1).isoformat(),
+        "next_year": today.replace(year=today.year + 1, day=1).isoformat(),
+    }
+
+
+@contextmanager
+def count_statements(engine):
+    """Collect every SQL statement sent to the engine inside the block"""
+    statements = []
+
+    def _record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", _record)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", _record)
@@ -0,0 +1,90 @@
+"""Time rendering the /shows page for many shows, before and after.
+
+"Before" is the old path: the view strftime's every start time and the
+``datetime`` filter parses the string back with dateutil and formats it with
+``babel.dates.format_datetime``.  "After" hands the filter the datetime and
+formats it with a cached, pre-parsed Babel pattern.
+
+    python -m benchmarks.datetime_filter [--shows 10000] [--repeat 5]
+"""
+
+import argparse
+import time
+from datetime import datetime, timedelta
+
+import babel.dates
+import dateutil.parser
+from flask import render_template
+
+from benchmarks.common import make_app
+
+
+def legacy_format_datetime(value, format="medium"):
+    """format_datetime as it was before it took datetimes"""
+    date = dateutil.parser.parse(value)
+    if format == "full":
+        format = "EEEE MMMM, d, y 'at' h:mma"
+    elif format == "medium":
+        format = "EE MM, dd, y h:mma"
+    return babel.dates.format_datetime(date, format)
+
+
+def fake_shows(count):
+    start = datetime(2030, 1, 1, 20, 0)
+    return [
+        {
+            "venue_id": i % 100,
+            "venue_name": f"Venue {i % 100}",
+            "artist_id": i % 300,
+            "artist_name": f"Artist {i % 300}",
+            "artist_image_link": "https://example.com/a.jpg",
+            "start_time": start + timedelta(hours=i),
+        }
+        for i in range(count)
+    ]
+
+
+def best_of(repeat, render):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        render()
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--shows", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    app = make_app()
+    shows = fake_shows(args.shows)
+    filters = app.jinja_env.filters
+    current = filters["datetime"]
+
+    def before():
+        filters["datetime"] = legacy_format_datetime
+        try:
+            stringified = [
+                {**s, "start_time": s["start_time"].strftime("%m/%d/%Y, %H:%M:%S")}
+                for s in shows
+            ]
+            return render_template("pages/shows.html", shows=stringified)
+        finally:
+            filters["datetime"] = current
+
+    def after():
+        return render_template("pages/shows.html", shows=shows)
+
+    with app.test_request_context("/shows"):
+        assert before() == after(), "both paths must render the same page"
+        old, new = best_of(args.repeat, before), best_of(args.repeat, after)
+    print(f"{args.shows} shows, best of {args.repeat}")
+    print(f"  strftime + dateutil + babel: {old * 1000:8.1f} ms")
+    print(f"  datetime + cached pattern:   {new * 1000:8.1f} ms ({old / new:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""Time the /matches rankings (match_data.MatchData.rank) over many candidates.
+
+Fills the match data with generated venues and artists, genres and cities
+skewed like generate_data.py does and shows booked between them, then times
+ranking every venue or artist for a few owners against a plain Python loop
+scoring one candidate at a time, and the incremental updates the write routes
+make.  Both rankings have to agree; a difference fails the run.
+
+    python -m benchmarks.matches [--rows 100000] [--repeat 50]
+"""
+
+import argparse
+import random
+import statistics
+import sys
+import time
+
+from generate_data import CITIES, GENRES, zipf_weights
+from match_data import OTHER, MatchData
+
+WEIGHTS = {"genre": 0.5, "place": 0.2, "history": 0.2, "seeking": 0.1}
+HISTORY_SHOWS = 5
+
+
+def fill(data, rows, pairs, rng):
+    genre_ids = {name: i + 1 for i, name in enumerate(GENRES)}
+    data.add_genres({i: name for name, i in genre_ids.items()})
+    city_weights = zipf_weights(len(CITIES))
+    genre_weights = zipf_weights(len(GENRES), s=0.8)
+    plain = {}
+    for kind in ("venue", "artist"):
+        for id in range(1, rows + 1):
+            city, state = rng.choices(CITIES, city_weights)[0]
+            genres = {genre_ids[g] for g in rng.choices(GENRES, genre_weights, k=3)}
+            seeking = rng.random() < 0.3
+            data.put(kind, (id, f"{kind} {id}", city, state, seeking, None), genres)
+            plain[kind, id] = (genres, city, state, seeking)
+    together = {}
+    for _ in range(pairs):
+        pair = (rng.randint(1, rows), rng.randint(1, rows))
+        together[pair] = together.get(pair, 0) + 1
+    by_venue = {}
+    for (venue, artist), shows in together.items():
+        by_venue.setdefault(venue, {})[artist] = shows
+    for venue, shows in by_venue.items():
+        data.set_pairs("venue", venue, shows)
+    return plain, together
+
+
+def python_rank(plain, together, kind, owner_id, rows, limit):
+    """The same ranking, one candidate at a time"""
+    genres, city, state, _ = plain[kind, owner_id]
+    scored = []
+    for id in range(1, rows + 1):
+        other_genres, other_city, other_state, seeking = plain[OTHER[kind], id]
+        either = len(genres | other_genres)
+        genre = len(genres & other_genres) / either if either else 0.0
+        place = 1.0 if (city, state) == (other_city, other_state) else 0.0
+        place = place or (0.5 if state == other_state else 0.0)
+        pair = (owner_id, id) if kind == "venue" else (id, owner_id)
+        history = min(together.get(pair, 0) / HISTORY_SHOWS, 1.0)
+        score = (
+            WEIGHTS["genre"] * genre
+            + WEIGHTS["place"] * place
+            + WEIGHTS["history"] * history
+            + WEIGHTS["seeking"] * seeking
+        )
+        scored.append((-score, id))
+    scored.sort()
+    return [(id, round(-score, 4)) for score, id in scored[:limit] if score < 0]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--pairs", type=int, default=500000)
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--limit", type=int, default=20)
+    args = parser.parse_args(argv)
+
+    rng = random.Random(42)
+    data = MatchData()
+    started = time.perf_counter()
+    plain, together = fill(data, args.rows, args.pairs, rng)
+    print(
+        f"{args.rows} venues and artists, {len(together)} pairs booked,"
+        f" loaded in {time.perf_counter() - started:.1f} s"
+    )
+
+    failures = 0
+    print(
+        f"{'ranking':<10} {'owner':>7} {'numpy ms':>9} {'max ms':>8} {'python ms':>10}"
+    )
+    for kind in ("venue", "artist"):
+        for owner_id in rng.sample(range(1, args.rows + 1), 3):
+            samples = []
+            for _ in range(args.repeat):
+                started = time.perf_counter()
+                found = data.rank(kind, owner_id, WEIGHTS, HISTORY_SHOWS, args.limit)
+                samples.append((time.perf_counter() - started) * 1000)
+            started = time.perf_counter()
+            expected = python_rank(
+                plain, together, kind, owner_id, args.rows, args.limit
+            )
+            loop = (time.perf_counter() - started) * 1000
+            if [(m["id"], m["score"]) for m in found] != expected:
+                failures += 1
+                print(f"MISMATCH {kind} {owner_id}")
+            print(
+                f"{kind:<10} {owner_id:>7} {statistics.median(samples):>9.2f}"
+                f" {max(samples):>8.2f} {loop:>10.1f}"
+            )
+
+    samples = []
+    for _ in range(args.repeat):
+        id = rng.randint(1, args.rows)
+        started = time.perf_counter()
+        data.put("artist", (id, "renamed", "Austin", "TX", True, None), {1, 2})
+        data.set_pairs("artist", id, {rng.randint(1, args.rows): 1})
+        samples.append((time.perf_counter() - started) * 1e6)
+    print(f"update p50 {statistics.median(samples):.0f} us")
+    print("ok" if not failures else f"{failures} rankings differ")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,149 @@
+"""Fail when a route's query falls back to a full table scan.
+
+Seeds a large dataset, requests every read route of the app through the test
+client while recording the SQL it sends, then EXPLAINs each statement with its
+original parameters.  Any sequential scan of a big table that is not listed in
+ALLOWED_SCANS is reported and the script exits with status 1.  On SQLite a
+scan in rowid order that stops at a LIMIT (``ORDER BY id LIMIT n`` without a
+filter) is read as the primary key lookup it is.
+
+Works against SQLite (``EXPLAIN QUERY PLAN``) and PostgreSQL
+(``EXPLAIN (FORMAT JSON)``, point ``BENCH_DATABASE_URL`` at a migrated
+database).
+
+    python -m benchmarks.query_plans [--venues 20000] [--artists 20000]
+                                     [--shows 200000]
+                                     [--routes venues.venues,shows.shows]
+"""
+
+import argparse
+import json
+import re
+import sys
+
+from sqlalchemy import event
+
+from benchmarks.common import ROUTES, make_app, route_ids
+
+BIG_TABLES = {"venue", "artist", "show", "venue_genre", "artist_genre"}
+
+# Listings that show every row of a table can not avoid reading all of it
+ALLOWED_SCANS = {
+    ("venues.venues", "venue"),
+    ("artists.artists", "artist"),
+}
+
+
+def analyze(db):
+    """Fresh statistics (and visibility map) so the planner sees a big table"""
+    with db.engine.connect() as connection:
+        if connection.dialect.name == "postgresql":
+            connection = connection.execution_options(isolation_level="AUTOCOMMIT")
+            connection.execute("VACUUM ANALYZE")
+        else:
+            connection.execute("ANALYZE")
+
+
+def scanned_tables(connection, dialect, statement, parameters):
+    """Names of the tables the plan of statement reads sequentially"""
+    cursor = connection.cursor()
+    if dialect == "postgresql":
+        cursor.execute("EXPLAIN (FORMAT JSON) " + statement, parameters)
+        plan = cursor.fetchone()[0]
+        plan = json.loads(plan) if isinstance(plan, str) else plan
+        nodes, scans = [plan[0]["Plan"]], set()
+        while nodes:
+            node = nodes.pop()
+            if node["Node Type"] == "Seq Scan":
+                scans.add(node["Relation Name"])
+            nodes.extend(node.get("Plans", []))
+        return scans
+    cursor.execute("EXPLAIN QUERY PLAN " + statement, parameters)
+    rows = [row[-1] for row in cursor.fetchall()]
+    scans = set()
+    for row in rows:
+        words = row.split()
+        # "SCAN show" is a table scan, "SCAN show USING INDEX ..." is not
+        if words[0] == "SCAN" and len(words) == 2:
+            if not rowid_walk(statement, words[1], rows):
+                scans.add(words[1])
+    return scans
+
+
+def rowid_walk(statement, table, plan):
+    """Whether SQLite's "SCAN table" walks it in rowid (primary key) order and
+    stops at the LIMIT, e.g. the first page of an API listing"""
+    return (
+        re.search(rf"\bORDER BY {table}\.id(?: ASC)?\s+LIMIT\b", statement) is not None
+        and " WHERE " not in statement.replace("\n", " ")
+        and not any("TEMP B-TREE" in row for row in plan)
+    )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--venues", type=int, default=20000)
+    parser.add_argument("--artists", type=int, default=20000)
+    parser.add_argument("--shows", type=int, default=200000)
+    parser.add_argument("--routes", help="comma separated subset of ROUTES")
+    args = parser.parse_args(argv)
+
+    app = make_app()
+    from generate_data import generate
+    from models import Venue, db
+
+    routes = args.routes.split(",") if args.routes else list(ROUTES)
+    failures = []
+    with app.app_context():
+        if not db.session.query(Venue.id).first():
+            print("Seeding ...")
+            generate(db, args.venues, args.artists, args.shows, log=lambda m: None)
+            analyze(db)
+        engine = db.engine
+        recorded = []
+
+        def _record(conn, cursor, statement, parameters, context, executemany):
+            recorded.append((statement, parameters))
+
+        client = app.test_client()
+        ids = route_ids()
+        # Warm up once so one-off setup (e.g. FTS install) is not explained
+        for name in routes:
+            method, url, data = ROUTES[name]
+            client.open(url.format(**ids), method=method, data=data)
+
+        raw = engine.raw_connection()
+        try:
+            for name in routes:
+                method, url, data = ROUTES[name]
+                event.listen(engine, "before_cursor_execute", _record)
+                try:
+                    response = client.open(url.format(**ids), method=method, data=data)
+                finally:
+                    event.remove(engine, "before_cursor_execute", _record)
+                endpoint = name.split(":")[0]
+                statements = [
+                    (s, p)
+                    for s, p in recorded
+                    if s.lstrip().upper().startswith("SELECT")
+                ]
+                recorded.clear()
+                print(f"{name:<18} {response.status_code} {len(statements):>3} queries")
+                for statement, parameters in statements:
+                    scans = scanned_tables(
+                        raw, engine.dialect.name, statement, parameters
+                    )
+                    for table in sorted(scans & BIG_TABLES):
+                        if (endpoint, table) in ALLOWED_SCANS:
+                            continue
+                        failures.append((name, table, statement))
+        finally:
+            raw.close()
+
+    for name, table, statement in failures:
+        print(f"\nSEQ SCAN on {table} in {name}:\n{statement}", file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,104 @@
+"""Check which requests pin the client to the primary (routing.py).
+
+Points a replica at the benchmark database itself, then sends each request
+below from a fresh test client and checks its status code, and whether the
+response set the read-your-writes cookie that keeps the client reading from
+the primary for ``REPLICA_STICKY_SECONDS``.  The deletes are checked to
+have deleted their row too.  Exits 1 on a mismatch.
+
+    python -m benchmarks.replica_pinning
+"""
+
+import os
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+from benchmarks.common import make_app
+
+# (method, url, form data, status, pinned)
+REQUESTS = [
+    ("GET", "/venues", None, 200, False),
+    ("HEAD", "/artists", None, 200, False),
+    ("POST", "/venues/search", {"search_term": "pin"}, 200, False),
+    ("POST", "/artists/search", {"search_term": "pin"}, 200, False),
+    (
+        "POST",
+        "/artists/create",
+        {
+            "name": "Pinned Artist",
+            "city": "Austin",
+            "state": "TX",
+            "phone": "512-555-1234",
+            "genres": ["Jazz"],
+        },
+        200,
+        True,
+    ),
+    ("DELETE", "/venues/{venue_id}", {"name": "Pin Venue"}, 303, True),
+    ("DELETE", "/artists/{artist_id}", {"name": "Pin Artist"}, 303, True),
+]
+
+
+def seed(db, Artist, Show, Venue):
+    """A venue and an artist with a show together, returns their ids"""
+    venue = Venue(
+        name="Pin Venue", city="Austin", state="TX", address="1 A", genres=["Jazz"]
+    )
+    db.session.add(venue)
+    # Built once the venue is added, so that they share the genre row
+    artist = Artist(name="Pin Artist", city="Austin", state="TX", genres=["Jazz"])
+    db.session.add(artist)
+    db.session.flush()
+    db.session.add(
+        Show(
+            venue_id=venue.id,
+            artist_id=artist.id,
+            start_time=datetime.now() + timedelta(days=7),
+        )
+    )
+    db.session.commit()
+    return {"venue_id": venue.id, "artist_id": artist.id}
+
+
+def main():
+    if "BENCH_DATABASE_URL" not in os.environ:
+        fd, path = tempfile.mkstemp(prefix="fyyur-bench-", suffix=".db")
+        os.close(fd)
+        os.environ["BENCH_DATABASE_URL"] = f"sqlite:///{path}"
+    # The primary doubles as the replica: only the routing is checked
+    os.environ["DATABASE_REPLICA_URLS"] = os.environ["BENCH_DATABASE_URL"]
+    app = make_app()
+    app.config["WTF_CSRF_ENABLED"] = False
+
+    from models import Artist, Show, Venue, db
+    from routing import STICKY_KEY
+
+    with app.app_context():
+        ids = seed(db, Artist, Show, Venue)
+
+    failures = 0
+    print(f"{'request':<30} {'status':>6} {'pinned':>7}  ok")
+    for method, url, data, status, pinned in REQUESTS:
+        client = app.test_client()
+        response = client.open(url.format(**ids), method=method, data=data)
+        with client.session_transaction() as session:
+            was_pinned = STICKY_KEY in session
+        ok = response.status_code == status and was_pinned == pinned
+        failures += not ok
+        label = f"{method} {url}"
+        print(
+            f"{label:<30} {response.status_code:>6} {str(was_pinned):>7}  "
+            f"{'yes' if ok else 'NO'}"
+        )
+
+    with app.app_context():
+        for model, key in ((Venue, "venue_id"), (Artist, "artist_id")):
+            if model.query.get(ids[key]) is not None:
+                print(f"{model.__name__} {ids[key]} was not deleted")
+                failures += 1
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
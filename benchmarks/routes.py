@@ -0,0 +1,131 @@
+"""Latency percentiles and SQL statement counts for every route.
+
+Generates a synthetic dataset (see generate_data.py) unless the database
+already has venues, then requests each route in ROUTES through the Flask test
+client and writes a JSON report.  Two reports can be compared to see what a
+commit did to each route:
+
+    python -m benchmarks.routes --output before.json
+    python -m benchmarks.routes --output after.json --compare before.json
+"""
+
+import argparse
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import time
+
+from benchmarks.common import ROUTES, count_statements, make_app, route_ids
+
+
+def percentile(samples, p):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))]
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def measure(client, engine, method, url, data, requests):
+    latencies, statements, status = [], set(), set()
+    for _ in range(requests):
+        with count_statements(engine) as executed:
+            started = time.perf_counter()
+            response = client.open(url, method=method, data=data)
+            latencies.append((time.perf_counter() - started) * 1000)
+        statements.add(len(executed))
+        status.add(response.status_code)
+    return {
+        "url": url,
+        "method": method,
+        "status": sorted(status),
+        "statements": max(statements),
+        "p50_ms": round(percentile(latencies, 50), 3),
+        "p90_ms": round(percentile(latencies, 90), 3),
+        "p99_ms": round(percentile(latencies, 99), 3),
+        "mean_ms": round(statistics.mean(latencies), 3),
+    }
+
+
+def compare(report, baseline):
+    print(f"{'route':<20} {'p50 ms':>16} {'p99 ms':>16} {'queries':>10}")
+    for name, now in report["routes"].items():
+        before = baseline["routes"].get(name)
+        if before is None:
+            print(f"{name:<20} {'(new)':>16}")
+            continue
+        print(
+            f"{name:<20} "
+            f"{before['p50_ms']:>7.1f} > {now['p50_ms']:<6.1f} "
+            f"{before['p99_ms']:>7.1f} > {now['p99_ms']:<6.1f} "
+            f"{before['statements']:>4} > {now['statements']:<3}"
+        )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--venues", type=int, default=5000)
+    parser.add_argument("--artists", type=int, default=10000)
+    parser.add_argument("--shows", type=int, default=100000)
+    parser.add_argument("--requests", type=int, default=50, help="per route")
+    parser.add_argument("--routes", help="comma separated subset of ROUTES")
+    parser.add_argument("--output", help="write the JSON report here")
+    parser.add_argument("--compare", help="JSON report to compare against")
+    args = parser.parse_args(argv)
+
+    app = make_app()
+    from generate_data import generate
+    from models import Artist, Show, Venue, db
+
+    routes = args.routes.split(",") if args.routes else list(ROUTES)
+    with app.app_context():
+        if not db.session.query(Venue.id).first():
+            generate(db, args.venues, args.artists, args.shows, log=lambda m: None)
+        ids = route_ids()
+        client = app.test_client()
+        report = {
+            "revision": git_revision(),
+            "python": platform.python_version(),
+            "database": db.engine.dialect.name,
+            "rows": {
+                "venues": Venue.query.count(),
+                "artists": Artist.query.count(),
+                "shows": Show.query.count(),
+            },
+            "requests_per_route": args.requests,
+            "routes": {},
+        }
+        for name in routes:
+            method, url, data = ROUTES[name]
+            url = url.format(**ids)
+            # Warm up: one-off setup should not count against the route
+            client.open(url, method=method, data=data)
+            report["routes"][name] = measure(
+                client, db.engine, method, url, data, args.requests
+            )
+
+    output = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    if args.compare:
+        with open(args.compare) as f:
+            compare(report, json.load(f))
+    elif not args.output:
+        print(output)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
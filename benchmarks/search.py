@@ -0,0 +1,110 @@
+"""Compare the indexed search engine with the old ILIKE '%term%' path.
+
+Fills the venue table with synthetic rows and times the first page of
+search results for a few terms through both paths.
+
+    python -m benchmarks.search [--rows 1000000] [--repeat 5]
+"""
+
+import argparse
+import random
+import statistics
+import sys
+import time
+
+from benchmarks.common import make_app
+
+WORDS = (
+    "blue velvet golden rusty electric silent crimson jazz rock soul folk "
+    "lounge hall club bar tavern garden theatre house cellar room stage "
+    "arena coffee pianos musical square live hop"
+).split()
+AREAS = [
+    ("San Francisco", "CA"),
+    ("New York", "NY"),
+    ("Austin", "TX"),
+    ("Seattle", "WA"),
+    ("Chicago", "IL"),
+    ("Nashville", "TN"),
+]
+GENRES = ["Jazz", "Blues", "Folk", "Rock n Roll", "Classical", "Hip-Hop", "Soul"]
+TERMS = ["velvet", "jazz lounge", "nashville", "musical hop", "cell"]
+
+
+def fill(db, Venue, Genre, venue_genre, rows, chunk=50000):
+    rng = random.Random(42)
+    genres = Genre.for_names(GENRES)
+    db.session.add_all(genres)
+    db.session.flush()
+    genre_ids = [g.id for g in genres]
+    for start in range(1, rows + 1, chunk):
+        venues, tags = [], []
+        for i in range(start, min(start + chunk, rows + 1)):
+            city, state = rng.choice(AREAS)
+            venues.append(
+                {
+                    "id": i,
+                    "name": " ".join(rng.sample(WORDS, 3)).title() + f" {i}",
+                    "city": city,
+                    "state": state,
+                }
+            )
+            tags.extend(
+                {"genre_id": g, "venue_id": i} for g in rng.sample(genre_ids, 2)
+            )
+        db.session.execute(Venue.__table__.insert(), venues)
+        db.session.execute(venue_genre.insert(), tags)
+        db.session.commit()
+
+
+def timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples), result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1000000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    app = make_app()
+    from models import Genre, Venue, db, venue_genre
+    from queries import search_results
+    from search import LikeSearch, search_engine
+
+    like = LikeSearch()
+    with app.app_context():
+        if not db.session.query(Venue.id).first():
+            print(f"Inserting {args.rows} venues ...")
+            fill(db, Venue, Genre, venue_genre, args.rows)
+        backend = type(search_engine.backend()).__name__
+        # The first call installs the SQLite FTS tables
+        search_engine.matches(Venue, "warm up")
+        print(
+            f"{'term':<14} {'ilike ms':>10} {'hits':>8} {backend + ' ms':>18} {'hits':>8}"
+        )
+        for term in TERMS:
+            like_ms, like_page = timed(
+                lambda: search_results(Venue, like.matches(Venue, term), limit=20),
+                args.repeat,
+            )
+            engine_ms, engine_page = timed(
+                lambda: search_results(
+                    Venue, search_engine.matches(Venue, term), limit=20
+                ),
+                args.repeat,
+            )
+            print(
+                f"{term:<14} {like_ms:>10.1f} {like_page['count']:>8} "
+                f"{engine_ms:>18.1f} {engine_page['count']:>8}"
+            )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
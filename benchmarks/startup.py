@@ -0,0 +1,131 @@
+"""Startup cost of the app: imports and app creation, in fresh processes.
+
+Each target is run ``--runs`` times in a new interpreter, timing its code
+from the first import on, then once more under ``python -X importtime`` to
+count the modules it imports and add up their import times by top level
+package, the heaviest packages first.  As with ``benchmarks.routes``, two
+reports can be compared:
+
+    python -m benchmarks.startup --output before.json
+    python -m benchmarks.startup --output after.json --compare before.json
+
+``make importtime`` writes ``importtime.json``.
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+
+from benchmarks.routes import git_revision
+
+# What a process runs to start up, by target
+TARGETS = {
+    "worker": "from app import create_app; create_app()",
+    "asgi": "import asgi",
+    "load_data": "import load_data; load_data.create_base_app()",
+    "manager": "from app import create_manager; create_manager()",
+}
+
+MARK = "-- startup --"
+
+# Timed in the child, the interpreter's own startup left out
+CHILD = f"""
+import sys, time
+print({MARK!r}, file=sys.stderr, flush=True)
+started = time.perf_counter()
+exec(sys.argv[1])
+print((time.perf_counter() - started) * 1000)
+"""
+
+
+def run(code, importtime=False):
+    """(milliseconds, stderr) of one fresh process running code"""
+    command = [sys.executable, *(["-X", "importtime"] if importtime else [])]
+    done = subprocess.run(
+        [*command, "-c", CHILD, code], capture_output=True, text=True, check=True
+    )
+    return float(done.stdout.split()[-1]), done.stderr
+
+
+def imports(stderr):
+    """{module: own import ms} of the -X importtime lines after MARK"""
+    found = {}
+    for line in stderr.split(MARK, 1)[-1].splitlines():
+        if not line.startswith("import time:"):
+            continue
+        own, _, name = line[len("import time:") :].split("|", 2)
+        if own.strip().isdigit():
+            found[name.strip()] = int(own) / 1000
+    return found
+
+
+def measure(code, runs, heaviest):
+    samples = [run(code)[0] for _ in range(runs)]
+    _, stderr = run(code, importtime=True)
+    modules = imports(stderr)
+    packages = {}
+    for name, ms in modules.items():
+        package = name.split(".")[0]
+        packages[package] = packages.get(package, 0) + ms
+    top = sorted(packages.items(), key=lambda p: -p[1])[:heaviest]
+    return {
+        "p50_ms": round(statistics.median(samples), 1),
+        "min_ms": round(min(samples), 1),
+        "modules": len(modules),
+        "heaviest": [[package, round(ms, 1)] for package, ms in top],
+    }
+
+
+def compare(report, baseline):
+    print(f"{'target':<12} {'p50 ms':>16} {'modules':>12}")
+    for name, now in report["targets"].items():
+        before = baseline["targets"].get(name)
+        if before is None:
+            print(f"{name:<12} {'(new)':>16}")
+            continue
+        print(
+            f"{name:<12} "
+            f"{before['p50_ms']:>7.0f} > {now['p50_ms']:<6.0f} "
+            f"{before['modules']:>5} > {now['modules']:<5}"
+        )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5, help="per target")
+    parser.add_argument("--heaviest", type=int, default=10)
+    parser.add_argument("--targets", help="comma separated subset of TARGETS")
+    parser.add_argument("--output", help="write the JSON report here")
+    parser.add_argument("--compare", help="JSON report to compare against")
+    args = parser.parse_args(argv)
+
+    # Nothing connects at startup, the URL only has to parse
+    os.environ.setdefault("DATABASE_URL", "sqlite://")
+    targets = args.targets.split(",") if args.targets else list(TARGETS)
+    report = {
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "runs_per_target": args.runs,
+        "targets": {
+            name: measure(TARGETS[name], args.runs, args.heaviest) for name in targets
+        },
+    }
+
+    output = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    if args.compare:
+        with open(args.compare) as f:
+            compare(report, json.load(f))
+    elif not args.output:
+        print(output)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
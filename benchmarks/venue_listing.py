@@ -0,0 +1,107 @@
+"""Show that GET /venues issues a constant number of queries.
+
+Grows the venue table step by step (spread over a handful of areas, each
+venue with a couple of past and upcoming shows) and records the statement
+count and latency of the listing page at every size.  The rows are bulk
+inserted, past the counter events, so the show counters are rebuilt after
+every step and a sample of them checked against a count of the shows.
+
+    python -m benchmarks.venue_listing [--sizes 10,100,1000,5000]
+"""
+
+import argparse
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+from benchmarks.common import count_statements, make_app
+
+AREAS = [
+    ("San Francisco", "CA"),
+    ("New York", "NY"),
+    ("Austin", "TX"),
+    ("Seattle", "WA"),
+]
+
+
+def seed(db, Venue, Show, start, stop):
+    now = datetime.now()
+    db.session.bulk_insert_mappings(
+        Venue,
+        [
+            {
+                "id": i,
+                "name": f"Venue {i}",
+                "city": AREAS[i % len(AREAS)][0],
+                "state": AREAS[i % len(AREAS)][1],
+            }
+            for i in range(start, stop)
+        ],
+    )
+    db.session.bulk_insert_mappings(
+        Show,
+        [
+            {
+                "venue_id": i,
+                "artist_id": 1,
+                "start_time": now + timedelta(days=offset, minutes=i),
+            }
+            for i in range(start, stop)
+            for offset in (-30, -1, 7, 60)
+        ],
+    )
+    db.session.commit()
+
+
+def check_counts(db, Show, ids):
+    """Compare the upcoming counters of the venues to a count of their shows"""
+    from counters import counts, swept_until
+
+    until = swept_until(db.session)
+    for venue_id in ids:
+        actual = Show.query.filter(
+            Show.venue_id == venue_id, Show.start_time > until
+        ).count()
+        stored, _ = counts("venue", venue_id)
+        assert stored == actual, (venue_id, stored, actual)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default="10,100,1000,5000")
+    args = parser.parse_args(argv)
+    sizes = sorted(int(s) for s in args.sizes.split(","))
+
+    app = make_app()
+    from counters import rebuild
+    from models import Artist, Show, Venue, db
+
+    client = app.test_client()
+    counts = []
+    with app.app_context():
+        db.session.add(Artist(id=1, name="Benchmark Artist"))
+        db.session.commit()
+        seeded = 1
+        print(f"{'venues':>8} {'queries':>8} {'ms':>10}")
+        for size in sizes:
+            seed(db, Venue, Show, seeded, size + 1)
+            rebuild()
+            check_counts(db, Show, random.sample(range(1, size + 1), min(size, 20)))
+            seeded = size + 1
+            with count_statements(db.engine) as statements:
+                started = time.perf_counter()
+                response = client.get("/venues")
+                elapsed = (time.perf_counter() - started) * 1000
+            assert response.status_code == 200, response.status_code
+            counts.append(len(statements))
+            print(f"{size:>8} {len(statements):>8} {elapsed:>10.1f}")
+
+    if len(set(counts)) != 1:
+        print("Query count grows with the number of venues!", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,154 @@
+"""Time /venues/near lookups (queries.venues_near) on a large venue table.
+
+Fills the venue table with synthetic venues scattered around the cities of
+the gazetteer, most of them in the biggest few like generate_data.py does,
+then times the nearest venues around a few points: the busiest city centre,
+a smaller town, open country with no venue for a hundred kilometres, and both
+sides of the antimeridian, where a few islands' worth of venues straddle
++/-180 degrees.  Every lookup is checked against the great circle distances
+of all the venues in its latitude band; the script exits 1 on a mismatch.
+
+    python -m benchmarks.venues_near [--rows 1000000] [--repeat 20]
+"""
+
+import argparse
+import csv
+import math
+import random
+import statistics
+import sys
+import time
+
+from benchmarks.common import count_statements, make_app
+from benchmarks.query_plans import analyze
+from generate_data import zipf_weights
+
+# (label, latitude, longitude, radius in km)
+POINTS = [
+    ("new york centre", 40.7128, -74.0060, 10),
+    ("new york 100km", 40.7128, -74.0060, 100),
+    ("chicago edge", 41.95, -87.75, 25),
+    ("missoula", 46.8721, -113.9940, 50),
+    ("nebraska plains", 42.5, -101.0, 100),
+    ("antimeridian west", 2.99, -179.96, 100),
+    ("antimeridian east", -16.5, 179.9, 100),
+]
+
+# Scattered venues across the antimeridian, as (latitude, longitude, count)
+ANTIMERIDIAN = [(3.0, 180.0, 500), (-16.5, 179.5, 500)]
+
+
+def fill(db, Venue, rows, chunk=50000):
+    from geo import GAZETTEER, locate
+
+    with open(GAZETTEER, newline="") as f:
+        places = [
+            (r["city"], r["state"], float(r["latitude"]), float(r["longitude"]))
+            for r in csv.DictReader(f)
+        ]
+    weights = zipf_weights(len(places))
+    rng = random.Random(42)
+    for start in range(1, rows + 1, chunk):
+        venues = []
+        for i in range(start, min(start + chunk, rows + 1)):
+            city, state, latitude, longitude = rng.choices(places, weights)[0]
+            venues.append(
+                locate(
+                    {
+                        "id": i,
+                        "name": f"Venue {i}",
+                        "city": city,
+                        "state": state,
+                        "latitude": latitude + rng.gauss(0, 0.05),
+                        "longitude": longitude
+                        + rng.gauss(0, 0.05) / math.cos(math.radians(latitude)),
+                    }
+                )
+            )
+        db.session.execute(Venue.__table__.insert(), venues)
+        db.session.commit()
+    venues = []
+    for latitude, longitude, count in ANTIMERIDIAN:
+        for _ in range(count):
+            rows += 1
+            east = longitude + rng.gauss(0, 0.5)
+            venues.append(
+                locate(
+                    {
+                        "id": rows,
+                        "name": f"Venue {rows}",
+                        "latitude": latitude + rng.gauss(0, 0.5),
+                        # Back into [-180, 180)
+                        "longitude": (east + 180.0) % 360.0 - 180.0,
+                    }
+                )
+            )
+    db.session.execute(Venue.__table__.insert(), venues)
+    db.session.commit()
+
+
+def brute_force(db, Venue, latitude, longitude, radius, limit):
+    """Distances of the limit nearest venues within radius, from every venue
+    of the latitude band"""
+    from geo import KM_PER_DEGREE, distance_km
+
+    band = radius / KM_PER_DEGREE
+    rows = db.session.query(Venue.id, Venue.latitude, Venue.longitude).filter(
+        Venue.latitude.between(latitude - band, latitude + band)
+    )
+    distances = sorted(
+        (round(distance_km(latitude, longitude, r.latitude, r.longitude), 3), r.id)
+        for r in rows
+        if r.longitude is not None
+    )
+    return [d for d, _ in distances if d <= radius][:limit]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1000000)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--limit", type=int, default=50)
+    args = parser.parse_args(argv)
+
+    app = make_app()
+    from models import Venue, db
+    from queries import venues_near
+
+    with app.app_context():
+        if not db.session.query(Venue.id).first():
+            print(f"Inserting {args.rows} venues ...")
+            fill(db, Venue, args.rows)
+            analyze(db)
+        total = db.session.query(db.func.count(Venue.id)).scalar()
+        print(f"{total} venues, {args.limit} nearest")
+        print(
+            f"{'point':<18} {'radius':>7} {'found':>6} {'stmts':>6}"
+            f" {'p50 ms':>8} {'max ms':>8} {'right':>6}"
+        )
+        wrong = 0
+        for label, latitude, longitude, radius in POINTS:
+            samples = []
+            for _ in range(args.repeat):
+                with count_statements(db.engine) as statements:
+                    started = time.perf_counter()
+                    found = venues_near(latitude, longitude, radius, args.limit)
+                    samples.append((time.perf_counter() - started) * 1000)
+            # Ties in distance may come in either order, compare distances
+            right = [v["distance_km"] for v in found] == brute_force(
+                db, Venue, latitude, longitude, radius, args.limit
+            )
+            wrong += not right
+            print(
+                f"{label:<18} {radius:>7} {len(found):>6} {len(statements):>6}"
+                f" {statistics.median(samples):>8.2f} {max(samples):>8.2f}"
+                f" {'yes' if right else 'NO':>6}"
+            )
+    if wrong:
+        print(f"{wrong} lookups missed nearer venues!", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
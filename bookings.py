@@ -0,0 +1,79 @@
+# ----------------------------------------------------------------------------#
+# Bookings.
+# ----------------------------------------------------------------------------#
+"""Booking conflicts and venue availability.
+
+A show occupies its venue and its artist from ``start_time`` for ``duration``
+minutes.  Durations are capped at ``SHOW_MAX_DURATION``, so every show that
+overlaps ``[start, end)`` starts in ``(start - SHOW_MAX_DURATION, end)``.  The
+``(venue_id, start_time)`` and ``(artist_id, start_time)`` indexes therefore
+act as interval indexes: finding the overlapping bookings of a venue or an
+artist is one index range scan, O(log n + k), on PostgreSQL and SQLite alike.
+"""
+
+from datetime import timedelta
+
+from models import SHOW_MAX_DURATION, Artist, Show, Venue
+
+
+def overlapping(column, owner_id, start, end, exclude=None):
+    """Shows whose column equals owner_id and that overlap [start, end)"""
+    query = Show.query.filter(
+        column == owner_id,
+        Show.start_time < end,
+        Show.start_time > start - timedelta(minutes=SHOW_MAX_DURATION),
+    )
+    if exclude is not None:
+        query = query.filter(Show.id != exclude)
+    return [s for s in query.order_by(Show.start_time) if s.end_time > start]
+
+
+def conflicts(show, lock=False):
+    """The bookings show clashes with, at its venue or for its artist.
+
+    With ``lock`` the venue and artist rows are locked first (in that order),
+    so concurrent bookings of either are checked and inserted one at a time.
+    Works for new shows as well as edited ones, which skip themselves.
+    """
+    # Form data may hold the ids as strings
+    venue_id, artist_id = int(show.venue_id), int(show.artist_id)
+    if lock:
+        Venue.query.filter_by(id=venue_id).with_for_update().first()
+        Artist.query.filter_by(id=artist_id).with_for_update().first()
+    start, end = show.start_time, show.end_time
+    clashes = overlapping(Show.venue_id, venue_id, start, end, show.id)
+    clashes += [
+        s
+        for s in overlapping(Show.artist_id, artist_id, start, end, show.id)
+        if s.venue_id != venue_id
+    ]
+    return clashes
+
+
+def describe(show, clashes):
+    """A message naming the first booking show clashes with"""
+    clash = clashes[0]
+    who = "The venue" if clash.venue_id == int(show.venue_id) else "The artist"
+    return (
+        f"{who} is already booked from {clash.start_time:%Y-%m-%d %H:%M} "
+        f"to {clash.end_time:%Y-%m-%d %H:%M}"
+    )
+
+
+def free_slots(venue_id, start, end):
+    """The busy and the free [start, end) intervals of a venue in a window"""
+    busy = []
+    for show in overlapping(Show.venue_id, venue_id, start, end):
+        slot_start, slot_end = max(show.start_time, start), min(show.end_time, end)
+        if busy and slot_start <= busy[-1][1]:
+            busy[-1] = (busy[-1][0], max(busy[-1][1], slot_end))
+        else:
+            busy.append((slot_start, slot_end))
+    free, cursor = [], start
+    for slot_start, slot_end in busy:
+        if slot_start > cursor:
+            free.append((cursor, slot_start))
+        cursor = max(cursor, slot_end)
+    if cursor < end:
+        free.append((cursor, end))
+    return busy, free
@@ -0,0 +1,187 @@
+# ----------------------------------------------------------------------------#
+# Page cache.
+# ----------------------------------------------------------------------------#
+"""Cache for rendered pages, keyed per entity.
+
+Views opt in with the ``page_cache.cached(kind, arg)`` decorator, which keys
+the rendered page on ``"<kind>:<view argument>"`` (e.g. ``venue:3``) and keeps
+it for ``CACHE_TTL`` seconds.  The write paths have
+``page_cache.invalidate(kind, *ids)`` called for every entity whose page they
+change, by a job run after they commit (``views.pages_changed``).
+
+Backends are picked with ``CACHE_BACKEND``:
+
+* ``"lru"`` -- an in-process LRU of at most ``CACHE_MAXSIZE`` pages.
+* ``"redis"`` -- anything that speaks the Redis protocol, at
+  ``CACHE_REDIS_URL``.  Needs the ``redis`` package.
+* ``"null"`` -- caches nothing, e.g. for benchmarks of the uncached views.
+
+The hits and misses of the lookups are counted at ``/metrics``.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from flask import request, session
+
+from metrics import Counters, sql_metrics
+
+
+class NullBackend:
+    """Never has anything, for running the views uncached"""
+
+    def get(self, key):
+        return None
+
+    def set(self, key, value, ttl):
+        pass
+
+    def delete(self, *keys):
+        pass
+
+
+class LRUBackend:
+    """In-process LRU with per entry expiry"""
+
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires = entry
+            if expires < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def delete(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+
+
+class RedisBackend:
+    """Shared cache on a Redis protocol server, expiry is left to the server"""
+
+    def __init__(self, url):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError('CACHE_BACKEND = "redis" needs the redis package')
+        self._client = redis.Redis.from_url(url)
+
+    def get(self, key):
+        value = self._client.get(key)
+        return None if value is None else value.decode("utf-8")
+
+    def set(self, key, value, ttl):
+        self._client.set(key, value.encode("utf-8"), ex=ttl)
+
+    def delete(self, *keys):
+        if keys:
+            self._client.delete(*keys)
+
+
+class PageCache:
+    """Flask extension caching the pages rendered by the decorated views"""
+
+    prefix = "fyyur:page:"
+
+    def __init__(self, app=None):
+        self.backend = None
+        self.ttl = 60
+        self.lookups = Counters(
+            "fyyur_page_cache_total", "Page cache lookups by result.", label="result"
+        )
+        sql_metrics.register(self.lookups)
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault("CACHE_BACKEND", "lru")
+        app.config.setdefault("CACHE_TTL", 60)
+        app.config.setdefault("CACHE_MAXSIZE", 1024)
+        app.config.setdefault("CACHE_REDIS_URL", "redis://localhost:6379/0")
+        if app.config["CACHE_BACKEND"] == "redis":
+            self.backend = RedisBackend(app.config["CACHE_REDIS_URL"])
+        elif app.config["CACHE_BACKEND"] == "null":
+            self.backend = NullBackend()
+        else:
+            self.backend = LRUBackend(app.config["CACHE_MAXSIZE"])
+        self.ttl = app.config["CACHE_TTL"]
+        app.extensions["page_cache"] = self
+
+    @property
+    def shared(self):
+        """Whether every process sees the same cache, and may invalidate it"""
+        return isinstance(self.backend, RedisBackend)
+
+    def key(self, kind, id):
+        return f"{self.prefix}{kind}:{id}"
+
+    def cacheable(self):
+        """Whether the current request may be served from and stored in the cache.
+
+        Only GET requests without a query string are, the key leaves it out
+        (e.g. ?history=all).  Requests with flashed messages waiting are
+        passed straight through, the messages are part of the page and only
+        meant for this one visitor.
+        """
+        return (
+            request.method == "GET" and not request.args and not session.get("_flashes")
+        )
+
+    def lookup(self, kind, id):
+        """The cached page of the entity, or None"""
+        page = self.backend.get(self.key(kind, id))
+        self.lookups.inc("miss" if page is None else "hit")
+        return page
+
+    def store(self, kind, id, page):
+        """Keep a rendered page of the entity, anything else is not cached"""
+        if isinstance(page, str):
+            self.backend.set(self.key(kind, id), page, self.ttl)
+
+    def cached(self, kind, arg):
+        """Cache the page a view renders under "<kind>:<view argument arg>".
+
+        Only successfully rendered pages of cacheable() requests are stored.
+        """
+
+        def decorator(view):
+            @wraps(view)
+            def wrapper(*args, **kwargs):
+                if not self.cacheable():
+                    return view(*args, **kwargs)
+                page = self.lookup(kind, kwargs[arg])
+                if page is not None:
+                    return page
+                rv = view(*args, **kwargs)
+                self.store(kind, kwargs[arg], rv)
+                return rv
+
+            return wrapper
+
+        return decorator
+
+    def invalidate(self, kind, *ids):
+        """Drop the cached pages of the given entities"""
+        self.backend.delete(*(self.key(kind, id) for id in ids))
+
+
+page_cache = PageCache()
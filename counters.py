@@ -0,0 +1,300 @@
+# ----------------------------------------------------------------------------#
+# Show counters.
+# ----------------------------------------------------------------------------#
+"""Upcoming and past show counts per venue and artist.
+
+The listings, searches, ``/venues/near``, ``/autocomplete`` and ``/matches``
+read ``ShowCount`` instead of counting shows.  A show counts as past once it
+started at or before ``ShowCountSweep.swept_until``, and as upcoming before
+that.  The venue and artist pages split their shows on the current time
+instead, so a show that started since the last sweep is still upcoming in
+the counts while its page lists it as past.  That lag, at most the interval
+between sweeps, is the accepted staleness of the counts.
+
+* Shows created, edited or deleted through the ORM update the counters in
+  the same flush.  A venue or artist without a row has no shows.
+* Bulk loads (``load_data.py``, ``generate_data.py``) call ``refresh()`` for
+  the venues and artists they touched.
+* ``sweep()`` moves the shows that started since the last sweep from upcoming
+  to past.  Run ``python app.py counters sweep`` every minute or so.
+* ``python app.py counters check [--fix]`` compares every counter against a
+  fresh count of the shows.
+"""
+
+import sys
+from datetime import datetime
+
+from flask_script import Command, Manager, Option
+from sqlalchemy import and_, bindparam, case, event, func, literal, select
+
+from models import Artist, Show, ShowCount, ShowCountSweep, Venue, db
+
+OWNERS = {"venue": (Venue, Show.venue_id), "artist": (Artist, Show.artist_id)}
+
+counts_table = ShowCount.__table__
+sweep_table = ShowCountSweep.__table__
+
+
+def swept_until(session, lock=None):
+    """The sweep time, optionally locked "share" (bookings) or "update" (sweep)"""
+    query = select([sweep_table.c.swept_until]).where(sweep_table.c.id == 1)
+    if lock is not None:
+        query = query.with_for_update(read=lock == "share")
+    until = session.execute(query).scalar()
+    if until is None:
+        until = datetime.now()
+        session.execute(sweep_table.insert().values(id=1, swept_until=until))
+    return until
+
+
+def counts(kind, owner_id):
+    """(upcoming, past) shows of the venue or artist"""
+    row = ShowCount.query.get((kind, owner_id))
+    return (row.upcoming, row.past) if row is not None else (0, 0)
+
+
+def upcoming_column(kind, model):
+    """A (join condition, column) pair adding the upcoming count to a query"""
+    on = and_(ShowCount.kind == kind, ShowCount.owner_id == model.id)
+    return on, func.coalesce(ShowCount.upcoming, 0)
+
+
+def _bump(session, deltas):
+    """Add {(kind, owner_id): (upcoming, past)} to the counters"""
+    deltas = {key: delta for key, delta in deltas.items() if any(delta)}
+    if not deltas:
+        return
+    for kind in {kind for kind, _ in deltas}:
+        ids = [owner for k, owner in deltas if k == kind]
+        stored = {
+            owner
+            for owner, in session.execute(
+                select([counts_table.c.owner_id]).where(
+                    and_(counts_table.c.kind == kind, counts_table.c.owner_id.in_(ids))
+                )
+            )
+        }
+        missing = [
+            {"kind": kind, "owner_id": owner, "upcoming": 0, "past": 0}
+            for owner in ids
+            if owner not in stored
+        ]
+        if missing:
+            session.execute(counts_table.insert(), missing)
+    session.execute(
+        counts_table.update()
+        .where(
+            and_(
+                counts_table.c.kind == bindparam("_kind"),
+                counts_table.c.owner_id == bindparam("_owner_id"),
+            )
+        )
+        .values(
+            upcoming=counts_table.c.upcoming + bindparam("_upcoming"),
+            past=counts_table.c.past + bindparam("_past"),
+        ),
+        [
+            {"_kind": kind, "_owner_id": owner, "_upcoming": up, "_past": past}
+            for (kind, owner), (up, past) in deltas.items()
+        ],
+    )
+
+
+def _values(show):
+    return show.venue_id, show.artist_id, show.start_time
+
+
+@event.listens_for(db.session, "before_flush")
+def _before_flush(session, flush_context, instances):
+    # The stored rows of the shows about to change; attribute history is no
+    # help, an expired show that gets edited has none
+    deleted = [s.id for s in session.deleted if isinstance(s, Show)]
+    edited = [
+        s
+        for s in session.dirty
+        if isinstance(s, Show) and s.id is not None and session.is_modified(s)
+    ]
+    ids = deleted + [s.id for s in edited]
+    if not ids:
+        return
+    session.info.setdefault("show_count_removed", []).extend(
+        tuple(row)
+        for row in session.execute(
+            select([Show.venue_id, Show.artist_id, Show.start_time]).where(
+                Show.id.in_(ids)
+            )
+        )
+    )
+    session.info.setdefault("show_count_edited", []).extend(edited)
+
+
+@event.listens_for(db.session, "after_flush")
+def _after_flush(session, flush_context):
+    changes = [(-1, values) for values in session.info.pop("show_count_removed", [])]
+    changes += [(1, _values(s)) for s in session.info.pop("show_count_edited", [])]
+    changes += [(1, _values(s)) for s in session.new if isinstance(s, Show)]
+    for owner in session.deleted:
+        if isinstance(owner, (Venue, Artist)):
+            session.execute(
+                counts_table.delete().where(
+                    and_(
+                        counts_table.c.kind == owner.__tablename__,
+                        counts_table.c.owner_id == owner.id,
+                    )
+                )
+            )
+    if not changes:
+        return
+    until = swept_until(session, lock="share")
+    deltas = {}
+    for sign, (venue_id, artist_id, start_time) in changes:
+        if start_time is None:
+            continue
+        upcoming = start_time > until
+        for kind, owner in (("venue", venue_id), ("artist", artist_id)):
+            if owner is None:
+                continue
+            delta = deltas.setdefault((kind, int(owner)), [0, 0])
+            delta[0 if upcoming else 1] += sign
+    _bump(session, deltas)
+
+
+@event.listens_for(db.session, "after_soft_rollback")
+def _after_rollback(session, previous_transaction):
+    session.info.pop("show_count_removed", None)
+    session.info.pop("show_count_edited", None)
+
+
+def _actual(kind, until, ids=None):
+    """select of (kind, owner_id, upcoming, past) counted from the shows"""
+    _, column = OWNERS[kind]
+    query = (
+        select(
+            [
+                literal(kind).label("kind"),
+                column.label("owner_id"),
+                func.sum(case([(Show.start_time > until, 1)], else_=0)),
+                func.sum(case([(Show.start_time <= until, 1)], else_=0)),
+            ]
+        )
+        .where(column.isnot(None))
+        .group_by(column)
+    )
+    if ids is not None:
+        query = query.where(column.in_(ids))
+    return query
+
+
+def refresh(kind, ids=None):
+    """Recount the shows of the given venues or artists, or of all of them"""
+    until = swept_until(db.session)
+    delete = counts_table.delete().where(counts_table.c.kind == kind)
+    if ids is not None:
+        ids = list(ids)
+        delete = delete.where(counts_table.c.owner_id.in_(ids))
+    db.session.execute(delete)
+    db.session.execute(
+        counts_table.insert().from_select(
+            ["kind", "owner_id", "upcoming", "past"], _actual(kind, until, ids)
+        )
+    )
+
+
+def rebuild():
+    """Recount every counter"""
+    for kind in OWNERS:
+        refresh(kind)
+    db.session.commit()
+
+
+def sweep(now=None):
+    """Move the shows that started since the last sweep to past, returns how many"""
+    now = now or datetime.now()
+    until = swept_until(db.session, lock="update")
+    moved = 0
+    if now > until:
+        for kind, (_, column) in OWNERS.items():
+            rows = db.session.execute(
+                select([column, func.count()])
+                .where(
+                    and_(
+                        Show.start_time > until,
+                        Show.start_time <= now,
+                        column.isnot(None),
+                    )
+                )
+                .group_by(column)
+            ).fetchall()
+            _bump(db.session, {(kind, owner): (-n, n) for owner, n in rows})
+            if kind == "venue":
+                moved = sum(n for _, n in rows)
+        db.session.execute(
+            sweep_table.update().where(sweep_table.c.id == 1).values(swept_until=now)
+        )
+    db.session.commit()
+    return moved
+
+
+def check():
+    """(kind, owner_id, stored, actual) of every counter that is off"""
+    until = swept_until(db.session)
+    wrong = []
+    for kind in OWNERS:
+        actual = {
+            owner: (upcoming, past)
+            for _, owner, upcoming, past in db.session.execute(_actual(kind, until))
+        }
+        stored = {
+            row.owner_id: (row.upcoming, row.past)
+            for row in ShowCount.query.filter_by(kind=kind)
+        }
+        for owner in sorted(set(actual) | set(stored)):
+            have, want = stored.get(owner, (0, 0)), actual.get(owner, (0, 0))
+            if have != want:
+                wrong.append((kind, owner, have, want))
+    return wrong
+
+
+# ----------------------------------------------------------------------------#
+# Commands, registered as "python app.py counters ..."
+# ----------------------------------------------------------------------------#
+
+
+class Sweep(Command):
+    """Move the shows that started since the last sweep to past"""
+
+    def run(self):
+        print(f"Moved {sweep()} shows to past")
+
+
+class Check(Command):
+    """Compare the counters with the shows, exits 1 when any is off"""
+
+    option_list = (Option("--fix", action="store_true", help="rebuild if off"),)
+
+    def run(self, fix):
+        wrong = check()
+        for kind, owner, (up, past), (want_up, want_past) in wrong:
+            print(
+                f"{kind} {owner}: {up} upcoming / {past} past, "
+                f"should be {want_up} / {want_past}"
+            )
+        print(f"{len(wrong)} counters are off")
+        if wrong and fix:
+            rebuild()
+            print("Rebuilt the counters")
+        elif wrong:
+            sys.exit(1)
+
+
+class Rebuild(Command):
+    """Recount every counter from the shows"""
+
+    def run(self):
+        rebuild()
+
+
+commands = Manager(usage="Maintain the upcoming/past show counters")
+commands.add_command("sweep", Sweep())
+commands.add_command("check", Check())
+commands.add_command("rebuild", Rebuild())
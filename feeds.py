@@ -0,0 +1,227 @@
+# ----------------------------------------------------------------------------#
+# Calendar feeds.
+# ----------------------------------------------------------------------------#
+"""iCalendar (RFC 5545) feeds of the shows of a venue or an artist.
+
+``/venues/<id>/calendar.ics`` and ``/artists/<id>/calendar.ics`` list the
+shows starting between ``?from=`` and ``?to=`` (ISO 8601).  Without
+``?from=`` the feed starts ``ICS_PAST_DAYS`` days before today, without
+``?to=`` it runs to the last show booked.
+
+Feeds are polled, so every response carries an ``ETag`` from one aggregate
+statement over the shows in the window (how many, and when they, their
+venues and artists last changed), and a client that sends it back gets a 304
+without a single show being read.  There is no ``Last-Modified``: the latest
+change among the shows left in the window goes back in time when one is
+deleted or leaves the window, which a client sending only
+``If-Modified-Since`` would not notice.
+Otherwise the shows are streamed to the client as they come off a server
+side cursor, ``ICS_BATCH_SIZE`` rows at a time, so neither the process nor
+the database holds the whole feed.  (Behind ``asgi.py`` the response is
+buffered, like every route it hands to the WSGI app.)
+
+Show times are stored without a time zone and are sent as floating local
+times, the way the pages show them.
+"""
+
+import hashlib
+from datetime import datetime, timedelta
+
+from flask import (
+    Blueprint,
+    Response,
+    abort,
+    current_app,
+    request,
+    stream_with_context,
+    url_for,
+)
+from sqlalchemy import and_, func
+from werkzeug.exceptions import BadRequest
+from werkzeug.http import is_resource_modified
+
+from models import Artist, Show, Venue, db
+from views import parse_date
+
+feeds = Blueprint("feeds", __name__)
+
+# The model and show column of each feed kind, and of the other side
+OWNERS = {
+    "venue": (Venue, Show.venue_id, Artist, Show.artist_id),
+    "artist": (Artist, Show.artist_id, Venue, Show.venue_id),
+}
+
+PRODID = "-//Fyyur//Show calendar//EN"
+
+
+def escape(text):
+    """text as an iCalendar TEXT value"""
+    return (
+        (text or "")
+        .replace("\\", "\\\\")
+        .replace(";", "\\;")
+        .replace(",", "\\,")
+        .replace("\r\n", "\\n")
+        .replace("\n", "\\n")
+    )
+
+
+def fold(line):
+    """line as a content line: folded at 75 octets, CRLF terminated"""
+    if len(line.encode("utf-8")) <= 75:
+        return line + "\r\n"
+    parts, part, size = [], "", 0
+    for char in line:
+        width = len(char.encode("utf-8"))
+        # Continuation lines start with a space, which counts
+        if size + width > (75 if not parts else 74):
+            parts.append(part)
+            part, size = "", 0
+        part += char
+        size += width
+    parts.append(part)
+    return "\r\n ".join(parts) + "\r\n"
+
+
+def _local(value):
+    return value.strftime("%Y%m%dT%H%M%S")
+
+
+def _utc(value):
+    return value.strftime("%Y%m%dT%H%M%SZ")
+
+
+def window():
+    """The (start, end) of the feed from ?from= and ?to=, end may be None.
+
+    Like on /shows, a date that does not parse is ignored.
+    """
+    start = request.args.get("from", type=parse_date)
+    end = request.args.get("to", type=parse_date)
+    if start is None:
+        # Whole days, so the ETag of the default window holds for a day
+        today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        start = today - timedelta(days=current_app.config["ICS_PAST_DAYS"])
+    start = start.replace(tzinfo=None)
+    end = end.replace(tzinfo=None) if end is not None else None
+    if end is not None and end <= start:
+        raise BadRequest("to must be after from")
+    return start, end
+
+
+def _in_window(start, end):
+    condition = Show.start_time >= start
+    if end is not None:
+        condition = and_(condition, Show.start_time < end)
+    return condition
+
+
+def validators(kind, owner_id, start, end):
+    """(name, ETag) of a feed, None if there is no such owner.
+
+    One statement: the owner with the number of shows in the window and the
+    latest change to them, their venues and their artists.  Adding, editing
+    or deleting a show or renaming a venue or artist changes the ETag.
+    """
+    model, column, other, other_column = OWNERS[kind]
+    row = (
+        db.session.query(
+            model.name,
+            model.updated_at,
+            func.count(Show.id),
+            func.max(Show.updated_at),
+            func.max(other.updated_at),
+        )
+        .select_from(model)
+        .outerjoin(Show, and_(column == model.id, _in_window(start, end)))
+        .outerjoin(other, other.id == other_column)
+        .filter(model.id == owner_id)
+        .group_by(model.id, model.name, model.updated_at)
+        .first()
+    )
+    if row is None:
+        return None
+    state = ":".join(map(str, (kind, owner_id, start, end, *row[1:])))
+    return row[0], hashlib.sha1(state.encode("utf-8")).hexdigest()[:20]
+
+
+def events(kind, owner_id, start, end):
+    """The VEVENT blocks of the shows in the window, one string per show"""
+    _, column, _, _ = OWNERS[kind]
+    query = (
+        db.session.query(
+            Show.id,
+            Show.start_time,
+            Show.duration,
+            Show.updated_at,
+            Venue.id.label("venue_id"),
+            Venue.name.label("venue_name"),
+            Venue.address,
+            Venue.city,
+            Venue.state,
+            Artist.id.label("artist_id"),
+            Artist.name.label("artist_name"),
+        )
+        .join(Venue, Venue.id == Show.venue_id)
+        .join(Artist, Artist.id == Show.artist_id)
+        .filter(column == owner_id, _in_window(start, end))
+        .order_by(Show.start_time, Show.id)
+        # A server side cursor on PostgreSQL, fetched batch by batch
+        .yield_per(current_app.config["ICS_BATCH_SIZE"])
+    )
+    host = request.host
+    for s in query:
+        location = ", ".join(p for p in (s.venue_name, s.address, s.city, s.state) if p)
+        page = (
+            url_for("artists.show_artist", artist_id=s.artist_id, _external=True)
+            if kind == "venue"
+            else url_for("venues.show_venue", venue_id=s.venue_id, _external=True)
+        )
+        lines = [
+            "BEGIN:VEVENT",
+            f"UID:show-{s.id}@{host}",
+            f"DTSTAMP:{_utc(s.updated_at)}",
+            f"DTSTART:{_local(s.start_time)}",
+            f"DTEND:{_local(s.start_time + timedelta(minutes=s.duration))}",
+            f"SUMMARY:{escape(f'{s.artist_name} at {s.venue_name}')}",
+            f"LOCATION:{escape(location)}",
+            f"URL:{page}",
+            "END:VEVENT",
+        ]
+        yield "".join(fold(line) for line in lines)
+
+
+def calendar(kind, owner_id):
+    """The feed response of a venue or artist, 304 when the client has it"""
+    start, end = window()
+    found = validators(kind, owner_id, start, end)
+    if found is None:
+        abort(404)
+    name, etag = found
+    if not is_resource_modified(request.environ, etag=etag):
+        response = Response(status=304)
+    else:
+
+        def generate():
+            yield fold("BEGIN:VCALENDAR") + fold("VERSION:2.0")
+            yield fold(f"PRODID:{PRODID}") + fold("CALSCALE:GREGORIAN")
+            yield fold("METHOD:PUBLISH") + fold(f"X-WR-CALNAME:{escape(name)}")
+            yield from events(kind, owner_id, start, end)
+            yield fold("END:VCALENDAR")
+
+        response = Response(stream_with_context(generate()), mimetype="text/calendar")
+        response.headers["Content-Disposition"] = (
+            f'inline; filename="{kind}-{owner_id}.ics"'
+        )
+    response.set_etag(etag)
+    return response
+
+
+@feeds.route("/venues/<int:venue_id>/calendar.ics")
+def venue_calendar(venue_id):
+    return calendar("venue", venue_id)
+
+
+@feeds.route("/artists/<int:artist_id>/calendar.ics")
+def artist_calendar(artist_id):
+    return calendar("artist", artist_id)
@@ -4,11 +4,14 @@ from flask_wtf import FlaskForm
 from wtforms import (
     BooleanField,
     DateTimeField,
+    IntegerField,
     SelectField,
     SelectMultipleField,
     StringField,
 )
-from wtforms.validators import URL, AnyOf, DataRequired  # noqa
+from wtforms.validators import URL, AnyOf, DataRequired, NumberRange  # noqa
+
+from models import SHOW_DEFAULT_DURATION, SHOW_MAX_DURATION
 
 states = [
     ("AL", "AL"),
@@ -115,6 +118,11 @@ class ShowForm(FlaskForm):
     start_time = DateTimeField(
         "start_time", validators=[DataRequired()], default=datetime.today()
     )
+    duration = IntegerField(
+        "duration",
+        validators=[NumberRange(1, SHOW_MAX_DURATION)],
+        default=SHOW_DEFAULT_DURATION,
+    )
 
 
 class VenueForm(FlaskForm):
@@ -0,0 +1,249 @@
+"""Generate a large synthetic dataset of venues, artists and shows.
+
+The data is shaped like the real thing rather than uniform: a few big cities
+hold most of the venues and artists, a few popular venues and artists get
+most of the bookings, and shows spread over the past years and the coming
+months at evening hours.  Like the booking form (``bookings.conflicts``), no
+show overlaps another one of its venue or artist, those already in the
+database included.
+
+    python generate_data.py --venues 10000 --artists 20000 --shows 500000
+
+Rows are added to whatever is already in the database at DATABASE_URL.
+"""
+
+import argparse
+import bisect
+import itertools
+import math
+import random
+from datetime import datetime, timedelta
+
+from forms import genres as GENRE_CHOICES
+
+# (city, state), biggest first; the weights fall off like Zipf's law
+CITIES = [
+    ("New York", "NY"),
+    ("Los Angeles", "CA"),
+    ("Chicago", "IL"),
+    ("Houston", "TX"),
+    ("Nashville", "TN"),
+    ("San Francisco", "CA"),
+    ("Austin", "TX"),
+    ("Seattle", "WA"),
+    ("New Orleans", "LA"),
+    ("Atlanta", "GA"),
+    ("Denver", "CO"),
+    ("Boston", "MA"),
+    ("Portland", "OR"),
+    ("Detroit", "MI"),
+    ("Memphis", "TN"),
+    ("Philadelphia", "PA"),
+    ("Miami", "FL"),
+    ("Minneapolis", "MN"),
+    ("Kansas City", "MO"),
+    ("Burlington", "VT"),
+]
+ADJECTIVES = (
+    "blue velvet golden rusty electric silent crimson midnight wild lucky "
+    "little grand hidden broken copper neon lonesome royal"
+).split()
+VENUE_NOUNS = "lounge hall club bar tavern garden theatre house cellar room".split()
+ARTIST_NOUNS = "band trio quartet collective orchestra brothers sisters project".split()
+GENRES = [name for name, _ in GENRE_CHOICES]
+
+
+def zipf_weights(n, s=1.1):
+    return [1 / (rank**s) for rank in range(1, n + 1)]
+
+
+def _name(rng, nouns, i):
+    return f"The {rng.choice(ADJECTIVES).title()} {rng.choice(nouns).title()} {i}"
+
+
+def _entities(rng, model, count, first_id, nouns):
+    from geo import gazetteer, locate
+
+    city_weights = zipf_weights(len(CITIES))
+    # Its own generator, the rest of the data stays the same for a seed
+    spread = random.Random(first_id)
+    genre_weights = zipf_weights(len(GENRES), s=0.8)
+    for i in range(first_id, first_id + count):
+        city, state = rng.choices(CITIES, city_weights)[0]
+        row = {
+            "id": i,
+            "name": _name(rng, nouns, i),
+            "city": city,
+            "state": state,
+            "phone": f"{rng.randint(200, 999)}-{rng.randint(100, 999)}-"
+            f"{rng.randint(1000, 9999)}",
+            "image_link": f"https://picsum.photos/seed/{model.__tablename__}{i}/400",
+        }
+        if model.__tablename__ == "venue":
+            row["address"] = (
+                f"{rng.randint(1, 9999)} {rng.choice(ADJECTIVES).title()} St"
+            )
+            row["seeking_talent"] = rng.random() < 0.3
+            # Scattered over a few kilometres around the centre of the city
+            latitude, longitude = gazetteer.lookup(city, state)
+            row["latitude"] = latitude + spread.gauss(0, 0.05)
+            row["longitude"] = longitude + spread.gauss(0, 0.05) / math.cos(
+                math.radians(latitude)
+            )
+            locate(row)
+        else:
+            row["seeking_venue"] = rng.random() < 0.4
+        genres = set(rng.choices(GENRES, genre_weights, k=rng.randint(1, 3)))
+        yield row, genres
+
+
+class Bookings:
+    """The booked (start, end) intervals of each venue and artist, by start"""
+
+    def __init__(self, longest):
+        self.longest = longest
+        self.intervals = {}
+
+    def free(self, owner, start, end):
+        """Whether the owner, e.g. ("venue", 3), is free from start to end"""
+        booked = self.intervals.get(owner, [])
+        i = bisect.bisect_left(booked, (start,))
+        if i < len(booked) and booked[i][0] < end:
+            return False
+        # Only the shows starting less than the longest duration before can
+        # still run at start
+        while i > 0 and booked[i - 1][0] > start - self.longest:
+            i -= 1
+            if booked[i][1] > start:
+                return False
+        return True
+
+    def book(self, owner, start, end):
+        bisect.insort(self.intervals.setdefault(owner, []), (start, end))
+
+
+def generate(db, venues=0, artists=0, shows=0, seed=0, chunk=10000, log=print):
+    """Insert the requested number of venues, artists and shows.
+
+    Shows are booked at venues and artists that exist after the new ones are
+    added, 70% of them in the past three years and the rest in the next year.
+    A show that would overlap a booking of its venue or artist is drawn
+    again; when too many are, fewer shows are inserted than requested.
+    """
+    from counters import rebuild
+    from models import (
+        SHOW_DEFAULT_DURATION,
+        SHOW_MAX_DURATION,
+        Artist,
+        Genre,
+        Show,
+        Venue,
+    )
+
+    rng = random.Random(seed)
+    genre_ids = {g.name: g for g in Genre.for_names(GENRES)}
+    db.session.add_all(genre_ids.values())
+    db.session.flush()
+    genre_ids = {name: g.id for name, g in genre_ids.items()}
+
+    for model, count, nouns in (
+        (Venue, venues, VENUE_NOUNS),
+        (Artist, artists, ARTIST_NOUNS),
+    ):
+        if not count:
+            continue
+        association = model.genre_list.property.secondary
+        owner = f"{model.__tablename__}_id"
+        first_id = (db.session.query(db.func.max(model.id)).scalar() or 0) + 1
+        rows = _entities(rng, model, count, first_id, nouns)
+        for batch in iter(lambda: list(itertools.islice(rows, chunk)), []):
+            db.session.execute(model.__table__.insert(), [r for r, _ in batch])
+            db.session.execute(
+                association.insert(),
+                [
+                    {"genre_id": genre_ids[g], owner: r["id"]}
+                    for r, genres in batch
+                    for g in genres
+                ],
+            )
+            db.session.commit()
+        log(f"{count} {model.__tablename__}s")
+
+    if shows:
+        venue_ids = [v for v, in db.session.query(Venue.id).order_by(Venue.id)]
+        artist_ids = [a for a, in db.session.query(Artist.id).order_by(Artist.id)]
+        # The first few venues/artists are the popular ones
+        venue_weights = list(itertools.accumulate(zipf_weights(len(venue_ids), 0.9)))
+        artist_weights = list(itertools.accumulate(zipf_weights(len(artist_ids), 0.7)))
+        now = datetime.now().replace(minute=0, second=0, microsecond=0)
+        duration = timedelta(minutes=SHOW_DEFAULT_DURATION)
+        bookings = Bookings(timedelta(minutes=SHOW_MAX_DURATION))
+        for venue_id, artist_id, start_time, minutes in db.session.query(
+            Show.venue_id, Show.artist_id, Show.start_time, Show.duration
+        ).yield_per(chunk):
+            end_time = start_time + timedelta(minutes=minutes)
+            bookings.book(("venue", venue_id), start_time, end_time)
+            bookings.book(("artist", artist_id), start_time, end_time)
+        inserted = overlaps = 0
+        while inserted < shows and overlaps < 10 * shows:
+            batch = []
+            while len(batch) < min(chunk, shows - inserted) and overlaps < 10 * shows:
+                if rng.random() < 0.7:
+                    day = -rng.randint(1, 3 * 365)
+                else:
+                    day = rng.randint(0, 365)
+                start_time = (now + timedelta(days=day)).replace(
+                    hour=rng.choice([18, 19, 20, 21, 22]),
+                    minute=rng.choice([0, 30]),
+                )
+                venue = ("venue", rng.choices(venue_ids, cum_weights=venue_weights)[0])
+                artist = (
+                    "artist",
+                    rng.choices(artist_ids, cum_weights=artist_weights)[0],
+                )
+                end_time = start_time + duration
+                if not (
+                    bookings.free(venue, start_time, end_time)
+                    and bookings.free(artist, start_time, end_time)
+                ):
+                    overlaps += 1
+                    continue
+                bookings.book(venue, start_time, end_time)
+                bookings.book(artist, start_time, end_time)
+                batch.append(
+                    {
+                        "venue_id": venue[1],
+                        "artist_id": artist[1],
+                        "start_time": start_time,
+                    }
+                )
+            if batch:
+                db.session.execute(Show.__table__.insert(), batch)
+                db.session.commit()
+            inserted += len(batch)
+        rebuild()
+        log(f"{inserted} shows, {overlaps} overlapping draws skipped")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--venues", type=int, default=1000)
+    parser.add_argument("--artists", type=int, default=2000)
+    parser.add_argument("--shows", type=int, default=20000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--chunk", type=int, default=10000)
+    args = parser.parse_args(argv)
+
+    from app import create_base_app
+    from models import db
+
+    app = create_base_app()
+
+    with app.app_context():
+        generate(
+            db, args.venues, args.artists, args.shows, seed=args.seed, chunk=args.chunk
+        )
+
+
+if __name__ == "__main__":
+    main()
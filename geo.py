@@ -0,0 +1,210 @@
+# ----------------------------------------------------------------------------#
+# Venue locations.
+# ----------------------------------------------------------------------------#
+"""Venue coordinates, an offline geocoder and a geohash index.
+
+* ``Venue.latitude``/``longitude`` are filled in from the bundled gazetteer
+  (``gazetteer.csv``, the centre of each listed US city) whenever a venue is
+  saved without coordinates or moves to another city; nothing goes over the
+  network.  Venues in a city that is not listed have no coordinates and are
+  never "near" anything.  ``python app.py geo geocode [--all]`` fills in the
+  venues saved before, the bulk loaders call ``locate()`` per row.
+* ``Venue.geohash`` interleaves the longitude and latitude bits of the
+  coordinates (``GEOHASH_BITS`` of them), so every geohash cell -- a
+  rectangle of the map -- is one contiguous range of integers.  ``cover()``
+  turns a circle into a few such ranges, which a plain B-tree index on
+  ``geohash`` answers on PostgreSQL and SQLite alike: no PostGIS needed.
+"""
+
+import csv
+import math
+import os
+
+from flask_script import Command, Manager, Option
+from sqlalchemy import event, inspect
+
+from models import Venue, db
+
+GEOHASH_BITS = 50  # 25 per axis, cells of about a metre
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+
+GAZETTEER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "gazetteer.csv")
+
+
+def _interleave(x, y, bits):
+    """bits bits of x and y each, interleaved x first"""
+    code = 0
+    for i in range(bits - 1, -1, -1):
+        code = (code << 2) | (((x >> i) & 1) << 1) | ((y >> i) & 1)
+    return code
+
+
+def _cell(value, low, span, bits):
+    """Index of the cell holding value, out of 2**bits cells over [low, low+span)"""
+    return min(int((value - low) / span * (1 << bits)), (1 << bits) - 1)
+
+
+def geohash(latitude, longitude):
+    """The geohash of a point, as an integer of GEOHASH_BITS bits"""
+    bits = GEOHASH_BITS // 2
+    return _interleave(
+        _cell(longitude, -180.0, 360.0, bits), _cell(latitude, -90.0, 180.0, bits), bits
+    )
+
+
+def cover(latitude, longitude, radius_km, max_cells=16):
+    """[(low, high)] geohash ranges covering every point within radius_km.
+
+    Picks the smallest cells of which at most max_cells cover the bounding
+    box of the circle, and merges the ones next to each other in geohash
+    order, so a search is a handful of index ranges.
+    """
+    angle = radius_km / EARTH_RADIUS_KM
+    dlat = math.degrees(angle)
+    south, north = latitude - dlat, latitude + dlat
+    cos = math.cos(math.radians(latitude))
+    # The widest the circle gets, which is on its poleward side
+    whole = south <= -90.0 or north >= 90.0 or math.sin(angle) >= cos
+    dlon = 180.0 if whole else math.degrees(math.asin(math.sin(angle) / cos))
+    south, north = max(south, -90.0), min(north, 90.0)
+    for bits in range(GEOHASH_BITS // 2, 0, -1):
+        size = 1 << bits
+        rows = range(
+            _cell(south, -90.0, 180.0, bits), _cell(north, -90.0, 180.0, bits) + 1
+        )
+        first = math.floor((longitude - dlon + 180.0) / 360.0 * size)
+        last = math.floor((longitude + dlon + 180.0) / 360.0 * size)
+        width = size if whole else min(last - first + 1, size)
+        if len(rows) * width <= max_cells:
+            break
+    # Modulo the cell count, so a box across the antimeridian wraps
+    columns = range(size) if whole else {c % size for c in range(first, last + 1)}
+    shift = GEOHASH_BITS - 2 * bits
+    prefixes = sorted(_interleave(c, r, bits) for r in rows for c in columns)
+    ranges = []
+    for prefix in prefixes:
+        low, high = prefix << shift, (prefix + 1) << shift
+        if ranges and ranges[-1][1] == low:
+            ranges[-1] = (ranges[-1][0], high)
+        else:
+            ranges.append((low, high))
+    return ranges
+
+
+def distance_km(lat1, lon1, lat2, lon2):
+    """Great circle distance between two points"""
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = (
+        math.sin((lat2 - lat1) / 2) ** 2
+        + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def _key(city, state):
+    return " ".join((city or "").split()).casefold(), (state or "").strip().upper()
+
+
+class Gazetteer:
+    """(city, state) -> (latitude, longitude), read from a CSV file on first use"""
+
+    def __init__(self, path):
+        self.path = path
+        self._places = None
+
+    def lookup(self, city, state):
+        if self._places is None:
+            with open(self.path, newline="", encoding="utf-8") as f:
+                self._places = {
+                    _key(row["city"], row["state"]): (
+                        float(row["latitude"]),
+                        float(row["longitude"]),
+                    )
+                    for row in csv.DictReader(f)
+                }
+        return self._places.get(_key(city, state))
+
+
+gazetteer = Gazetteer(GAZETTEER)
+
+
+def locate(row):
+    """Fill in the latitude, longitude and geohash of a venue row (a dict)"""
+    if row.get("latitude") is None or row.get("longitude") is None:
+        row["latitude"], row["longitude"] = gazetteer.lookup(
+            row.get("city"), row.get("state")
+        ) or (None, None)
+    row["geohash"] = (
+        geohash(row["latitude"], row["longitude"])
+        if row["latitude"] is not None
+        else None
+    )
+    return row
+
+
+@event.listens_for(Venue, "before_insert")
+@event.listens_for(Venue, "before_update")
+def _locate(mapper, connection, venue):
+    state = inspect(venue)
+    moved = any(state.attrs[a].history.has_changes() for a in ("city", "state"))
+    placed = any(
+        state.attrs[a].history.has_changes() for a in ("latitude", "longitude")
+    )
+    if moved and not placed and state.has_identity:
+        # A new city, the old coordinates are wrong
+        venue.latitude = venue.longitude = None
+    row = locate(
+        {a: getattr(venue, a) for a in ("city", "state", "latitude", "longitude")}
+    )
+    venue.latitude, venue.longitude = row["latitude"], row["longitude"]
+    venue.geohash = row["geohash"]
+
+
+def geocode(everything=False, chunk=5000):
+    """Locate the venues without a geohash, returns how many were located.
+
+    Coordinates a venue already has are kept, unless everything is set: then
+    every venue is looked up in the gazetteer again.
+    """
+    query = db.session.query(
+        Venue.id, Venue.city, Venue.state, Venue.latitude, Venue.longitude
+    )
+    if not everything:
+        query = query.filter(Venue.geohash.is_(None))
+    located, last = 0, 0
+    while True:
+        rows = query.filter(Venue.id > last).order_by(Venue.id).limit(chunk).all()
+        if not rows:
+            return located
+        last = rows[-1].id
+        updates = [
+            locate(dict(row._asdict(), latitude=None) if everything else row._asdict())
+            for row in rows
+        ]
+        updates = [u for u in updates if u["geohash"] is not None]
+        if updates:
+            db.session.bulk_update_mappings(Venue, updates)
+        db.session.commit()
+        located += len(updates)
+
+
+# ----------------------------------------------------------------------------#
+# Commands, registered as "python app.py geo ..."
+# ----------------------------------------------------------------------------#
+
+
+class Geocode(Command):
+    """Look up the coordinates of the venues that have none"""
+
+    option_list = (
+        Option("--all", dest="everything", action="store_true", help="every venue"),
+    )
+
+    def run(self, everything):
+        print(f"Located {geocode(everything)} venues")
+
+
+commands = Manager(usage="Maintain the venue coordinates")
+commands.add_command("geocode", Geocode())
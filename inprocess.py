@@ -0,0 +1,118 @@
+# ----------------------------------------------------------------------------#
+# In-process indexes.
+# ----------------------------------------------------------------------------#
+"""Data read from the database into every process, for lookups without SQL.
+
+``ProcessIndex`` is the base of the Flask extensions that serve a route from
+memory (``autocomplete.py``, ``matches.py``).  A subclass reads everything
+in ``load()`` and reads some venues or artists again in ``update(kind,
+ids)``; the base class decides when:
+
+* The first request a process serves starts the load in a background
+  thread.  ``current()`` waits for it, and starts a load again once the data
+  is more than ``refresh`` seconds old, serving the old data meanwhile.
+* The write routes have ``changed(kind, *ids)`` called after they commit,
+  by a job (``views.indexes_changed``).  Changes made while a load runs are
+  done again on its result, which may have read the rows from before them.
+"""
+
+import logging
+import threading
+import time
+
+from flask import current_app
+
+from models import db
+
+logger = logging.getLogger(__name__)
+
+
+class ProcessIndex:
+    """Flask extension base holding data loaded in the background"""
+
+    name = "index"
+
+    def __init__(self):
+        self.refresh = 300
+        self.data = None
+        self.built = None
+        self._ready = threading.Event()
+        self._building = threading.Lock()
+        self._replay = None
+        self._replay_lock = threading.Lock()
+
+    def init_app(self, app, refresh):
+        self.refresh = refresh
+        app.before_first_request(self.start)
+
+    def load(self):
+        """Read the data from the database"""
+        raise NotImplementedError
+
+    def update(self, kind, ids):
+        """Read the given venues or artists into self.data again"""
+        raise NotImplementedError
+
+    def describe(self, data):
+        """What was loaded, for the log"""
+        return self.name
+
+    def start(self):
+        """Load the data in a background thread, unless one already is"""
+        if self._building.locked():
+            return
+        app = current_app._get_current_object()
+
+        def build():
+            with app.app_context():
+                self.build()
+
+        threading.Thread(target=build, name=self.name, daemon=True).start()
+
+    def build(self):
+        """Load the data and swap it in"""
+        if not self._building.acquire(blocking=False):
+            return
+        try:
+            started = time.perf_counter()
+            with self._replay_lock:
+                self._replay = []
+            data = self.load()
+            with self._replay_lock:
+                self.data = data
+                replay, self._replay = self._replay, None
+            for kind, ids in replay:
+                self.update(kind, ids)
+            logger.info(
+                "%s built in %.0f ms",
+                self.describe(data),
+                (time.perf_counter() - started) * 1000,
+            )
+        except Exception:
+            logger.exception("%s build failed", self.name)
+        finally:
+            with self._replay_lock:
+                self._replay = None
+            db.session.remove()
+            # A failed build is tried again after as long
+            self.built = time.monotonic()
+            self._building.release()
+            self._ready.set()
+
+    def changed(self, kind, *ids):
+        """Read the given venues or artists again, after a commit"""
+        if not ids:
+            return
+        with self._replay_lock:
+            if self._replay is not None:
+                self._replay.append((kind, ids))
+        # Before the first load there is nothing to update
+        if self.data is not None:
+            self.update(kind, ids)
+
+    def current(self):
+        """The data, once loaded, reloaded in the background when it is stale"""
+        if self.built is not None and time.monotonic() - self.built > self.refresh:
+            self.start()
+        self._ready.wait()
+        return self.data
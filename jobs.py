@@ -0,0 +1,384 @@
+# ----------------------------------------------------------------------------#
+# Background jobs.
+# ----------------------------------------------------------------------------#
+"""Side effects of the write routes, run once their transaction commits.
+
+A route queues a job before it commits::
+
+    job_queue.after_commit(update_indexes, "venue", [venue.id])
+    db.session.commit()
+
+It runs after the commit -- and not at all if the transaction rolls back --
+on a pool of ``JOBS_THREADS`` threads, so the response does not wait for it.
+Tasks are functions registered with ``@job_queue.task(name)``; a durable
+job's arguments must serialize to JSON.
+
+* Jobs run in the process that committed, e.g. to update what it holds in
+  memory, and are lost if it exits first.
+* ``durable=True`` jobs are saved to the ``job`` table in the transaction
+  they follow, and run by whichever process claims them first: the one that
+  committed (unless ``JOBS_IN_PROCESS`` is off), a web process polling the
+  table every ``JOBS_POLL_SECONDS``, or ``python app.py jobs work``, a
+  separate worker.  A job that raises is run again ``JOBS_RETRY_SECONDS``
+  later, doubling after each attempt, and left ``failed`` after
+  ``JOBS_MAX_ATTEMPTS`` until ``python app.py jobs retry``.  A job still
+  running after ``JOBS_TIMEOUT_SECONDS`` is presumed dead and run again.
+* With ``JOBS_THREADS = 0`` the jobs run right after the commit, before the
+  response, on a thread of their own as SQL cannot be sent from within the
+  commit.
+
+The depth of the queues, and how long jobs waited and ran, are served at
+``/metrics``.
+"""
+
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from flask import current_app
+from flask_script import Command, Manager, Option
+from sqlalchemy import and_, case, event, func, inspect, select
+
+from metrics import SECONDS_BUCKETS, Counters, Gauge, Histogram, sql_metrics
+from models import Job, db
+
+# Durable jobs may wait for a poll, or for a retry
+WAIT_BUCKETS = SECONDS_BUCKETS + (10, 30, 60, 300, 1800)
+
+job_table = Job.__table__
+
+
+def task_name(function):
+    return getattr(function, "job_name", function.__name__)
+
+
+class JobQueue:
+    """Flask extension running the jobs queued by a transaction once it commits"""
+
+    def __init__(self, app=None):
+        self.tasks = {}
+        self.threads = 4
+        self.in_process = True
+        self.max_attempts = 5
+        self.retry_seconds = 10
+        self.poll_seconds = 5
+        self.timeout_seconds = 300
+        # Jobs submitted to the pool of this process and not finished
+        self.pending = 0
+        self._pool = None
+        self._poller = None
+        self._lock = threading.Lock()
+        self.waited = Histogram(
+            "fyyur_job_wait_seconds",
+            "Time from a job's commit (or retry time) to its start.",
+            WAIT_BUCKETS,
+            label="task",
+        )
+        self.seconds = Histogram(
+            "fyyur_job_seconds", "Time jobs took to run.", SECONDS_BUCKETS, label="task"
+        )
+        self.failures = Counters(
+            "fyyur_job_failures_total", "Jobs that raised.", label="task"
+        )
+        for metric in (
+            Gauge(
+                "fyyur_job_queue_depth",
+                "Jobs waiting for the threads of this process (pool), and the "
+                "durable jobs of the job table by status.",
+                self.depth,
+                label="queue",
+            ),
+            self.waited,
+            self.seconds,
+            self.failures,
+        ):
+            sql_metrics.register(metric)
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault("JOBS_THREADS", 4)
+        app.config.setdefault("JOBS_IN_PROCESS", True)
+        app.config.setdefault("JOBS_MAX_ATTEMPTS", 5)
+        app.config.setdefault("JOBS_RETRY_SECONDS", 10)
+        app.config.setdefault("JOBS_POLL_SECONDS", 5)
+        app.config.setdefault("JOBS_TIMEOUT_SECONDS", 300)
+        self.threads = app.config["JOBS_THREADS"]
+        self.in_process = app.config["JOBS_IN_PROCESS"]
+        self.max_attempts = app.config["JOBS_MAX_ATTEMPTS"]
+        self.retry_seconds = app.config["JOBS_RETRY_SECONDS"]
+        self.poll_seconds = app.config["JOBS_POLL_SECONDS"]
+        self.timeout_seconds = app.config["JOBS_TIMEOUT_SECONDS"]
+        if self.in_process:
+            app.before_first_request(self.start_polling)
+        app.extensions["job_queue"] = self
+
+    def task(self, name):
+        """Register the decorated function as the task name"""
+
+        def decorator(function):
+            function.job_name = name
+            self.tasks[name] = function
+            return function
+
+        return decorator
+
+    # Queueing
+
+    def after_commit(self, task, *args, durable=False):
+        """Run task(*args) once the current transaction commits"""
+        job = None
+        if durable:
+            job = Job(task=task.job_name, args=json.dumps(args))
+            db.session.add(job)
+        db.session.info.setdefault("jobs", []).append(
+            (task, args, job, time.monotonic())
+        )
+
+    def dispatch(self, queued):
+        """Run the jobs of a transaction that committed"""
+        for task, args, job, at in queued:
+            if job is None:
+                self.submit(self.run, task, args, at)
+            elif self.in_process:
+                self.submit(self.run_stored, inspect(job).identity[0])
+
+    def submit(self, function, *args):
+        """Call function(*args) with the app context on a thread of the pool"""
+        app = current_app._get_current_object()
+        if not self.threads:
+            thread = threading.Thread(target=self._call, args=(app, function, args))
+            thread.start()
+            thread.join()
+            return
+        with self._lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(self.threads, thread_name_prefix="job")
+            self.pending += 1
+        self._pool.submit(self._call, app, function, args, counted=True)
+
+    def _call(self, app, function, args, counted=False):
+        try:
+            with app.app_context():
+                try:
+                    function(*args)
+                finally:
+                    db.session.remove()
+        except Exception:
+            app.logger.exception("Job runner failed")
+        finally:
+            if counted:
+                with self._lock:
+                    self.pending -= 1
+
+    # Running
+
+    def run(self, task, args, queued_at):
+        """Run a job of this process, queued at time.monotonic() queued_at"""
+        name = task_name(task)
+        self.waited.observe(name, time.monotonic() - queued_at)
+        started = time.monotonic()
+        try:
+            task(*args)
+        except Exception:
+            self.failures.inc(name)
+            current_app.logger.exception("Job %s%r failed", name, args)
+        finally:
+            self.seconds.observe(name, time.monotonic() - started)
+
+    def run_stored(self, job_id):
+        """Claim the durable job and run it, returns whether it was claimed"""
+        now = datetime.now()
+        claimed = db.session.execute(
+            job_table.update()
+            .where(
+                and_(
+                    job_table.c.id == job_id,
+                    job_table.c.status == "queued",
+                    job_table.c.run_at <= now,
+                )
+            )
+            .values(status="running", started_at=now, attempts=job_table.c.attempts + 1)
+        )
+        db.session.commit()
+        if claimed.rowcount != 1:
+            # Run already, by another process
+            return False
+        job = Job.query.get(job_id)
+        self.waited.observe(job.task, (now - job.run_at).total_seconds())
+        started = time.monotonic()
+        try:
+            if job.task not in self.tasks:
+                raise LookupError(f"No task {job.task}")
+            self.tasks[job.task](*json.loads(job.args))
+        except Exception as e:
+            db.session.rollback()
+            self.failures.inc(job.task)
+            current_app.logger.exception(
+                "Job %d %s failed (attempt %d)", job.id, job.task, job.attempts
+            )
+            self.retry(job, e)
+        else:
+            db.session.delete(job)
+        finally:
+            self.seconds.observe(job.task, time.monotonic() - started)
+        db.session.commit()
+        return True
+
+    def retry(self, job, error):
+        """Queue the job that raised error again later, or leave it failed"""
+        job.error = f"{type(error).__name__}: {error}"
+        if job.attempts >= self.max_attempts:
+            job.status = "failed"
+            return
+        job.status = "queued"
+        delay = self.retry_seconds * 2 ** (job.attempts - 1)
+        job.run_at = datetime.now() + timedelta(seconds=delay)
+
+    def due(self, limit):
+        """Ids of up to limit durable jobs to run now, oldest first"""
+        now = datetime.now()
+        # A job running for this long died with its process
+        timeout = now - timedelta(seconds=self.timeout_seconds)
+        db.session.execute(
+            job_table.update()
+            .where(
+                and_(job_table.c.status == "running", job_table.c.started_at < timeout)
+            )
+            .values(
+                status=case(
+                    [(job_table.c.attempts >= self.max_attempts, "failed")],
+                    else_="queued",
+                ),
+                error="Timed out",
+            )
+        )
+        ids = [
+            id
+            for id, in db.session.execute(
+                select([job_table.c.id])
+                .where(and_(job_table.c.status == "queued", job_table.c.run_at <= now))
+                .order_by(job_table.c.run_at)
+                .limit(limit)
+            )
+        ]
+        db.session.commit()
+        return ids
+
+    def start_polling(self):
+        """Run the due durable jobs on the pool of this process, once per process"""
+        with self._lock:
+            if self._poller is not None:
+                return
+            app = current_app._get_current_object()
+            self._poller = threading.Thread(
+                target=self._poll, args=(app,), name="job poller", daemon=True
+            )
+        self._poller.start()
+
+    def _poll(self, app):
+        while True:
+            time.sleep(self.poll_seconds)
+            with app.app_context():
+                try:
+                    for job_id in self.due(max(self.threads - self.pending, 1)):
+                        self.submit(self.run_stored, job_id)
+                except Exception:
+                    app.logger.exception("Polling the job table failed")
+                finally:
+                    db.session.remove()
+
+    def work(self, threads=None, once=False):
+        """Run the durable jobs as they come due, or until none is if once.
+
+        Returns how many ran.
+        """
+        threads = threads or self.threads or 1
+        app = current_app._get_current_object()
+        ran = 0
+        with ThreadPoolExecutor(threads, thread_name_prefix="job") as pool:
+            while True:
+                ids = self.due(threads)
+                db.session.remove()
+                if ids:
+                    ran += len(ids)
+                    # _call has the job's session removed after it
+                    list(
+                        pool.map(
+                            lambda id: self._call(app, self.run_stored, (id,)), ids
+                        )
+                    )
+                elif once:
+                    return ran
+                else:
+                    time.sleep(self.poll_seconds)
+
+    def depth(self):
+        depth = {"pool": self.pending, "queued": 0, "running": 0, "failed": 0}
+        depth.update(
+            db.session.query(Job.status, func.count()).group_by(Job.status).all()
+        )
+        return depth
+
+
+job_queue = JobQueue()
+
+
+@event.listens_for(db.session, "after_commit")
+def _after_commit(session):
+    queued = session.info.pop("jobs", None)
+    if queued:
+        job_queue.dispatch(queued)
+
+
+@event.listens_for(db.session, "after_soft_rollback")
+def _after_rollback(session, previous_transaction):
+    session.info.pop("jobs", None)
+
+
+# ----------------------------------------------------------------------------#
+# Commands, registered as "python app.py jobs ..."
+# ----------------------------------------------------------------------------#
+
+
+class Work(Command):
+    """Run the durable jobs as they come due, e.g. with JOBS_IN_PROCESS=0"""
+
+    option_list = (
+        Option("--threads", type=int, help="JOBS_THREADS by default"),
+        Option("--once", action="store_true", help="exit when no job is due"),
+    )
+
+    def run(self, threads, once):
+        print(f"Ran {job_queue.work(threads, once)} jobs")
+
+
+class Status(Command):
+    """Count the durable jobs by status, and list the failed ones"""
+
+    def run(self):
+        for status, count in sorted(job_queue.depth().items()):
+            if status != "pool":
+                print(f"{status:<8} {count}")
+        for job in Job.query.filter_by(status="failed").order_by(Job.id):
+            print(f"{job.id} {job.task} {job.args} after {job.attempts}: {job.error}")
+
+
+class Retry(Command):
+    """Queue the failed durable jobs again"""
+
+    def run(self):
+        retried = Job.query.filter_by(status="failed").update(
+            {"status": "queued", "attempts": 0, "run_at": datetime.now()},
+            synchronize_session=False,
+        )
+        db.session.commit()
+        print(f"Queued {retried} failed jobs again")
+
+
+commands = Manager(usage="Run and inspect the background jobs")
+commands.add_command("work", Work())
+commands.add_command("status", Status())
+commands.add_command("retry", Retry())
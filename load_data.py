@@ -1,74 +1,410 @@
-import os
-
-from app import Artist, Show, Venue, app, db
-from data import (
-    show_artist_data1,
-    show_artist_data2,
-    show_artist_data3,
-    show_venue_data1,
-    show_venue_data2,
-    show_venue_data3,
-    shows_data,
-)
-
-# Run migration
-os.system("flask db upgrade")
-
-# Set up app context for inserting data
-ctx = app.app_context()
-ctx.push()
-
-app.logger.info("Loading data into database")
-
-vkeys = [
-    "id",
-    "name",
-    "genres",
-    "address",
-    "city",
-    "state",
-    "phone",
-    "website",
-    "facebook_link",
-    "seeking_talent",
-    "seeking_description",
-    "image_link",
-]
-
-v1 = Venue(**{k: show_venue_data1[k] for k in vkeys if k in show_venue_data1})
-v2 = Venue(**{k: show_venue_data2[k] for k in vkeys if k in show_venue_data2})
-v3 = Venue(**{k: show_venue_data3[k] for k in vkeys if k in show_venue_data3})
-db.session.add_all([v1, v2, v3])
-# db.session.commit()
-
-akeys = [
-    "id",
-    "name",
-    "genres",
-    "city",
-    "state",
-    "phone",
-    "seeking_venue",
-    "seeking_description",
-    "website",
-    "image_link",
-    "facebook_link",
-]
-a1 = Artist(**{k: show_artist_data1[k] for k in akeys if k in show_artist_data1})
-a2 = Artist(**{k: show_artist_data2[k] for k in akeys if k in show_artist_data2})
-a3 = Artist(**{k: show_artist_data3[k] for k in akeys if k in show_artist_data3})
-db.session.add_all([a1, a2, a3])
-
-shows = []
-skeys = ["venue_id", "artist_id", "start_time"]
-for s in shows_data:
-    shows.append(Show(**{k: s[k] for k in skeys if k in s}))
-db.session.add_all(shows)
-try:
-    db.session.commit()
-    app.logger.info("Data successfully loaded into database!")
-except Exception as e:
-    db.session.rollback()
-    app.logger.error(f"Error loading data into database!\n{e}")
-
-ctx.pop()
+"""Load venues, artists and shows into the database.
+
+    python load_data.py                        # the seed data in data.py
+    python load_data.py shows feed.csv         # a CSV or JSONL file
+    python load_data.py venues - --format jsonl < venues.jsonl
+
+Files are streamed: records are validated one by one, written ``--chunk`` at
+a time and committed chunk by chunk, so memory use does not grow with the
+file.  Venues and artists are upserted on their id (a record replaces the
+stored one, genres included).  Shows already booked, i.e. the same venue,
+artist and start time (``uniq_venue_artist_time``), are skipped.  On
+PostgreSQL ``--copy`` COPYs each chunk into a staging table and upserts from
+there instead of sending batched INSERTs.
+
+Records that fail validation or book a venue or artist that does not exist
+are rejected and counted; ``--rejects rejects.csv`` writes them out with the
+reason.  The database is upgraded to the latest migration first unless
+``--no-upgrade`` is given, and the show counters of the venues and artists
+that got new shows are recounted chunk by chunk.
+"""
+
+import argparse
+import csv
+import io
+import itertools
+import json
+import sys
+import time
+from datetime import datetime, timezone
+
+import dateutil.parser
+from flask import current_app
+from sqlalchemy import Boolean, DateTime, Float, Integer, bindparam
+from sqlalchemy.dialects import postgresql
+
+import counters
+from app import create_base_app
+from geo import locate
+from models import Artist, Genre, Show, Venue, db
+
+MODELS = {"venues": Venue, "artists": Artist, "shows": Show}
+# Columns a record must have, ids included: venues and artists upsert on it
+REQUIRED = {
+    "venues": ("id", "name"),
+    "artists": ("id", "name"),
+    "shows": ("venue_id", "artist_id", "start_time"),
+}
+TRUE = {"1", "t", "true", "y", "yes"}
+FALSE = {"", "0", "f", "false", "n", "no"}
+
+
+class Rejected(ValueError):
+    """A record that can not be imported"""
+
+
+def records(stream, format):
+    """(line number, raw record) for every record of a CSV or JSONL stream"""
+    if format == "csv":
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row
+    else:
+        for line, text in enumerate(stream, 1):
+            if text.strip():
+                yield line, text
+
+
+def _value(column, value):
+    """value converted to the python type of column, None when blank"""
+    if value is None or value == "":
+        return None
+    if isinstance(column.type, Boolean):
+        if isinstance(value, bool):
+            return value
+        value = str(value).strip().lower()
+        if value not in TRUE | FALSE:
+            raise Rejected(f"{column.key} is not a boolean")
+        return value in TRUE
+    if isinstance(column.type, Integer):
+        try:
+            return int(value)
+        except (TypeError, ValueError):
+            raise Rejected(f"{column.key} is not an integer")
+    if isinstance(column.type, Float):
+        try:
+            return float(value)
+        except (TypeError, ValueError):
+            raise Rejected(f"{column.key} is not a number")
+    if isinstance(column.type, DateTime):
+        if not isinstance(value, datetime):
+            try:
+                value = dateutil.parser.isoparse(str(value))
+            except ValueError:
+                raise Rejected(f"{column.key} is not an ISO 8601 date")
+        # Stored as naive UTC, like the seed data's "Z" times always were
+        if value.tzinfo is not None:
+            value = value.astimezone(timezone.utc).replace(tzinfo=None)
+        return value
+    return str(value)
+
+
+def _genres(value):
+    """Genre names from a JSON list or a comma separated CSV cell"""
+    if value is None:
+        return []
+    if isinstance(value, str):
+        value = value.split(",")
+    if not isinstance(value, list):
+        raise Rejected("genres is not a list")
+    return list(dict.fromkeys(str(g).strip() for g in value if str(g).strip()))
+
+
+class Import:
+    """Streams the records of one kind into the database, chunk by chunk"""
+
+    def __init__(self, kind, chunk=5000, copy=False, rejects=None):
+        self.kind = kind
+        self.model = MODELS[kind]
+        self.table = self.model.__table__
+        self.columns = [
+            c for c in self.table.columns if kind != "shows" or c.key != "id"
+        ]
+        self.chunk = chunk
+        self.dialect = db.engine.dialect.name
+        if copy and self.dialect != "postgresql":
+            raise SystemExit("--copy needs a PostgreSQL database")
+        self.copy = copy
+        self.rejects = rejects
+        self.read = self.written = self.skipped = self.rejected = 0
+        self.seconds = 0.0
+
+    def clean(self, raw):
+        """The record as a row of the table (plus "genres"), or raise Rejected"""
+        if isinstance(raw, str):
+            try:
+                raw = json.loads(raw)
+            except ValueError:
+                raise Rejected("not valid JSON")
+        if not isinstance(raw, dict):
+            raise Rejected("not an object")
+        row = {c.key: _value(c, raw.get(c.key)) for c in self.columns}
+        for c in self.columns:
+            # Every row of a batch has every column, so fill in the defaults
+            if row[c.key] is None and c.default is not None:
+                if c.default.is_scalar:
+                    row[c.key] = c.default.arg
+                elif c.default.is_callable:
+                    row[c.key] = c.default.arg(None)
+        missing = [k for k in REQUIRED[self.kind] if row[k] is None]
+        if missing:
+            raise Rejected(f"missing {', '.join(missing)}")
+        if self.kind == "venues":
+            locate(row)
+        if self.kind != "shows":
+            row["genres"] = _genres(raw.get("genres"))
+        return row
+
+    def reject(self, line, raw, reason):
+        self.rejected += 1
+        if self.rejects is not None:
+            if not isinstance(raw, str):
+                raw = json.dumps(raw, default=str)
+            self.rejects.writerow([self.kind, line, reason, raw.strip()])
+
+    def run(self, stream):
+        """Import every (line, raw record) of stream"""
+        started = time.perf_counter()
+        for batch in iter(lambda: list(itertools.islice(stream, self.chunk)), []):
+            rows = []
+            for line, raw in batch:
+                self.read += 1
+                try:
+                    rows.append((line, raw, self.clean(raw)))
+                except Rejected as e:
+                    self.reject(line, raw, str(e))
+            if self.kind == "shows":
+                rows = self._booked(rows)
+            else:
+                # Last one wins, an upsert may touch a row only once
+                rows = list(
+                    {row["id"]: (line, raw, row) for line, raw, row in rows}.values()
+                )
+            if rows:
+                written = self.write([row for _, _, row in rows])
+                self.written += written
+                self.skipped += len(rows) - written
+                if self.kind == "shows" and written:
+                    counters.refresh("venue", {row["venue_id"] for _, _, row in rows})
+                    counters.refresh("artist", {row["artist_id"] for _, _, row in rows})
+            db.session.commit()
+            self.seconds = time.perf_counter() - started
+            current_app.logger.debug(self.summary())
+        if self.kind != "shows" and self.dialect == "postgresql":
+            # Explicit ids do not advance the id sequence
+            db.session.execute(
+                f"SELECT setval(pg_get_serial_sequence('{self.table.name}', 'id'), "
+                f"coalesce(max(id), 1)) FROM {self.table.name}"
+            )
+            db.session.commit()
+        self.seconds = time.perf_counter() - started
+        return self
+
+    def _booked(self, rows):
+        """The shows of rows whose venue and artist exist, rejecting the rest"""
+        venues = {r["venue_id"] for _, _, r in rows}
+        artists = {r["artist_id"] for _, _, r in rows}
+        venues = {
+            id for id, in db.session.query(Venue.id).filter(Venue.id.in_(list(venues)))
+        }
+        artists = {
+            id
+            for id, in db.session.query(Artist.id).filter(Artist.id.in_(list(artists)))
+        }
+        booked = []
+        for line, raw, row in rows:
+            if row["venue_id"] not in venues:
+                self.reject(line, raw, f"no venue {row['venue_id']}")
+            elif row["artist_id"] not in artists:
+                self.reject(line, raw, f"no artist {row['artist_id']}")
+            else:
+                booked.append((line, raw, row))
+        return booked
+
+    def write(self, rows):
+        """Write one chunk of rows, the number of rows inserted or updated"""
+        genres = [row.pop("genres") for row in rows] if self.kind != "shows" else None
+        if self.copy:
+            written = self._copy(rows)
+        elif self.dialect != "postgresql" and self.kind != "shows":
+            written = self._update_or_insert(rows)
+        else:
+            written = db.session.execute(self._insert(), rows).rowcount
+        if genres is not None:
+            self._write_genres([row["id"] for row in rows], genres)
+        return written
+
+    def _insert(self):
+        """Batched INSERT that upserts (PostgreSQL) or skips duplicate shows"""
+        if self.dialect == "postgresql":
+            insert = postgresql.insert(self.table)
+            if self.kind == "shows":
+                return insert.on_conflict_do_nothing(
+                    constraint="uniq_venue_artist_time"
+                )
+            return insert.on_conflict_do_update(
+                index_elements=["id"],
+                set_={c.key: insert.excluded[c.key] for c in self.columns},
+            )
+        return self.table.insert().prefix_with("OR IGNORE")
+
+    def _update_or_insert(self, rows):
+        """Upsert without ON CONFLICT: update the stored ids, insert the rest"""
+        ids = [row["id"] for row in rows]
+        stored = {
+            id for id, in db.session.query(self.model.id).filter(self.model.id.in_(ids))
+        }
+        updates = [{"_id": row["id"], **row} for row in rows if row["id"] in stored]
+        inserts = [row for row in rows if row["id"] not in stored]
+        if updates:
+            db.session.execute(
+                self.table.update().where(self.table.c.id == bindparam("_id")),
+                updates,
+            )
+        if inserts:
+            db.session.execute(self.table.insert(), inserts)
+        return len(rows)
+
+    def _copy(self, rows):
+        """COPY rows into a staging table, then upsert them from there"""
+        table = self.table.name
+        names = ", ".join(f'"{c.key}"' for c in self.columns)
+        if self.kind == "shows":
+            conflict = "ON CONFLICT ON CONSTRAINT uniq_venue_artist_time DO NOTHING"
+        else:
+            conflict = "ON CONFLICT (id) DO UPDATE SET " + ", ".join(
+                f'"{c.key}" = excluded."{c.key}"' for c in self.columns
+            )
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for row in rows:
+            writer.writerow(
+                [r"\N" if row[c.key] is None else row[c.key] for c in self.columns]
+            )
+        buffer.seek(0)
+        cursor = db.session.connection().connection.cursor()
+        cursor.execute(
+            f'CREATE TEMP TABLE IF NOT EXISTS "import_{table}" ON COMMIT DELETE ROWS '
+            f'AS SELECT {names} FROM "{table}" WITH NO DATA'
+        )
+        cursor.copy_expert(
+            f"COPY \"import_{table}\" ({names}) FROM STDIN WITH (FORMAT csv, NULL '\\N')",
+            buffer,
+        )
+        cursor.execute(
+            f'INSERT INTO "{table}" ({names}) SELECT {names} FROM "import_{table}" '
+            + conflict
+        )
+        return cursor.rowcount
+
+    def _write_genres(self, ids, genres):
+        """Replace the genres of the venues or artists with these ids"""
+        association = self.model.genre_list.property.secondary
+        owner = association.c[f"{self.table.name}_id"]
+        names = sorted(set(itertools.chain.from_iterable(genres)))
+        known = {
+            name: id
+            for id, name in db.session.query(Genre.id, Genre.name).filter(
+                Genre.name.in_(names)
+            )
+        }
+        new = [{"name": name} for name in names if name not in known]
+        if new:
+            db.session.execute(Genre.__table__.insert(), new)
+            known.update(
+                (name, id)
+                for id, name in db.session.query(Genre.id, Genre.name).filter(
+                    Genre.name.in_([g["name"] for g in new])
+                )
+            )
+        db.session.execute(association.delete().where(owner.in_(ids)))
+        links = [
+            {"genre_id": known[name], owner.key: id}
+            for id, names in zip(ids, genres)
+            for name in names
+        ]
+        if links:
+            db.session.execute(association.insert(), links)
+
+    def summary(self):
+        rate = self.read / self.seconds if self.seconds else 0
+        return (
+            f"{self.kind}: {self.read} read, {self.written} written, "
+            f"{self.skipped} skipped, {self.rejected} rejected "
+            f"in {self.seconds:.1f}s ({rate:,.0f} rows/s)"
+        )
+
+
+def seed_records():
+    """The seed data of data.py, per kind"""
+    from data import (
+        show_artist_data1,
+        show_artist_data2,
+        show_artist_data3,
+        show_venue_data1,
+        show_venue_data2,
+        show_venue_data3,
+        shows_data,
+    )
+
+    return {
+        "venues": [show_venue_data1, show_venue_data2, show_venue_data3],
+        "artists": [show_artist_data1, show_artist_data2, show_artist_data3],
+        "shows": shows_data,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("kind", nargs="?", choices=sorted(MODELS))
+    parser.add_argument("path", nargs="?", help="CSV or JSONL file, - for stdin")
+    parser.add_argument("--format", choices=["csv", "jsonl"])
+    parser.add_argument("--chunk", type=int, help="records per transaction")
+    parser.add_argument("--copy", action="store_true", help="PostgreSQL COPY")
+    parser.add_argument("--rejects", help="write rejected records to this CSV")
+    parser.add_argument("--no-upgrade", action="store_true")
+    args = parser.parse_args(argv)
+    if args.kind and not args.path:
+        parser.error("a path is needed to import a file")
+
+    rejects_file = open(args.rejects, "w", newline="") if args.rejects else None
+    rejects = csv.writer(rejects_file) if rejects_file else None
+    if rejects:
+        rejects.writerow(["kind", "line", "reason", "record"])
+    app = create_base_app()
+    chunk = args.chunk or app.config["IMPORT_CHUNK_SIZE"]
+
+    with app.app_context():
+        if not args.no_upgrade:
+            from flask_migrate import Migrate, upgrade
+
+            Migrate(app, db)
+            upgrade()
+        if args.kind:
+            format = args.format or ("csv" if args.path.endswith(".csv") else "jsonl")
+            if args.path == "-":
+                stream = sys.stdin
+            else:
+                stream = open(args.path, newline="", encoding="utf-8")
+            with stream:
+                imports = [
+                    Import(args.kind, chunk, args.copy, rejects).run(
+                        records(stream, format)
+                    )
+                ]
+        else:
+            app.logger.info("Loading the seed data into the database")
+            imports = [
+                Import(kind, chunk, args.copy, rejects).run(enumerate(rows, 1))
+                for kind, rows in seed_records().items()
+            ]
+
+    if rejects_file:
+        rejects_file.close()
+    for done in imports:
+        app.logger.info(done.summary())
+    return 1 if any(done.rejected for done in imports) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
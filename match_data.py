@@ -0,0 +1,226 @@
+# ----------------------------------------------------------------------------#
+# Match data.
+# ----------------------------------------------------------------------------#
+"""The NumPy arrays the /matches rankings of ``matches.py`` are computed on.
+
+Imported when the match data is first loaded, so that starting a process does
+not import NumPy.
+"""
+
+import threading
+
+import numpy as np
+
+OTHER = {"venue": "artist", "artist": "venue"}
+
+if hasattr(np, "bitwise_count"):
+
+    def popcount(words):
+        """Set bits per row of a 2-d uint64 array"""
+        return np.bitwise_count(words).sum(axis=1, dtype=np.int32)
+
+else:
+    _BYTE_BITS = np.array([bin(i).count("1") for i in range(256)], np.uint8)
+
+    def popcount(words):
+        """Set bits per row of a 2-d uint64 array"""
+        return _BYTE_BITS[words.view(np.uint8)].sum(axis=1, dtype=np.int32)
+
+
+def bitset(genre_ids, words):
+    """The genres as an array of words uint64 words"""
+    bits = np.zeros(words, np.uint64)
+    for genre_id in genre_ids:
+        bit = genre_id - 1
+        bits[bit // 64] |= np.uint64(1 << (bit % 64))
+    return bits
+
+
+def _grown(array, capacity, fill=0):
+    grown = np.full((capacity,) + array.shape[1:], fill, array.dtype)
+    grown[: len(array)] = array
+    return grown
+
+
+class Candidates:
+    """The venues or artists on one side of the matches, a row of arrays each"""
+
+    def __init__(self, words=1, capacity=1024):
+        self.size = 0
+        self.rows = {}  # id -> row
+        self.ids = np.zeros(capacity, np.int64)
+        self.genres = np.zeros((capacity, words), np.uint64)
+        self.genre_counts = np.zeros(capacity, np.int32)
+        self.cities = np.full(capacity, -1, np.int32)
+        self.states = np.full(capacity, -1, np.int32)
+        self.seeking = np.zeros(capacity, bool)
+        self.alive = np.zeros(capacity, bool)
+        self.details = []  # (name, city, state, seeking description) per row
+
+    def __len__(self):
+        return len(self.rows)
+
+    def widen(self, words):
+        """Room for words words of genre bits"""
+        extra = words - self.genres.shape[1]
+        if extra > 0:
+            self.genres = np.pad(self.genres, ((0, 0), (0, extra)))
+
+    def _row(self, id):
+        row = self.rows.get(id)
+        if row is not None:
+            return row
+        if self.size == len(self.ids):
+            capacity = 2 * len(self.ids)
+            self.ids = _grown(self.ids, capacity)
+            self.genres = _grown(self.genres, capacity)
+            self.genre_counts = _grown(self.genre_counts, capacity)
+            self.cities = _grown(self.cities, capacity, -1)
+            self.states = _grown(self.states, capacity, -1)
+            self.seeking = _grown(self.seeking, capacity)
+            self.alive = _grown(self.alive, capacity)
+        row = self.rows[id] = self.size
+        self.ids[row] = id
+        self.details.append(None)
+        self.size += 1
+        return row
+
+    def put(self, id, genres, city, state, seeking, details):
+        """Write a venue or artist, genres a bitset and city/state codes"""
+        row = self._row(id)
+        self.genres[row] = genres
+        self.genre_counts[row] = popcount(genres[None, :])[0]
+        self.cities[row] = city
+        self.states[row] = state
+        self.seeking[row] = bool(seeking)
+        self.alive[row] = True
+        self.details[row] = details
+
+    def remove(self, id):
+        row = self.rows.pop(id, None)
+        if row is not None:
+            self.alive[row] = False
+
+
+class MatchData:
+    """Both sides of the matches and the shows booked between them"""
+
+    def __init__(self):
+        self.words = 1
+        self.genre_names = {}
+        self.sides = {kind: Candidates() for kind in OTHER}
+        # kind -> owner id -> {id on the other side: shows together}
+        self.pairs = {kind: {} for kind in OTHER}
+        self._places = {}
+        self._lock = threading.RLock()
+
+    def place(self, *key):
+        """The integer code of a city (city, state) or a state (state,)"""
+        key = tuple((part or "").strip().casefold() for part in key)
+        if not all(key):
+            return -1
+        return self._places.setdefault(key, len(self._places))
+
+    def add_genres(self, names):
+        """Make room for the bits of {genre id: name}"""
+        with self._lock:
+            self.genre_names.update(names)
+            words = max(self.genre_names, default=0) // 64 + 1
+            if words > self.words:
+                self.words = words
+                for side in self.sides.values():
+                    side.widen(words)
+
+    def put(self, kind, row, genre_ids):
+        """Write a (id, name, city, state, seeking, seeking_description) row"""
+        id, name, city, state, seeking, description = row
+        with self._lock:
+            self.sides[kind].put(
+                id,
+                bitset(genre_ids, self.words),
+                self.place(city, state),
+                self.place(state),
+                seeking,
+                (name, city, state, description),
+            )
+
+    def remove(self, kind, id):
+        with self._lock:
+            self.sides[kind].remove(id)
+            self.set_pairs(kind, id, {})
+
+    def set_pairs(self, kind, owner_id, together):
+        """Replace the {other id: shows} a venue or artist booked together"""
+        other = self.pairs[OTHER[kind]]
+        with self._lock:
+            for id in self.pairs[kind].pop(owner_id, {}):
+                other.get(id, {}).pop(owner_id, None)
+            for id, shows in together.items():
+                other.setdefault(id, {})[owner_id] = shows
+            if together:
+                self.pairs[kind][owner_id] = dict(together)
+
+    def _shared(self, bits):
+        names = []
+        for word, value in enumerate(int(w) for w in bits):
+            while value:
+                low = value & -value
+                names.append(self.genre_names.get(word * 64 + low.bit_length()))
+                value ^= low
+        return sorted(n for n in names if n)
+
+    def rank(self, kind, owner_id, weights, history_shows, limit):
+        """The best limit matches of a venue or artist, None if it is unknown"""
+        with self._lock:
+            own, other = self.sides[kind], self.sides[OTHER[kind]]
+            row = own.rows.get(owner_id)
+            if row is None:
+                return None
+            n = other.size
+            bits = own.genres[row]
+            shared = popcount(other.genres[:n] & bits)
+            either = other.genre_counts[:n] + own.genre_counts[row] - shared
+            genre = np.divide(shared, either, out=np.zeros(n), where=either > 0)
+            place = np.zeros(n)
+            if own.states[row] >= 0:
+                place[other.states[:n] == own.states[row]] = 0.5
+            if own.cities[row] >= 0:
+                place[other.cities[:n] == own.cities[row]] = 1.0
+            together = np.zeros(n)
+            for id, shows in self.pairs[kind].get(owner_id, {}).items():
+                if id in other.rows:
+                    together[other.rows[id]] = shows
+            score = (
+                weights["genre"] * genre
+                + weights["place"] * place
+                + weights["history"] * np.minimum(together / history_shows, 1.0)
+                + weights["seeking"] * other.seeking[:n]
+            )
+            score[~other.alive[:n]] = -1.0
+            if limit < n:
+                # Along with everyone tied with the last of the best
+                least = score[np.argpartition(-score, limit - 1)[limit - 1]]
+                top = np.flatnonzero(score >= least)
+            else:
+                top = np.arange(n)
+            # Best first, the lowest id first among equals
+            top = top[np.lexsort((other.ids[top], -score[top]))][:limit]
+            matches = []
+            for r in top:
+                if score[r] <= 0:
+                    break
+                name, city, state, description = other.details[r]
+                matches.append(
+                    {
+                        "id": int(other.ids[r]),
+                        "name": name,
+                        "city": city,
+                        "state": state,
+                        "seeking": bool(other.seeking[r]),
+                        "seeking_description": description,
+                        "genres": self._shared(other.genres[r] & bits),
+                        "shows_together": int(together[r]),
+                        "score": round(float(score[r]), 4),
+                    }
+                )
+            return matches
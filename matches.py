@@ -0,0 +1,185 @@
+# ----------------------------------------------------------------------------#
+# Matches.
+# ----------------------------------------------------------------------------#
+"""The venues that suit an artist, and the artists that suit a venue.
+
+``/artists/<id>/matches`` and ``/venues/<id>/matches`` rank every venue or
+artist on the other side by the weighted sum (``MATCH_WEIGHTS``) of:
+
+* ``genre`` -- how much their genres overlap (shared over either's, Jaccard);
+* ``place`` -- 1 in the same city, 0.5 in the same state;
+* ``history`` -- the shows they booked together, 1 from
+  ``MATCH_HISTORY_SHOWS`` on;
+* ``seeking`` -- 1 when the counterpart is looking (``Venue.seeking_talent``,
+  ``Artist.seeking_venue``).
+
+Each side is held in NumPy arrays with a row per venue or artist
+(``match_data.py``): the genres as bitsets of 64 bit words (bit ``genre.id -
+1``), the city and state as integer codes.  A ranking is a handful of
+operations over whole arrays, milliseconds for a hundred thousand
+candidates.  The arrays are loaded and kept up to date by ``inprocess.py``,
+like the autocomplete index: changed rows are written in place, new ones
+appended and deleted ones masked out until the next load.
+"""
+
+from collections import defaultdict
+
+from flask import jsonify, request
+from sqlalchemy import func, select
+
+from inprocess import ProcessIndex
+from models import Artist, Genre, Show, Venue, artist_genre, db, venue_genre
+
+# model, seeking column, genre table, show column, counterpart's show column
+SIDES = {
+    "venue": (
+        Venue,
+        Venue.seeking_talent,
+        venue_genre,
+        Show.venue_id,
+        Show.artist_id,
+    ),
+    "artist": (
+        Artist,
+        Artist.seeking_venue,
+        artist_genre,
+        Show.artist_id,
+        Show.venue_id,
+    ),
+}
+
+
+class Matcher(ProcessIndex):
+    """Flask extension serving the /matches routes from a MatchData"""
+
+    name = "match data"
+
+    def __init__(self, app=None):
+        super().__init__()
+        self.weights = {"genre": 0.5, "place": 0.2, "history": 0.2, "seeking": 0.1}
+        self.history_shows = 5
+        self.limit = 20
+        self.limit_max = 100
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault("MATCH_WEIGHTS", self.weights)
+        app.config.setdefault("MATCH_HISTORY_SHOWS", 5)
+        app.config.setdefault("MATCH_LIMIT", 20)
+        app.config.setdefault("MATCH_LIMIT_MAX", 100)
+        app.config.setdefault("MATCH_REFRESH", 300)
+        self.weights = app.config["MATCH_WEIGHTS"]
+        self.history_shows = app.config["MATCH_HISTORY_SHOWS"]
+        self.limit = app.config["MATCH_LIMIT"]
+        self.limit_max = app.config["MATCH_LIMIT_MAX"]
+        super().init_app(app, app.config["MATCH_REFRESH"])
+        app.add_url_rule(
+            "/venues/<int:venue_id>/matches",
+            "venue_matches",
+            lambda venue_id: self.matches("venue", venue_id),
+        )
+        app.add_url_rule(
+            "/artists/<int:artist_id>/matches",
+            "artist_matches",
+            lambda artist_id: self.matches("artist", artist_id),
+        )
+        app.extensions["matcher"] = self
+
+    @staticmethod
+    def _read(kind, ids=None):
+        """The (id, name, city, state, seeking, description) rows of a side,
+        and {id: genre ids}"""
+        model, seeking, genres, _, _ = SIDES[kind]
+        owner = genres.c[f"{kind}_id"]
+        rows = db.session.query(
+            model.id,
+            model.name,
+            model.city,
+            model.state,
+            seeking,
+            model.seeking_description,
+        )
+        genre_rows = select([owner, genres.c.genre_id])
+        if ids is not None:
+            rows = rows.filter(model.id.in_(ids))
+            genre_rows = genre_rows.where(owner.in_(ids))
+        genre_ids = defaultdict(list)
+        for id, genre_id in db.session.execute(genre_rows):
+            genre_ids[id].append(genre_id)
+        return rows.yield_per(10000), genre_ids
+
+    @staticmethod
+    def _pairs(kind, ids=None):
+        """{id: {other id: shows together}} of a side"""
+        column, other = SIDES[kind][3:]
+        query = (
+            db.session.query(column, other, func.count())
+            .filter(column.isnot(None), other.isnot(None))
+            .group_by(column, other)
+        )
+        if ids is not None:
+            query = query.filter(column.in_(ids))
+        together = defaultdict(dict)
+        for id, other_id, shows in query:
+            together[id][other_id] = shows
+        return together
+
+    def load(self):
+        from match_data import MatchData
+
+        data = MatchData()
+        data.add_genres(dict(db.session.query(Genre.id, Genre.name)))
+        for kind in SIDES:
+            rows, genre_ids = self._read(kind)
+            for row in rows:
+                data.put(kind, row, genre_ids.get(row.id, ()))
+        # Setting the pairs of one side sets those of the other
+        for id, together in self._pairs("venue").items():
+            data.set_pairs("venue", id, together)
+        return data
+
+    def update(self, kind, ids):
+        ids = {int(id) for id in ids}
+        rows, genre_ids = self._read(kind, ids)
+        rows = rows.all()
+        together = self._pairs(kind, ids)
+        data = self.data
+        unknown = {g for gs in genre_ids.values() for g in gs} - set(data.genre_names)
+        if unknown:
+            data.add_genres(
+                dict(
+                    db.session.query(Genre.id, Genre.name).filter(Genre.id.in_(unknown))
+                )
+            )
+        for row in rows:
+            data.put(kind, row, genre_ids.get(row.id, ()))
+        for id in ids - {row.id for row in rows}:
+            data.remove(kind, id)
+        for id in ids:
+            data.set_pairs(kind, id, together.get(id, {}))
+
+    def describe(self, data):
+        return "match data of %s" % ", ".join(
+            f"{len(side)} {kind}s" for kind, side in data.sides.items()
+        )
+
+    def matches(self, kind, owner_id):
+        limit = request.args.get("limit", self.limit, type=int)
+        limit = max(1, min(limit, self.limit_max))
+        data = self.current()
+        found = None
+        if data is not None:
+            found = data.rank(kind, owner_id, self.weights, self.history_shows, limit)
+            if found is None:
+                # Saved by another process since the last load
+                self.changed(kind, owner_id)
+                found = data.rank(
+                    kind, owner_id, self.weights, self.history_shows, limit
+                )
+        if found is None:
+            return jsonify({"error": f"{kind.title()} {owner_id} not found"}), 404
+        return jsonify({"id": owner_id, "type": kind, "matches": found})
+
+
+matcher = Matcher()
@@ -0,0 +1,231 @@
+# ----------------------------------------------------------------------------#
+# SQL metrics.
+# ----------------------------------------------------------------------------#
+"""Per request SQL instrumentation, exported for Prometheus.
+
+``sql_metrics.init_app(app)`` hooks the cursor events of the app's engine and
+records, for every request, how many statements it sent, how long the
+database took and how often each statement shape (the SQL with literals and
+IN lists folded, see ``fingerprint``) was repeated.  When one shape runs more
+than ``SQL_REPEAT_THRESHOLD`` times in one request -- the signature of an N+1
+query loop -- a warning naming the endpoint is logged.
+
+The aggregates are served in the Prometheus text format at ``/metrics``,
+labelled by Flask endpoint.  They are kept per process.  Other extensions
+add their own metrics to the page with ``sql_metrics.register()``.
+"""
+
+import hashlib
+import re
+import threading
+import time
+from collections import Counter
+
+from flask import Response, current_app, g, has_request_context, request
+from sqlalchemy import event
+
+STATEMENT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+SECONDS_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_IN_LISTS = re.compile(r"\bIN \((?:[^()]*)\)", re.IGNORECASE)
+_SPACE = re.compile(r"\s+")
+
+
+def fingerprint(statement):
+    """The shape of statement: literals, IN lists and whitespace folded"""
+    shape = _LITERALS.sub("?", statement)
+    shape = _IN_LISTS.sub("IN (...)", shape)
+    return _SPACE.sub(" ", shape).strip()
+
+
+class Histogram:
+    """A Prometheus histogram with one series per label value"""
+
+    def __init__(self, name, help, buckets, label="endpoint"):
+        self.name = name
+        self.help = help
+        self.buckets = buckets
+        self.label = label
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, label, value):
+        with self._lock:
+            series = self._series.setdefault(label, [[0] * len(self.buckets), 0, 0])
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for label, (counts, total, count) in sorted(self._series.items()):
+                labels = f'{self.label}="{label}"'
+                for bound, n in zip(self.buckets, counts):
+                    lines.append(f'{self.name}_bucket{{{labels},le="{bound}"}} {n}')
+                lines.append(f'{self.name}_bucket{{{labels},le="+Inf"}} {count}')
+                lines.append(f"{self.name}_sum{{{labels}}} {total}")
+                lines.append(f"{self.name}_count{{{labels}}} {count}")
+        return lines
+
+
+class Counters:
+    """A Prometheus counter with one series per label value"""
+
+    def __init__(self, name, help, label="endpoint"):
+        self.name = name
+        self.help = help
+        self.label = label
+        self._values = Counter()
+        self._lock = threading.Lock()
+
+    def inc(self, label, amount=1):
+        with self._lock:
+            self._values[label] += amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for label, value in sorted(self._values.items()):
+                lines.append(f'{self.name}{{{self.label}="{label}"}} {value}')
+        return lines
+
+
+class Gauge:
+    """A Prometheus gauge read when scraped, collect() returns {label: value}"""
+
+    def __init__(self, name, help, collect, label="endpoint"):
+        self.name = name
+        self.help = help
+        self.collect = collect
+        self.label = label
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge"]
+        for label, value in sorted(self.collect().items()):
+            lines.append(f'{self.name}{{{self.label}="{label}"}} {value}')
+        return lines
+
+
+class RequestStats:
+    """The SQL one request sent"""
+
+    def __init__(self):
+        self.statements = 0
+        self.seconds = 0.0
+        self.shapes = Counter()
+        self.examples = {}
+
+    def record(self, statement, seconds):
+        self.statements += 1
+        self.seconds += seconds
+        shape = fingerprint(statement)
+        self.shapes[shape] += 1
+        self.examples.setdefault(shape, statement)
+
+    def repeated(self, threshold):
+        """(count, shape) of the shapes that ran more than threshold times"""
+        return [(n, s) for s, n in self.shapes.most_common() if n > threshold]
+
+
+class SQLMetrics:
+    """Flask extension recording the SQL of every request"""
+
+    def __init__(self, app=None):
+        self.statements = Histogram(
+            "fyyur_request_sql_statements",
+            "SQL statements sent per request.",
+            STATEMENT_BUCKETS,
+        )
+        self.seconds = Histogram(
+            "fyyur_request_sql_seconds",
+            "Time spent in the database per request.",
+            SECONDS_BUCKETS,
+        )
+        self.repeats = Counters(
+            "fyyur_request_sql_repeats_total",
+            "Requests in which one statement shape ran more than "
+            "SQL_REPEAT_THRESHOLD times.",
+        )
+        self.threshold = 5
+        # Metrics of other extensions served along, see register()
+        self.others = []
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        from models import db
+
+        app.config.setdefault("SQL_REPEAT_THRESHOLD", 5)
+        self.threshold = app.config["SQL_REPEAT_THRESHOLD"]
+        self.watch(db.get_engine(app))
+        for bind in app.config.get("SQLALCHEMY_BINDS") or {}:
+            self.watch(db.get_engine(app, bind=bind))
+        app.before_request(self._start)
+        app.after_request(self._finish)
+        app.add_url_rule("/metrics", "metrics", self.export)
+        app.extensions["sql_metrics"] = self
+
+    def watch(self, engine):
+        """Record the statements sent through engine"""
+        event.listen(engine, "before_cursor_execute", self._before)
+        event.listen(engine, "after_cursor_execute", self._after)
+
+    # The start time goes with the statement's execution context, which a
+    # statement that fails takes with it.  The checks the dialect runs when it
+    # first connects come without a context, and are not recorded.
+
+    @staticmethod
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        if context is not None:
+            context._fyyur_started = time.perf_counter()
+
+    @staticmethod
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        started = getattr(context, "_fyyur_started", None)
+        if started is None:
+            return
+        if has_request_context() and "sql_stats" in g:
+            g.sql_stats.record(statement, time.perf_counter() - started)
+
+    def _start(self):
+        g.sql_stats = RequestStats()
+
+    def _finish(self, response):
+        stats = g.pop("sql_stats", None)
+        endpoint = request.endpoint
+        if stats is None or endpoint in (None, "metrics", "static", "assets"):
+            return response
+        self.statements.observe(endpoint, stats.statements)
+        self.seconds.observe(endpoint, stats.seconds)
+        repeated = stats.repeated(self.threshold)
+        if repeated:
+            self.repeats.inc(endpoint)
+            for count, shape in repeated:
+                current_app.logger.warning(
+                    "Possible N+1 in %s: statement %s ran %d times in one "
+                    "request (%d statements, %.1f ms in total): %s",
+                    endpoint,
+                    hashlib.sha1(shape.encode("utf-8")).hexdigest()[:10],
+                    count,
+                    stats.statements,
+                    stats.seconds * 1000,
+                    stats.examples[shape],
+                )
+        return response
+
+    def register(self, metric):
+        """Serve another Histogram, Counters or Gauge at /metrics too"""
+        self.others.append(metric)
+
+    def export(self):
+        lines = []
+        for metric in (self.statements, self.seconds, self.repeats, *self.others):
+            lines.extend(metric.render())
+        return Response("\n".join(lines) + "\n", mimetype="text/plain; version=0.0.4")
+
+
+sql_metrics = SQLMetrics()
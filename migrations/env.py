@@ -31,6 +31,14 @@ target_metadata = current_app.extensions['migrate'].db.metadata
 # ... etc.
 
 
+# Schema objects that are maintained by hand written migrations rather than
+# the models, e.g. the full text search columns, so autogenerate leaves them be
+def include_object(object, name, type_, reflected, compare_to):
+    if reflected and compare_to is None:
+        return not ('search_vector' in name or name.endswith('_trgm'))
+    return True
+
+
 def run_migrations_offline():
     """Run migrations in 'offline' mode.
 
@@ -81,6 +89,7 @@ def run_migrations_online():
             connection=connection,
             target_metadata=target_metadata,
             process_revision_directives=process_revision_directives,
+            include_object=include_object,
             **current_app.extensions['migrate'].configure_args
         )
 
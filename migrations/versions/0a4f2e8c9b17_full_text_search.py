@@ -0,0 +1,59 @@
+"""full text search
+
+Revision ID: 0a4f2e8c9b17
+Revises: fcd05ac50b72
+Create Date: 2026-10-16 10:12:41.532210
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = '0a4f2e8c9b17'
+down_revision = 'fcd05ac50b72'
+branch_labels = None
+depends_on = None
+
+TABLES = ('venue', 'artist')
+
+
+def upgrade():
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for table in TABLES:
+        op.add_column(table, sa.Column('search_vector', postgresql.TSVECTOR(), nullable=True))
+        # Name weighs most, then the city, then the state and the genres
+        op.execute(f"""
+            CREATE FUNCTION {table}_search_vector_update() RETURNS trigger AS $$
+            BEGIN
+                NEW.search_vector :=
+                    setweight(to_tsvector('simple', coalesce(NEW.name, '')), 'A') ||
+                    setweight(to_tsvector('simple', coalesce(NEW.city, '')), 'B') ||
+                    setweight(to_tsvector('simple', coalesce(NEW.state, '')), 'C') ||
+                    setweight(to_tsvector('simple', coalesce(NEW.genres, '')), 'C');
+                RETURN NEW;
+            END
+            $$ LANGUAGE plpgsql
+        """)
+        op.execute(f"""
+            CREATE TRIGGER {table}_search_vector_trigger
+            BEFORE INSERT OR UPDATE OF name, city, state, genres ON {table}
+            FOR EACH ROW EXECUTE PROCEDURE {table}_search_vector_update()
+        """)
+        # Fire the trigger once for the existing rows
+        op.execute(f'UPDATE {table} SET name = name')
+        op.create_index(f'ix_{table}_search_vector', table, ['search_vector'], postgresql_using='gin')
+        op.create_index(
+            f'ix_{table}_name_trgm', table, ['name'],
+            postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'},
+        )
+
+
+def downgrade():
+    for table in reversed(TABLES):
+        op.drop_index(f'ix_{table}_name_trgm', table_name=table)
+        op.drop_index(f'ix_{table}_search_vector', table_name=table)
+        op.execute(f'DROP TRIGGER {table}_search_vector_trigger ON {table}')
+        op.execute(f'DROP FUNCTION {table}_search_vector_update()')
+        op.drop_column(table, 'search_vector')
@@ -0,0 +1,34 @@
+"""updated at utc
+
+Revision ID: 2f7a9c4e6d18
+Revises: 8e6b0d4f2a71
+Create Date: 2026-10-17 16:05:41.208377
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '2f7a9c4e6d18'
+down_revision = '8e6b0d4f2a71'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # The app writes updated_at in UTC (datetime.utcnow), the database
+    # default now does too rather than in the session's time zone
+    for table in ('artist', 'show', 'venue'):
+        op.alter_column(table, 'updated_at',
+               existing_type=sa.TIMESTAMP(),
+               server_default=sa.text("(CURRENT_TIMESTAMP AT TIME ZONE 'UTC')"),
+               existing_nullable=False)
+
+
+def downgrade():
+    for table in ('artist', 'show', 'venue'):
+        op.alter_column(table, 'updated_at',
+               existing_type=sa.TIMESTAMP(),
+               server_default=sa.text('CURRENT_TIMESTAMP'),
+               existing_nullable=False)
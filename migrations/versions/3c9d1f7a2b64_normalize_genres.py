@@ -0,0 +1,121 @@
+"""normalize genres
+
+Revision ID: 3c9d1f7a2b64
+Revises: 0a4f2e8c9b17
+Create Date: 2026-10-16 14:37:05.118342
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3c9d1f7a2b64'
+down_revision = '0a4f2e8c9b17'
+branch_labels = None
+depends_on = None
+
+TABLES = ('venue', 'artist')
+
+
+def _search_vector_function(table, genres):
+    return f"""
+        CREATE OR REPLACE FUNCTION {table}_search_vector_update() RETURNS trigger AS $$
+        BEGIN
+            NEW.search_vector :=
+                setweight(to_tsvector('simple', coalesce(NEW.name, '')), 'A') ||
+                setweight(to_tsvector('simple', coalesce(NEW.city, '')), 'B') ||
+                setweight(to_tsvector('simple', coalesce(NEW.state, '')), 'C') ||
+                setweight(to_tsvector('simple', coalesce({genres}, '')), 'C');
+            RETURN NEW;
+        END
+        $$ LANGUAGE plpgsql
+    """
+
+
+def upgrade():
+    op.create_table('genre',
+    sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+    sa.Column('name', sa.String(length=120), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('name')
+    )
+    for table in TABLES:
+        op.create_table(f'{table}_genre',
+        sa.Column('genre_id', sa.Integer(), nullable=False),
+        sa.Column(f'{table}_id', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['genre_id'], ['genre.id'], ),
+        sa.ForeignKeyConstraint([f'{table}_id'], [f'{table}.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('genre_id', f'{table}_id')
+        )
+        op.create_index(f'ix_{table}_genre_{table}_id', f'{table}_genre', [f'{table}_id'], unique=False)
+
+    # The old column holds Postgres array literals, e.g. {Jazz,"Rock n Roll"}
+    op.execute("""
+        INSERT INTO genre (name)
+        SELECT DISTINCT trim(g.name) FROM (
+            SELECT unnest(nullif(genres, '')::text[]) AS name FROM venue
+            UNION
+            SELECT unnest(nullif(genres, '')::text[]) AS name FROM artist
+        ) g
+        WHERE trim(g.name) <> ''
+    """)
+    for table in TABLES:
+        op.execute(f"""
+            INSERT INTO {table}_genre (genre_id, {table}_id)
+            SELECT DISTINCT genre.id, t.id
+            FROM {table} t
+            CROSS JOIN LATERAL unnest(nullif(t.genres, '')::text[]) AS g(name)
+            JOIN genre ON genre.name = trim(g.name)
+        """)
+
+        # The search document now reads the genres from the association table
+        op.execute(f'DROP TRIGGER {table}_search_vector_trigger ON {table}')
+        op.execute(_search_vector_function(table, f"""(
+            SELECT string_agg(g.name, ' ') FROM {table}_genre tg
+            JOIN genre g ON g.id = tg.genre_id WHERE tg.{table}_id = NEW.id
+        )"""))
+        op.execute(f"""
+            CREATE TRIGGER {table}_search_vector_trigger
+            BEFORE INSERT OR UPDATE OF name, city, state ON {table}
+            FOR EACH ROW EXECUTE PROCEDURE {table}_search_vector_update()
+        """)
+        op.execute(f"""
+            CREATE FUNCTION {table}_genre_touch() RETURNS trigger AS $$
+            BEGIN
+                UPDATE {table} SET name = name
+                WHERE id = CASE WHEN TG_OP = 'DELETE' THEN OLD.{table}_id ELSE NEW.{table}_id END;
+                RETURN NULL;
+            END
+            $$ LANGUAGE plpgsql
+        """)
+        op.execute(f"""
+            CREATE TRIGGER {table}_genre_touch_trigger
+            AFTER INSERT OR DELETE ON {table}_genre
+            FOR EACH ROW EXECUTE PROCEDURE {table}_genre_touch()
+        """)
+        op.drop_column(table, 'genres')
+
+
+def downgrade():
+    for table in reversed(TABLES):
+        op.add_column(table, sa.Column('genres', sa.String(length=500), nullable=True))
+        op.execute(f"""
+            UPDATE {table} t SET genres = (
+                SELECT array_agg(g.name ORDER BY g.name)::text FROM {table}_genre tg
+                JOIN genre g ON g.id = tg.genre_id WHERE tg.{table}_id = t.id
+            )
+        """)
+        op.execute(f'DROP TRIGGER {table}_genre_touch_trigger ON {table}_genre')
+        op.execute(f'DROP FUNCTION {table}_genre_touch()')
+        op.execute(f'DROP TRIGGER {table}_search_vector_trigger ON {table}')
+        op.execute(_search_vector_function(table, 'NEW.genres'))
+        op.execute(f"""
+            CREATE TRIGGER {table}_search_vector_trigger
+            BEFORE INSERT OR UPDATE OF name, city, state, genres ON {table}
+            FOR EACH ROW EXECUTE PROCEDURE {table}_search_vector_update()
+        """)
+        op.execute(f'UPDATE {table} SET name = name')
+        op.drop_index(f'ix_{table}_genre_{table}_id', table_name=f'{table}_genre')
+        op.drop_table(f'{table}_genre')
+    op.drop_table('genre')
@@ -0,0 +1,99 @@
+"""partition show
+
+Revision ID: d5f1a3c7e9b2
+Revises: c2d8f4b6a1e9
+Create Date: 2026-10-17 09:12:27.104853
+
+"""
+from datetime import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd5f1a3c7e9b2'
+down_revision = 'c2d8f4b6a1e9'
+branch_labels = None
+depends_on = None
+
+# Months of partitions created past the current one, see partitions.py
+AHEAD = 12
+
+INDEXES = {
+    'ix_show_venue_id_start_time': ['venue_id', 'start_time'],
+    'ix_show_artist_id_start_time': ['artist_id', 'start_time'],
+    'ix_show_start_time_id': ['start_time', 'id'],
+}
+
+
+def _months(first, last):
+    year, month = first.year, first.month
+    while (year, month) <= (last.year, last.month):
+        yield datetime(year, month, 1), datetime(year + month // 12, month % 12 + 1, 1)
+        year, month = year + month // 12, month % 12 + 1
+
+
+def _create_show(**kw):
+    op.create_table(
+        'show',
+        sa.Column('id', sa.Integer(), server_default=sa.text("nextval('show_id_seq'::regclass)"), nullable=False),
+        sa.Column('venue_id', sa.Integer(), nullable=True),
+        sa.Column('artist_id', sa.Integer(), nullable=True),
+        sa.Column('start_time', sa.TIMESTAMP(), nullable=kw.pop('nullable')),
+        sa.Column('duration', sa.Integer(), server_default='120', nullable=False),
+        sa.Column('updated_at', sa.TIMESTAMP(), server_default=sa.text('CURRENT_TIMESTAMP'), nullable=False),
+        sa.CheckConstraint('duration > 0 AND duration <= 1440', name='ck_show_duration'),
+        sa.ForeignKeyConstraint(['artist_id'], ['artist.id'], ),
+        sa.ForeignKeyConstraint(['venue_id'], ['venue.id'], ),
+        sa.PrimaryKeyConstraint(*kw.pop('primary_key'), name='show_pkey'),
+        sa.UniqueConstraint('venue_id', 'artist_id', 'start_time', name='uniq_venue_artist_time'),
+        **kw
+    )
+    for name, columns in INDEXES.items():
+        op.create_index(name, 'show', columns, unique=False)
+    op.execute('ALTER SEQUENCE show_id_seq OWNED BY show.id')
+
+
+def _set_aside():
+    op.rename_table('show', 'show_unpartitioned')
+    # Index names are per schema, the new table takes them over
+    for name in ('show_pkey', 'uniq_venue_artist_time', *INDEXES):
+        op.execute(f'ALTER INDEX {name} RENAME TO {name}_unpartitioned')
+
+
+def upgrade():
+    # Every unique key of a partitioned table has to hold the partition key:
+    # the primary key becomes (id, start_time), id still comes from the
+    # sequence.  Shows without a start time have no partition and go.
+    _set_aside()
+    _create_show(nullable=False, primary_key=['id', 'start_time'], postgresql_partition_by='RANGE (start_time)')
+    op.execute('CREATE TABLE show_default PARTITION OF show DEFAULT')
+    first = op.get_bind().execute('SELECT min(start_time) FROM show_unpartitioned').scalar()
+    now = datetime.now()
+    last = datetime(now.year + (now.month + AHEAD - 1) // 12, (now.month + AHEAD - 1) % 12 + 1, 1)
+    for start, end in _months(min(first or now, now), last):
+        op.execute(
+            f"CREATE TABLE show_y{start:%Y}m{start:%m} PARTITION OF show "
+            f"FOR VALUES FROM ('{start:%Y-%m-%d}') TO ('{end:%Y-%m-%d}')"
+        )
+    op.execute(
+        'INSERT INTO show (id, venue_id, artist_id, start_time, duration, updated_at) '
+        'SELECT id, venue_id, artist_id, start_time, duration, updated_at '
+        'FROM show_unpartitioned WHERE start_time IS NOT NULL'
+    )
+    op.drop_table('show_unpartitioned')
+    op.execute('ANALYZE show')
+
+
+def downgrade():
+    # Archived partitions (python app.py shows archive) do not come back
+    _set_aside()
+    _create_show(nullable=True, primary_key=['id'])
+    op.execute(
+        'INSERT INTO show (id, venue_id, artist_id, start_time, duration, updated_at) '
+        'SELECT id, venue_id, artist_id, start_time, duration, updated_at '
+        'FROM show_unpartitioned'
+    )
+    # Drops the partitions along
+    op.drop_table('show_unpartitioned')
@@ -1,14 +1,104 @@
 # ----------------------------------------------------------------------------#
 # Models.
-from flask_sqlalchemy import SQLAlchemy
+from datetime import datetime, timedelta
 
-db = SQLAlchemy()
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.expression import FunctionElement
 
+from routing import RoutingSQLAlchemy
 
-class Venue(db.Model):
+db = RoutingSQLAlchemy()
+
+
+class utcnow(FunctionElement):
+    """The current UTC time without a time zone, datetime.utcnow() in SQL"""
+
+    type = db.TIMESTAMP()
+
+
+@compiles(utcnow)
+def _utcnow(element, compiler, **kw):
+    # UTC on SQLite
+    return "CURRENT_TIMESTAMP"
+
+
+@compiles(utcnow, "postgresql")
+def _utcnow_postgresql(element, compiler, **kw):
+    # CURRENT_TIMESTAMP is in the session's time zone once stored without one
+    return "(CURRENT_TIMESTAMP AT TIME ZONE 'UTC')"
+
+
+class Genre(db.Model):
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    name = db.Column(db.String(120), nullable=False, unique=True)
+
+    @classmethod
+    def for_names(cls, names):
+        """Get the Genre for every name, creating the ones that are new"""
+        names = list(dict.fromkeys(n.strip() for n in names or [] if n.strip()))
+        if not names:
+            return []
+        known = {g.name: g for g in cls.query.filter(cls.name.in_(names))}
+        return [known.get(name) or cls(name=name) for name in names]
+
+
+# Genre first in the primary key so "all venues of a genre" is an index range
+venue_genre = db.Table(
+    "venue_genre",
+    db.Column("genre_id", db.Integer, db.ForeignKey("genre.id"), primary_key=True),
+    db.Column(
+        "venue_id",
+        db.Integer,
+        db.ForeignKey("venue.id", ondelete="CASCADE"),
+        primary_key=True,
+        index=True,
+    ),
+)
+
+artist_genre = db.Table(
+    "artist_genre",
+    db.Column("genre_id", db.Integer, db.ForeignKey("genre.id"), primary_key=True),
+    db.Column(
+        "artist_id",
+        db.Integer,
+        db.ForeignKey("artist.id", ondelete="CASCADE"),
+        primary_key=True,
+        index=True,
+    ),
+)
+
+
+class GenresMixin:
+    """Expose the genre relationship as a plain list of names.
+
+    Forms, templates and seed data all deal in genre names, so ``genres`` reads
+    and writes names while ``genre_list`` holds the Genre rows.
+    """
+
+    @property
+    def genres(self):
+        return [g.name for g in self.genre_list]
+
+    @genres.setter
+    def genres(self, names):
+        self.genre_list = Genre.for_names(names)
+
+
+class UpdatedAtMixin:
+    """``updated_at``, when the row was last changed (UTC), e.g. for feed ETags"""
+
+    updated_at = db.Column(
+        db.TIMESTAMP,
+        nullable=False,
+        default=datetime.utcnow,
+        onupdate=datetime.utcnow,
+        server_default=utcnow(),
+    )
+
+
+class Venue(GenresMixin, UpdatedAtMixin, db.Model):
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     name = db.Column(db.String)
-    genres = db.Column(db.String(500))
     address = db.Column(db.String(120))
     city = db.Column(db.String(120))
     state = db.Column(db.String(120))
@@ -18,14 +108,24 @@ class Venue(db.Model):
     seeking_talent = db.Column(db.BOOLEAN)
     seeking_description = db.Column(db.String(500))
     image_link = db.Column(db.String(500))
+    # Filled in by geo.py, geohash interleaves the bits of the coordinates
+    latitude = db.Column(db.Float)
+    longitude = db.Column(db.Float)
+    geohash = db.Column(db.BigInteger)
 
     shows = db.relationship("Show", backref="venue")
+    genre_list = db.relationship("Genre", secondary=venue_genre, order_by=Genre.name)
+
+    __table_args__ = (
+        db.Index("ix_venue_city_state", "city", "state"),
+        # Covers the "near" candidates, see queries.venues_near
+        db.Index("ix_venue_geohash", "geohash", "latitude", "longitude", "id"),
+    )
 
 
-class Artist(db.Model):
+class Artist(GenresMixin, UpdatedAtMixin, db.Model):
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     name = db.Column(db.String(120), nullable=False)
-    genres = db.Column(db.String(500))
     city = db.Column(db.String(120))
     state = db.Column(db.String(120))
     phone = db.Column(db.String(120))
@@ -36,15 +136,82 @@ class Artist(db.Model):
     image_link = db.Column(db.String(500))
 
     shows = db.relationship("Show", backref="artist")
+    genre_list = db.relationship("Genre", secondary=artist_genre, order_by=Genre.name)
+
+
+# Length of a show in minutes; bounded so overlap searches stay index ranges
+SHOW_DEFAULT_DURATION = 120
+SHOW_MAX_DURATION = 24 * 60
 
 
-class Show(db.Model):
+class Show(UpdatedAtMixin, db.Model):
+    # On PostgreSQL the table is partitioned by month of start_time (see
+    # partitions.py) and its primary key is (id, start_time); id alone is
+    # still unique, the sequence hands it out
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     venue_id = db.Column(db.Integer, db.ForeignKey("venue.id"), nullable=True)
     artist_id = db.Column(db.Integer, db.ForeignKey("artist.id"), nullable=True)
-    start_time = db.Column(db.TIMESTAMP)
+    start_time = db.Column(db.TIMESTAMP, nullable=False)
+    duration = db.Column(
+        db.Integer,
+        nullable=False,
+        default=SHOW_DEFAULT_DURATION,
+        server_default=str(SHOW_DEFAULT_DURATION),
+    )
+
+    @property
+    def end_time(self):
+        return self.start_time + timedelta(minutes=self.duration)
+
     __table_args__ = (
+        db.CheckConstraint(
+            f"duration > 0 AND duration <= {SHOW_MAX_DURATION}",
+            name="ck_show_duration",
+        ),
         db.UniqueConstraint(
             "venue_id", "artist_id", "start_time", name="uniq_venue_artist_time"
         ),
+        # Upcoming/past shows of one venue or artist
+        db.Index("ix_show_venue_id_start_time", "venue_id", "start_time"),
+        db.Index("ix_show_artist_id_start_time", "artist_id", "start_time"),
+        # The /shows feed pages through (start_time, id)
+        db.Index("ix_show_start_time_id", "start_time", "id"),
+    )
+
+
+class ShowCount(db.Model):
+    """Upcoming and past shows of one venue or artist, kept by counters.py"""
+
+    kind = db.Column(db.String(10), primary_key=True)  # "venue" or "artist"
+    owner_id = db.Column(db.Integer, primary_key=True)
+    upcoming = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    past = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+
+
+class ShowCountSweep(db.Model):
+    """The single row holding the time up to which shows count as past"""
+
+    id = db.Column(db.Integer, primary_key=True)
+    swept_until = db.Column(db.TIMESTAMP, nullable=False)
+
+
+class Job(db.Model):
+    """A durable background job, queued and run by jobs.py"""
+
+    id = db.Column(db.Integer, primary_key=True)
+    task = db.Column(db.String(100), nullable=False)
+    args = db.Column(db.Text, nullable=False, default="[]")  # JSON list
+    # "queued", "running" or, after JOBS_MAX_ATTEMPTS, "failed"
+    status = db.Column(
+        db.String(10), nullable=False, default="queued", server_default="queued"
+    )
+    attempts = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    run_at = db.Column(db.TIMESTAMP, nullable=False, default=datetime.now)
+    created_at = db.Column(db.TIMESTAMP, nullable=False, default=datetime.now)
+    started_at = db.Column(db.TIMESTAMP)
+    error = db.Column(db.Text)
+
+    __table_args__ = (
+        # The workers poll for the queued jobs that are due
+        db.Index("ix_job_status_run_at", "status", "run_at"),
     )
@@ -0,0 +1,222 @@
+# ----------------------------------------------------------------------------#
+# Show partitions.
+# ----------------------------------------------------------------------------#
+"""Monthly partitions of the show table, on PostgreSQL.
+
+Migration d5f1a3c7e9b2 range partitions ``show`` by ``start_time``: one
+partition per month (``show_y2026m10``) and ``show_default`` for the shows
+no partition covers.  A query bounded on ``start_time`` -- the upcoming shows,
+the /shows feed, a page of recent past shows -- only reads the partitions of
+its months.
+
+* ``python app.py shows partition`` creates the partitions of this month and
+  the ``SHOW_PARTITIONS_AHEAD`` after it that are missing, moving the shows
+  booked for them out of ``show_default``.  Run it daily from cron.
+* ``python app.py shows archive`` detaches the partitions of the months
+  before the last ``SHOW_ARCHIVE_KEEP_MONTHS`` into the ``show_archive``
+  schema, where they can still be queried with SQL, or with ``--dump DIR``
+  writes each one to a gzipped CSV file and drops it.  Archived shows no
+  longer show up anywhere in the app, and the past show counters of their
+  venues and artists drop accordingly.
+* The venue and artist pages list the past shows from ``history_start()`` on,
+  the last ``PAST_SHOWS_MONTHS`` months (``HISTORY_MONTHS`` by default, none
+  on SQLite where nothing is partitioned), unless asked for ``?history=all``.
+"""
+
+import gzip
+import os
+import re
+import sys
+from datetime import datetime
+
+from flask import current_app
+from flask_script import Command, Manager, Option
+from sqlalchemy import text
+from sqlalchemy.engine.url import make_url
+
+from counters import OWNERS, refresh
+from models import Show, db
+
+ARCHIVE_SCHEMA = "show_archive"
+
+# Months of past shows the venue and artist pages list when the show table is
+# partitioned, unless PAST_SHOWS_MONTHS says otherwise
+HISTORY_MONTHS = 12
+
+_BOUNDS = re.compile(r"FROM \('([^']+)'\) TO \('([^']+)'\)")
+
+
+def month(value, months=0):
+    """The first day of the month of value, months later"""
+    index = value.year * 12 + value.month - 1 + months
+    return datetime(index // 12, index % 12 + 1, 1)
+
+
+def history_months(config):
+    """PAST_SHOWS_MONTHS, by default HISTORY_MONTHS on PostgreSQL, where the
+    migrations partition the show table, and 0 (all of them) elsewhere"""
+    months = config.get("PAST_SHOWS_MONTHS")
+    if months is not None:
+        return int(months)
+    url = make_url(config["SQLALCHEMY_DATABASE_URI"])
+    return HISTORY_MONTHS if url.get_backend_name() == "postgresql" else 0
+
+
+def history_start(months, now=None):
+    """Since when the venue and artist pages list past shows, None for ever"""
+    if not months:
+        return None
+    return month(now or datetime.now(), -months)
+
+
+def partitions():
+    """[(name, start, end)] of the month partitions, oldest first"""
+    rows = db.session.execute(
+        text(
+            "SELECT c.relname, pg_get_expr(c.relpartbound, c.oid) "
+            "FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+            "WHERE i.inhparent = CAST(:parent AS regclass)"
+        ),
+        {"parent": Show.__tablename__},
+    )
+    found = []
+    for name, bounds in rows:
+        match = _BOUNDS.search(bounds)
+        if match:
+            found.append((name, *(datetime.fromisoformat(b) for b in match.groups())))
+    return sorted(found, key=lambda p: p[1])
+
+
+def create_partition(start):
+    """Create the partition of the month starting at start.
+
+    Built off to the side and attached, so the shows show_default holds for
+    the month can be moved into it first.
+    """
+    end = month(start, 1)
+    name = f"show_y{start:%Y}m{start:%m}"
+    bounds = {"start": start, "end": end}
+    db.session.execute(
+        f"CREATE TABLE {name} (LIKE show INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"
+    )
+    db.session.execute(
+        text(
+            "WITH moved AS (DELETE FROM show_default "
+            "WHERE start_time >= :start AND start_time < :end RETURNING *) "
+            f"INSERT INTO {name} SELECT * FROM moved"
+        ),
+        bounds,
+    )
+    db.session.execute(
+        f"ALTER TABLE show ATTACH PARTITION {name} "
+        f"FOR VALUES FROM ('{start:%Y-%m-%d}') TO ('{end:%Y-%m-%d}')"
+    )
+    return name
+
+
+def ensure_partitions(ahead, now=None):
+    """Create the missing partitions up to ahead months from now, returns them"""
+    covered = [(start, end) for _, start, end in partitions()]
+    this = month(now or datetime.now())
+    created = []
+    for months in range(ahead + 1):
+        start = month(this, months)
+        if not any(low <= start < high for low, high in covered):
+            created.append(create_partition(start))
+    db.session.commit()
+    return created
+
+
+def _owners(name):
+    """{kind: ids} of the venues and artists with shows in a partition"""
+    return {
+        kind: [
+            owner
+            for owner, in db.session.execute(
+                f"SELECT DISTINCT {column.key} FROM {name} "
+                f"WHERE {column.key} IS NOT NULL"
+            )
+        ]
+        for kind, (_, column) in OWNERS.items()
+    }
+
+
+def archive(keep, dump=None, now=None, chunk=5000):
+    """Archive the partitions before the last keep months, returns their names.
+
+    Without dump they move to the ARCHIVE_SCHEMA schema, with it they are
+    written to <dump>/<name>.csv.gz and dropped.  Each partition goes in a
+    transaction of its own, with the counters of its venues and artists.
+    """
+    before = month(now or datetime.now(), -keep)
+    archived = []
+    for name, _, end in partitions():
+        if end > before:
+            break
+        owners = _owners(name)
+        if dump is not None:
+            path = os.path.join(dump, f"{name}.csv.gz")
+            cursor = db.session.connection().connection.cursor()
+            with gzip.open(path, "wb") as f:
+                cursor.copy_expert(
+                    f"COPY {name} TO STDOUT WITH (FORMAT csv, HEADER)", f
+                )
+        db.session.execute(f"ALTER TABLE show DETACH PARTITION {name}")
+        if dump is not None:
+            db.session.execute(f"DROP TABLE {name}")
+        else:
+            db.session.execute(f"CREATE SCHEMA IF NOT EXISTS {ARCHIVE_SCHEMA}")
+            db.session.execute(f"ALTER TABLE {name} SET SCHEMA {ARCHIVE_SCHEMA}")
+        for kind, ids in owners.items():
+            for i in range(0, len(ids), chunk):
+                refresh(kind, ids[i : i + chunk])
+        db.session.commit()
+        archived.append(name)
+    return archived
+
+
+# ----------------------------------------------------------------------------#
+# Commands, registered as "python app.py shows ..."
+# ----------------------------------------------------------------------------#
+
+
+def _partitioned():
+    if db.engine.dialect.name != "postgresql":
+        sys.exit("The show table is only partitioned on PostgreSQL")
+
+
+class Partition(Command):
+    """Create the partitions of the coming months"""
+
+    option_list = (
+        Option("--ahead", type=int, help="months, SHOW_PARTITIONS_AHEAD by default"),
+    )
+
+    def run(self, ahead):
+        _partitioned()
+        if ahead is None:
+            ahead = current_app.config["SHOW_PARTITIONS_AHEAD"]
+        created = ensure_partitions(ahead)
+        print(f"Created {len(created)} partitions {' '.join(created)}".rstrip())
+
+
+class Archive(Command):
+    """Detach the partitions of old shows, or dump and drop them"""
+
+    option_list = (
+        Option("--keep", type=int, help="months, SHOW_ARCHIVE_KEEP_MONTHS by default"),
+        Option("--dump", metavar="DIR", help="write gzipped CSV files and drop"),
+    )
+
+    def run(self, keep, dump):
+        _partitioned()
+        if keep is None:
+            keep = current_app.config["SHOW_ARCHIVE_KEEP_MONTHS"]
+        archived = archive(keep, dump)
+        where = dump or f"the {ARCHIVE_SCHEMA} schema"
+        print(f"Archived {len(archived)} partitions to {where}")
+
+
+commands = Manager(usage="Maintain the partitions of the show table")
+commands.add_command("partition", Partition())
+commands.add_command("archive", Archive())
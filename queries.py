@@ -0,0 +1,453 @@
+# ----------------------------------------------------------------------------#
+# Read models.
+# ----------------------------------------------------------------------------#
+import base64
+import json
+import math
+from datetime import datetime
+from functools import lru_cache
+from itertools import groupby
+
+from sqlalchemy import (
+    BigInteger,
+    DateTime,
+    Float,
+    Integer,
+    and_,
+    bindparam,
+    case,
+    func,
+    or_,
+    select,
+    true,
+    tuple_,
+    union_all,
+)
+from sqlalchemy.orm import joinedload
+
+from counters import upcoming_column
+from geo import KM_PER_DEGREE, cover, distance_km
+from models import Artist, Genre, Show, ShowCount, Venue, db
+
+
+def with_genre(query, model, genre):
+    """Restrict a query over model to the rows tagged with genre, if one is given.
+
+    Looks the genre up by its unique name and walks the (genre_id, ...)
+    primary key of the venue_genre/artist_genre association table.
+    """
+    if not genre:
+        return query
+    association = model.genre_list.property.secondary
+    owner_id = association.c[f"{model.__tablename__}_id"]
+    return query.join(association, owner_id == model.id).join(
+        Genre, and_(Genre.id == association.c.genre_id, Genre.name == genre)
+    )
+
+
+def venue_areas_query(genre=None):
+    """Select the venues by city and state, with their upcoming show counts.
+
+    The whole listing comes from this single statement on the venues and
+    their counters, so the number of statements stays the same no matter how
+    many venues or areas there are.  Optionally only the venues of one genre
+    are listed.
+    """
+    on, upcoming = upcoming_column("venue", Venue)
+    query = db.session.query(
+        Venue.city,
+        Venue.state,
+        Venue.id,
+        Venue.name,
+        upcoming.label("num_upcoming_shows"),
+    )
+    return (
+        with_genre(query, Venue, genre)
+        .outerjoin(ShowCount, on)
+        .order_by(Venue.city, Venue.state, Venue.id)
+        .statement
+    )
+
+
+def group_areas(rows):
+    """The rows of venue_areas_query() grouped into areas for the template"""
+    return [
+        {
+            "city": city,
+            "state": state,
+            "venues": [
+                {
+                    "id": r["id"],
+                    "name": r["name"],
+                    "num_upcoming_shows": r["num_upcoming_shows"],
+                }
+                for r in area
+            ],
+        }
+        for (city, state), area in groupby(rows, key=lambda r: (r["city"], r["state"]))
+    ]
+
+
+def venue_areas(genre=None):
+    """Get the venues grouped by city and state, with their upcoming show counts"""
+    return group_areas(db.session.execute(venue_areas_query(genre)))
+
+
+def artist_list_query(genre=None):
+    """Select the id and name of every artist, optionally of one genre only"""
+    query = db.session.query(Artist.id, Artist.name)
+    return with_genre(query, Artist, genre).statement
+
+
+def search_statements(model, hits=None, limit=None, offset=0):
+    """Select one page of search hits for model, and count all of them.
+
+    hits is a subquery of (id, rank) rows from the search engine, best match
+    first; None lists every row by name.  Every hit and its upcoming show
+    count come back from the page statement, which joins the counters; the
+    total number of hits is a window count over the same result so paging
+    with limit/offset does not need the count statement, except when paged
+    past the end, where the window count has no row to ride on.
+    """
+    on, upcoming = upcoming_column(model.__tablename__, model)
+    query = db.session.query(
+        model.id,
+        model.name,
+        upcoming.label("num_upcoming_shows"),
+        func.count().over().label("total"),
+    )
+    if hits is None:
+        query = query.order_by(model.name, model.id)
+    else:
+        query = query.join(hits, hits.c.id == model.id).order_by(
+            hits.c.rank.desc(), model.name, model.id
+        )
+    query = query.outerjoin(ShowCount, on)
+    count = select([func.count().label("total")]).select_from(
+        query.with_entities(model.id).order_by(None).subquery()
+    )
+    return query.limit(limit).offset(offset).statement, count
+
+
+def search_page(rows, count=0):
+    """The search results template data from the rows of the page statement"""
+    return {
+        "count": rows[0]["total"] if rows else count,
+        "data": [
+            {
+                "id": r["id"],
+                "name": r["name"],
+                "num_upcoming_shows": r["num_upcoming_shows"],
+            }
+            for r in rows
+        ],
+    }
+
+
+def search_results(model, hits=None, limit=None, offset=0):
+    """Get the search hits for model together with their upcoming show counts"""
+    page, count = search_statements(model, hits, limit, offset)
+    rows = db.session.execute(page).fetchall()
+    if rows or not offset:
+        return search_page(rows)
+    return search_page(rows, db.session.execute(count).scalar())
+
+
+# Compiled near statements, see _near_statement
+_near_compiled = {}
+
+
+@lru_cache(maxsize=None)
+def _near_statement(ranges):
+    """Select the nearest venues to a point within some geohash ranges.
+
+    The shape only depends on the number of ranges, so one statement (with
+    the point, the ranges and the rest bound as parameters) is built per
+    number and compiled once.  Each range is its own index only scan of
+    ix_venue_geohash, which holds the coordinates; the scans are glued with
+    UNION ALL, an OR would turn them into one bitmap scan reading a table
+    page per candidate.  Candidates are ordered by a flat-earth distance --
+    plain arithmetic, SQLite needs no math functions, with the longitudes
+    wrapped at the antimeridian like the cover() ranges -- and only the nearest
+    limit are joined to their venue and counters.
+    """
+    scale = bindparam("scale", type_=Float)
+    dy = Venue.latitude - bindparam("latitude", type_=Float)
+    dlon = Venue.longitude - bindparam("longitude", type_=Float)
+    # The short way round, across the antimeridian when that is shorter: a
+    # CASE rather than a float modulo, which neither SQLite nor PostgreSQL has
+    dlon = case([(dlon > 180, dlon - 360), (dlon < -180, dlon + 360)], else_=dlon)
+    dx = dlon * scale
+    # In squared degrees
+    flat = (dy * dy + dx * dx).label("flat")
+    scans = [
+        select([Venue.id, flat]).where(
+            and_(
+                Venue.geohash >= bindparam(f"low{i}", type_=BigInteger),
+                Venue.geohash < bindparam(f"high{i}", type_=BigInteger),
+            )
+        )
+        for i in range(ranges)
+    ]
+    scanned = (union_all(*scans) if ranges > 1 else scans[0]).alias("scanned")
+    candidates = (
+        select([scanned])
+        .where(scanned.c.flat <= bindparam("reach", type_=Float))
+        .order_by(scanned.c.flat)
+        .limit(bindparam("limit", type_=Integer))
+        .alias("candidates")
+    )
+    on, upcoming = upcoming_column("venue", Venue)
+    return (
+        select(
+            [
+                Venue.id,
+                Venue.name,
+                Venue.address,
+                Venue.city,
+                Venue.state,
+                Venue.latitude,
+                Venue.longitude,
+                upcoming.label("num_upcoming_shows"),
+            ]
+        )
+        .select_from(
+            Venue.__table__.join(candidates, candidates.c.id == Venue.id).outerjoin(
+                ShowCount.__table__, on
+            )
+        )
+        .order_by(candidates.c.flat, Venue.id)
+    )
+
+
+def _nearest(latitude, longitude, radius_km, limit):
+    """The (at most) limit venues nearest to a point within radius_km"""
+    ranges = cover(latitude, longitude, radius_km)
+    params = {
+        "latitude": latitude,
+        "longitude": longitude,
+        "scale": math.cos(math.radians(latitude)),
+        # The flat distance errs by well under 5%; too far ones are dropped
+        "reach": (radius_km * 1.05 / KM_PER_DEGREE) ** 2,
+        "limit": limit,
+    }
+    for i, (low, high) in enumerate(ranges):
+        params[f"low{i}"], params[f"high{i}"] = low, high
+    connection = db.session.connection().execution_options(
+        compiled_cache=_near_compiled
+    )
+    venues = []
+    for r in connection.execute(_near_statement(len(ranges)), params):
+        distance = distance_km(latitude, longitude, r.latitude, r.longitude)
+        if distance <= radius_km:
+            venues.append(dict(r, distance_km=round(distance, 3)))
+    return venues
+
+
+def venues_near(latitude, longitude, radius_km, limit=50, first_km=0.5):
+    """The (at most) limit venues nearest to a point within radius_km.
+
+    Searches a ring of first_km first and widens it until it holds limit
+    venues or reaches radius_km: nothing outside a ring is nearer than what
+    is in it.  The next ring is sized for the venues still missing from the
+    density of the last one (sixteen times as wide when it was empty), so a
+    dense city centre reads about limit venues rather than every venue
+    within radius_km, and open country takes a few cheap statements.  Each
+    venue comes with its great circle distance in km.
+    """
+    ring = min(first_km, radius_km)
+    while True:
+        venues = _nearest(latitude, longitude, ring, limit)
+        if len(venues) >= limit or ring >= radius_km:
+            return sorted(venues, key=lambda v: (v["distance_km"], v["id"]))
+        grow = math.sqrt(limit / len(venues)) * 1.5 if venues else 16
+        ring = min(ring * max(grow, 2), radius_km)
+
+
+# The model, and the model on the other side of its shows, of each page kind
+DETAIL_KINDS = {
+    "venue": (Venue, Show.venue_id, Artist, Show.artist_id),
+    "artist": (Artist, Show.artist_id, Venue, Show.venue_id),
+}
+
+
+def detail_statements(kind, owner_id, now=None, past_limit=None, past_since=None):
+    """The statements a venue or artist page is built from.
+
+    Returns {name: statement}; they do not depend on each other's results,
+    so they can run in any order or all at once:
+
+    * ``page`` -- the venue or artist and every one of its shows, with the
+      name and image of the artist or venue on the other side, in one
+      statement.  Each show is flagged ``past`` (started at or before now)
+      and carries the ``total`` number of shows on its side of now.  With
+      ``past_limit`` only the most recent past_limit past shows come back;
+      ``total`` still counts all of them.  With ``past_since`` the shows
+      before it are left out altogether, and so are the show partitions of
+      their months.
+    * ``genres`` -- the genre names.
+    """
+    model, column, other, other_column = DETAIL_KINDS[kind]
+    now = now or datetime.now()
+    flagged = (
+        select(
+            [
+                Show.start_time,
+                other.id.label(f"{other.__tablename__}_id"),
+                other.name.label(f"{other.__tablename__}_name"),
+                other.image_link.label(f"{other.__tablename__}_image_link"),
+                case([(Show.start_time <= now, 1)], else_=0).label("past"),
+            ]
+        )
+        .select_from(Show.__table__.join(other.__table__, other.id == other_column))
+        .where(column == owner_id)
+    )
+    if past_since is not None:
+        flagged = flagged.where(Show.start_time >= past_since)
+    flagged = flagged.alias("flagged")
+    # Windows over the flag column rather than the CASE, so "now" is bound
+    # once (positional drivers would need it once per use)
+    shows = select(
+        [
+            flagged,
+            func.count().over(partition_by=flagged.c.past).label("total"),
+            func.row_number()
+            .over(partition_by=flagged.c.past, order_by=flagged.c.start_time.desc())
+            .label("recency"),
+        ]
+    ).alias("shows")
+    # The cap goes in the join condition so a venue or artist whose shows
+    # are all cut still comes back, with no show
+    on = (
+        true()
+        if past_limit is None
+        else (or_(shows.c.past == 0, shows.c.recency <= past_limit))
+    )
+    genres = model.genre_list.property.secondary
+    return {
+        "page": select([model.__table__, shows])
+        .select_from(model.__table__.outerjoin(shows, on))
+        .where(model.id == owner_id)
+        .order_by(shows.c.start_time),
+        "genres": select([Genre.name])
+        .select_from(genres.join(Genre, Genre.id == genres.c.genre_id))
+        .where(genres.c[f"{kind}_id"] == owner_id)
+        .order_by(Genre.name),
+    }
+
+
+def detail_page(kind, results, past_since=None):
+    """The template data of a venue or artist page, None if there is no such one.
+
+    results holds the rows of every statement of detail_statements() by name,
+    past_since the one they were made with.  Upcoming shows are listed
+    soonest first, past shows most recent first.
+    """
+    rows = results["page"]
+    if not rows:
+        return None
+    model, _, other, _ = DETAIL_KINDS[kind]
+    data = {c.key: rows[0][c.key] for c in model.__table__.columns}
+    data["genres"] = [r["name"] for r in results["genres"]]
+    show_keys = ["start_time"] + [
+        f"{other.__tablename__}_{key}" for key in ("id", "name", "image_link")
+    ]
+    upcoming, past = [], []
+    for r in rows:
+        if r["start_time"] is not None:
+            (past if r["past"] else upcoming).append(r)
+    past.reverse()
+    data["upcoming_shows_count"] = len(upcoming)
+    data["upcoming_shows"] = [{k: r[k] for k in show_keys} for r in upcoming]
+    data["past_shows_count"] = past[0]["total"] if past else 0
+    data["past_shows"] = [{k: r[k] for k in show_keys} for r in past]
+    data["past_shows_since"] = past_since
+    return data
+
+
+def fetch_all(statements):
+    """Run every statement of {name: statement}, returns {name: rows}"""
+    return {name: db.session.execute(s).fetchall() for name, s in statements.items()}
+
+
+def encode_cursor(*values):
+    """Opaque, url safe cursor for keyset pagination"""
+    values = [v.isoformat() if isinstance(v, datetime) else v for v in values]
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+
+def decode_cursor(cursor):
+    """The values encoded by encode_cursor, or None if cursor is not valid"""
+    try:
+        return json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (ValueError, AttributeError):
+        return None
+
+
+def after_cursor(query, cursor, *columns):
+    """Keep the rows of query that sort after cursor on the given columns.
+
+    cursor is what encode_cursor made of the same columns of the last row of
+    the previous page.  A mangled cursor starts over from the first page.
+    """
+    values = decode_cursor(cursor)
+    if not isinstance(values, list) or len(values) != len(columns):
+        return query
+    try:
+        position = tuple(
+            datetime.fromisoformat(v) if isinstance(c.type, DateTime) else int(v)
+            for c, v in zip(columns, values)
+        )
+    except (TypeError, ValueError):
+        return query
+    return query.filter(tuple_(*columns) > position)
+
+
+def show_feed(after=None, start=None, end=None, per_page=30):
+    """Get one page of shows ordered by (start_time, id).
+
+    Pages are cut with a keyset condition on (start_time, id) instead of an
+    OFFSET, and the venue and artist of every show are loaded in the same
+    query, so each page costs the same no matter how many shows there are.
+    """
+    query = (
+        Show.query.options(joinedload(Show.venue), joinedload(Show.artist))
+        .filter(Show.start_time.isnot(None))
+        .order_by(Show.start_time, Show.id)
+    )
+    if start is not None:
+        query = query.filter(Show.start_time >= start)
+    if end is not None:
+        query = query.filter(Show.start_time < end)
+    if after:
+        query = after_cursor(query, after, Show.start_time, Show.id)
+    # One extra row tells whether there is a next page
+    page = query.limit(per_page + 1).all()
+    shows = page[:per_page]
+    return {
+        "shows": [
+            {
+                "venue_id": s.venue_id,
+                "venue_name": s.venue.name,
+                "artist_id": s.artist_id,
+                "artist_name": s.artist.name,
+                "artist_image_link": s.artist.image_link,
+                "start_time": s.start_time,
+            }
+            for s in shows
+        ],
+        "next_cursor": (
+            encode_cursor(shows[-1].start_time, shows[-1].id)
+            if len(page) > per_page
+            else None
+        ),
+    }
+
+
+def counterpart_ids(column, other, id):
+    """Distinct values of other over the shows whose column equals id.
+
+    e.g. counterpart_ids(Show.venue_id, Show.artist_id, 3) are the artists that
+    play or played at venue 3.
+    """
+    return [r[0] for r in db.session.query(other).filter(column == id).distinct()]
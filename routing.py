@@ -0,0 +1,108 @@
+# ----------------------------------------------------------------------------#
+# Database engines and read replicas.
+# ----------------------------------------------------------------------------#
+"""Engine tuning and routing of read-only requests to replicas.
+
+``RoutingSQLAlchemy`` is Flask-SQLAlchemy with:
+
+* Pool options from ``DB_POOL_SIZE``, ``DB_MAX_OVERFLOW``, ``DB_POOL_RECYCLE``
+  and ``DB_POOL_PRE_PING``, and a server side ``DB_STATEMENT_TIMEOUT`` (ms) on
+  PostgreSQL.  SQLite keeps Flask-SQLAlchemy's own pool choice.
+* Every URI in ``SQLALCHEMY_REPLICA_URIS`` registered as a ``replicaN`` bind.
+  Requests to one of the ``REPLICA_ENDPOINTS`` read from a replica picked at
+  random, everything else, and anything a session flushes, goes to the
+  primary.
+* Read-your-writes: a client that sent a POST, DELETE or any other method but
+  GET, HEAD and OPTIONS to a primary endpoint reads from the primary for the
+  next ``REPLICA_STICKY_SECONDS``, so it sees its own change even while the
+  replicas lag behind.
+"""
+
+import random
+import time
+
+from flask import current_app, g, has_request_context, request, session
+from flask_sqlalchemy import SignallingSession, SQLAlchemy, get_state
+from sqlalchemy import orm
+
+STICKY_KEY = "_primary_until"
+# Methods that do not change anything
+SAFE_METHODS = frozenset(("GET", "HEAD", "OPTIONS"))
+
+
+def current_replica():
+    """Bind key of the replica the current request reads from, or None"""
+    if not has_request_context():
+        return None
+    if "db_replica" not in g:
+        g.db_replica = None
+        replicas = get_state(current_app).db.replicas
+        if (
+            replicas
+            and request.endpoint in current_app.config["REPLICA_ENDPOINTS"]
+            and session.get(STICKY_KEY, 0) < time.time()
+        ):
+            g.db_replica = random.choice(replicas)
+    return g.db_replica
+
+
+class RoutingSession(SignallingSession):
+    """Session reading from a replica during read-only requests"""
+
+    def get_bind(self, mapper=None, clause=None):
+        replica = None if self._flushing else current_replica()
+        if replica is not None:
+            return get_state(self.app).db.get_engine(self.app, bind=replica)
+        return super().get_bind(mapper, clause)
+
+
+class RoutingSQLAlchemy(SQLAlchemy):
+    """Flask-SQLAlchemy with pool tuning and read replicas"""
+
+    def __init__(self, *args, **kwargs):
+        self.replicas = []
+        super().__init__(*args, **kwargs)
+
+    def init_app(self, app):
+        app.config.setdefault("DB_POOL_SIZE", 10)
+        app.config.setdefault("DB_MAX_OVERFLOW", 20)
+        app.config.setdefault("DB_POOL_RECYCLE", 1800)
+        app.config.setdefault("DB_POOL_PRE_PING", True)
+        app.config.setdefault("DB_STATEMENT_TIMEOUT", 0)
+        app.config.setdefault("SQLALCHEMY_REPLICA_URIS", [])
+        app.config.setdefault("REPLICA_ENDPOINTS", set())
+        app.config.setdefault("REPLICA_STICKY_SECONDS", 5)
+        binds = dict(app.config.get("SQLALCHEMY_BINDS") or {})
+        self.replicas = []
+        for i, uri in enumerate(app.config["SQLALCHEMY_REPLICA_URIS"]):
+            binds[f"replica{i}"] = uri
+            self.replicas.append(f"replica{i}")
+        app.config["SQLALCHEMY_BINDS"] = binds or None
+        if self.replicas:
+            app.after_request(self._stick_to_primary)
+        super().init_app(app)
+
+    def create_session(self, options):
+        return orm.sessionmaker(class_=RoutingSession, db=self, **options)
+
+    def apply_driver_hacks(self, app, sa_url, options):
+        super().apply_driver_hacks(app, sa_url, options)
+        options.setdefault("pool_pre_ping", app.config["DB_POOL_PRE_PING"])
+        if sa_url.drivername.startswith("sqlite"):
+            return
+        options.setdefault("pool_size", app.config["DB_POOL_SIZE"])
+        options.setdefault("max_overflow", app.config["DB_MAX_OVERFLOW"])
+        options.setdefault("pool_recycle", app.config["DB_POOL_RECYCLE"])
+        timeout = app.config["DB_STATEMENT_TIMEOUT"]
+        if timeout and sa_url.drivername.startswith("postgresql"):
+            connect_args = options.setdefault("connect_args", {})
+            connect_args["options"] = f"-c statement_timeout={int(timeout)}"
+
+    def _stick_to_primary(self, response):
+        config = current_app.config
+        if (
+            request.method not in SAFE_METHODS
+            and request.endpoint not in config["REPLICA_ENDPOINTS"]
+        ):
+            session[STICKY_KEY] = time.time() + config["REPLICA_STICKY_SECONDS"]
+        return response
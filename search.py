@@ -0,0 +1,199 @@
+# ----------------------------------------------------------------------------#
+# Search.
+# ----------------------------------------------------------------------------#
+"""Indexed full-text search over venues and artists.
+
+Each backend turns a search term into a subquery of ``(id, rank)`` rows for a
+model, matching the name, city, state and genres.  The caller joins that
+subquery to its own query and orders by ``rank``:
+
+* ``PostgresSearch`` -- a ``search_vector`` tsvector column (kept up to date by
+  a trigger, GIN indexed) for word/prefix matches, plus ``pg_trgm`` on the name
+  for substring and fuzzy matches.  The schema lives in the migrations.
+* ``SqliteSearch`` -- an FTS5 table per model, kept in sync with triggers.  It
+  is installed on first use so the app can be exercised offline.
+* ``LikeSearch`` -- the old unindexed ``ILIKE '%term%'`` on the name, used
+  when neither of the above is available.
+"""
+
+import re
+
+from sqlalchemy import Float, column, func, literal, or_, select, table, text
+from sqlalchemy.dialects.postgresql import TSVECTOR
+from sqlalchemy.exc import OperationalError
+
+from models import db
+
+_WORD = re.compile(r"\w+", re.UNICODE)
+
+# The columns that make up the search document of each table
+DOCUMENT_COLUMNS = ("name", "city", "state", "genres")
+
+
+def _words(term):
+    return _WORD.findall(term or "")
+
+
+class LikeSearch:
+    """Unindexed substring match on the name"""
+
+    def matches(self, model, term):
+        return (
+            select([model.id.label("id"), literal(0.0, Float).label("rank")])
+            .where(model.name.ilike(f"%{term}%"))
+            .alias("search_hits")
+        )
+
+
+class PostgresSearch:
+    """tsvector + pg_trgm search, see migration 0a4f2e8c9b17"""
+
+    config = "simple"
+
+    def matches(self, model, term):
+        words = _words(term)
+        searchable = table(
+            model.__tablename__,
+            column("id"),
+            column("name"),
+            column("search_vector", TSVECTOR),
+        )
+        # Every word has to match, the last one may still be half typed
+        query = func.to_tsquery(
+            self.config, " & ".join(f"{word}:*" for word in words) or "''"
+        )
+        return (
+            select(
+                [
+                    searchable.c.id.label("id"),
+                    (
+                        func.ts_rank(searchable.c.search_vector, query)
+                        + func.similarity(searchable.c.name, term)
+                    ).label("rank"),
+                ]
+            )
+            .where(
+                or_(
+                    searchable.c.search_vector.op("@@")(query),
+                    searchable.c.name.ilike(f"%{term}%"),
+                    # pg_trgm's similarity operator, "%" escaped for psycopg2
+                    searchable.c.name.op("%%")(term),
+                )
+            )
+            .alias("search_hits")
+        )
+
+
+class SqliteSearch:
+    """FTS5 virtual tables, one per model, synced by triggers"""
+
+    # bm25 weights for name, city, state and genres
+    weights = (10.0, 2.0, 1.0, 1.0)
+
+    def __init__(self):
+        self._installed = set()
+
+    def install(self, connection, tablename):
+        """Create the FTS table and its triggers, filling it if it is new"""
+        fts = f"{tablename}_fts"
+        exists = connection.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :n"),
+            n=fts,
+        ).scalar()
+        if exists:
+            return
+        columns = ", ".join(DOCUMENT_COLUMNS)
+        document = (
+            f"SELECT t.id, t.name, t.city, t.state, "
+            f"(SELECT group_concat(g.name, ' ') FROM {tablename}_genre tg "
+            f"JOIN genre g ON g.id = tg.genre_id WHERE tg.{tablename}_id = t.id) "
+            f"FROM {tablename} t"
+        )
+
+        def refresh(owner):
+            return (
+                f"DELETE FROM {fts} WHERE rowid = {owner}; "
+                f"INSERT INTO {fts} (rowid, {columns}) "
+                f"{document} WHERE t.id = {owner};"
+            )
+
+        connection.execute(f"CREATE VIRTUAL TABLE {fts} USING fts5({columns})")
+        # Persist the column weights so the hidden rank column uses them
+        weights = ", ".join(str(w) for w in self.weights)
+        connection.execute(
+            f"INSERT INTO {fts} ({fts}, rank) VALUES ('rank', 'bm25({weights})')"
+        )
+        triggers = {
+            "insert": f"AFTER INSERT ON {tablename} BEGIN {refresh('new.id')}",
+            "update": f"AFTER UPDATE ON {tablename} BEGIN "
+            f"DELETE FROM {fts} WHERE rowid = old.id; {refresh('new.id')}",
+            "delete": f"AFTER DELETE ON {tablename} BEGIN "
+            f"DELETE FROM {fts} WHERE rowid = old.id;",
+            # Genres live in the association table, re-index on every change
+            "genre_insert": f"AFTER INSERT ON {tablename}_genre BEGIN "
+            f"{refresh(f'new.{tablename}_id')}",
+            "genre_delete": f"AFTER DELETE ON {tablename}_genre BEGIN "
+            f"{refresh(f'old.{tablename}_id')}",
+        }
+        for name, body in triggers.items():
+            connection.execute(f"CREATE TRIGGER {fts}_{name} {body} END")
+        connection.execute(f"INSERT INTO {fts} (rowid, {columns}) {document}")
+
+    def matches(self, model, term):
+        tablename = model.__tablename__
+        # The engine the session reads from, a replica during read requests
+        engine = db.session.get_bind()
+        if (engine.url, tablename) not in self._installed:
+            with engine.begin() as connection:
+                self.install(connection, tablename)
+            self._installed.add((engine.url, tablename))
+        fts = table(f"{tablename}_fts", column("rowid"), column("rank"))
+        # Quote every word so user input can not inject FTS5 syntax
+        query = " AND ".join(f'"{word}"*' for word in _words(term))
+        return (
+            # bm25 is "lower is better", rank is "higher is better"
+            select([fts.c.rowid.label("id"), (-fts.c.rank).label("rank")])
+            .where(text(f"{fts.name} MATCH :fts_query").bindparams(fts_query=query))
+            .alias("search_hits")
+        )
+
+
+class SearchEngine:
+    """Pick the search backend that fits the database the app is bound to"""
+
+    def __init__(self):
+        self._backends = {}
+
+    def backend(self):
+        engine = db.engine
+        if engine not in self._backends:
+            self._backends[engine] = self._make_backend(engine)
+        return self._backends[engine]
+
+    @staticmethod
+    def _make_backend(engine):
+        if engine.dialect.name == "postgresql":
+            return PostgresSearch()
+        if engine.dialect.name == "sqlite":
+            try:
+                with engine.connect() as connection:
+                    connection.execute(
+                        "CREATE VIRTUAL TABLE temp.fts5_probe USING fts5(x)"
+                    )
+                    connection.execute("DROP TABLE temp.fts5_probe")
+            except OperationalError:
+                return LikeSearch()
+            return SqliteSearch()
+        return LikeSearch()
+
+    def matches(self, model, term):
+        """Subquery of (id, rank) for the rows of model matching term.
+
+        Returns None when the term has no words, which means "match all".
+        """
+        if not _words(term):
+            return None
+        return self.backend().matches(model, term.strip())
+
+
+search_engine = SearchEngine()
@@ -0,0 +1,91 @@
+# ----------------------------------------------------------------------------#
+# Shows.
+# ----------------------------------------------------------------------------#
+"""The show listing and form, the ``shows`` blueprint."""
+
+from flask import Blueprint, current_app, flash, render_template, request, url_for
+
+from bookings import conflicts, describe
+from models import Show, db
+from queries import show_feed
+from views import indexes_changed, pages_changed, parse_date
+
+show_pages = Blueprint("shows", __name__)
+
+
+@show_pages.route("/shows")
+def shows():
+    # displays list of shows at /shows, one page at a time
+    config = current_app.config
+    filters = {
+        "from": request.args.get("from", type=parse_date),
+        "to": request.args.get("to", type=parse_date),
+        "per_page": min(
+            request.args.get("per_page", config["SHOWS_PER_PAGE"], type=int),
+            config["SHOWS_PER_PAGE_MAX"],
+        ),
+    }
+    feed = show_feed(
+        after=request.args.get("after"),
+        start=filters["from"],
+        end=filters["to"],
+        per_page=max(filters["per_page"], 1),
+    )
+    next_url = None
+    if feed["next_cursor"]:
+        next_url = url_for(
+            ".shows",
+            after=feed["next_cursor"],
+            **{k: request.args[k] for k in filters if k in request.args},
+        )
+    return render_template("pages/shows.html", shows=feed["shows"], next_url=next_url)
+
+
+@show_pages.route("/shows/create")
+def create_shows():
+    # renders form. do not touch.
+    from forms import NewShowForm
+
+    form = NewShowForm()
+    return render_template("forms/new_show.html", form=form)
+
+
+@show_pages.route("/shows/create", methods=["POST"])
+def create_show_submission():
+    # called to create new shows in the db, upon submitting new show listing form
+    from forms import NewShowForm
+
+    form = NewShowForm()
+    # The template renders no CSRF token, so the fields the booking check
+    # needs are validated one by one rather than with form.validate()
+    errors = [
+        f"{field.label.text}: {field.errors[0]}"
+        for field in (form.start_time, form.duration)
+        if not field.validate(form)
+    ]
+    if errors:
+        flash(f"Show was not listed! {' '.join(errors)}", "error")
+        return render_template("pages/home.html")
+    show = Show()
+    form.populate_obj(show)
+    try:
+        clashes = conflicts(show, lock=True)
+        if clashes:
+            db.session.rollback()
+            flash(f"Show was not listed! {describe(show, clashes)}.", "error")
+            return render_template("pages/home.html")
+        db.session.add(show)
+        pages_changed("venue", show.venue_id)
+        pages_changed("artist", show.artist_id)
+        # A new upcoming show moves both up the suggestions, and books them
+        # together
+        indexes_changed("venue", show.venue_id)
+        indexes_changed("artist", show.artist_id)
+        db.session.commit()
+        # on successful db insert, flash success
+        flash("Show was successfully listed!")
+    except Exception as e:
+        current_app.logger.warn(e)
+        flash("Show was not successfully listed!", "error")
+        db.session.rollback()
+    return render_template("pages/home.html")
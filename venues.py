@@ -0,0 +1,249 @@
+# ----------------------------------------------------------------------------#
+# Venues.
+# ----------------------------------------------------------------------------#
+"""The venue pages and forms, the ``venues`` blueprint."""
+
+from datetime import datetime, timedelta
+
+from flask import (
+    Blueprint,
+    current_app,
+    flash,
+    jsonify,
+    redirect,
+    render_template,
+    request,
+    url_for,
+)
+
+from bookings import free_slots
+from cache import page_cache
+from models import Show, Venue, db
+from queries import (
+    counterpart_ids,
+    detail_page,
+    detail_statements,
+    fetch_all,
+    search_results,
+    venue_areas,
+    venues_near,
+)
+from search import search_engine
+from views import (
+    as_dict,
+    indexes_changed,
+    not_found_error,
+    pages_changed,
+    parse_date,
+    past_shows_since,
+)
+
+venue_pages = Blueprint("venues", __name__)
+
+
+@venue_pages.route("/venues")
+def venues():
+    return render_template(
+        "pages/venues.html", areas=venue_areas(genre=request.args.get("genre"))
+    )
+
+
+@venue_pages.route("/venues/search", methods=["POST"])
+def search_venues():
+    search_term = request.form.get("search_term", "")
+    response = search_results(
+        Venue,
+        search_engine.matches(Venue, search_term),
+        limit=request.args.get("limit", type=int),
+        offset=request.args.get("offset", 0, type=int),
+    )
+    return render_template(
+        "pages/search_venues.html",
+        results=response,
+        search_term=request.form.get("search_term", ""),
+    )
+
+
+@venue_pages.route("/venues/<int:venue_id>")
+@page_cache.cached("venue", "venue_id")
+def show_venue(venue_id):
+    # shows the venue page with the given venue_id
+    since = past_shows_since()
+    statements = detail_statements(
+        "venue",
+        venue_id,
+        past_limit=current_app.config["PAST_SHOWS_LIMIT"],
+        past_since=since,
+    )
+    data = detail_page("venue", fetch_all(statements), since)
+    if data is None:
+        return not_found_error(f"Venue with id {venue_id} not found")
+    return render_template("pages/show_venue.html", venue=data)
+
+
+@venue_pages.route("/venues/<int:venue_id>/availability")
+def venue_availability(venue_id):
+    # the busy and free slots of a venue between ?from= and ?to=, as JSON
+    if Venue.query.get(venue_id) is None:
+        return jsonify({"error": f"Venue with id {venue_id} not found"}), 404
+    start = request.args.get("from", type=parse_date) or datetime.now()
+    end = request.args.get("to", type=parse_date) or start + timedelta(days=7)
+    start, end = start.replace(tzinfo=None), end.replace(tzinfo=None)
+    longest = timedelta(days=current_app.config["AVAILABILITY_MAX_DAYS"])
+    if not start < end <= start + longest:
+        return (
+            jsonify(
+                {
+                    "error": "to must be after from, and at most "
+                    f"{longest.days} days later"
+                }
+            ),
+            400,
+        )
+    busy, free = free_slots(venue_id, start, end)
+    return jsonify(
+        {
+            "venue_id": venue_id,
+            "from": start.isoformat(),
+            "to": end.isoformat(),
+            "busy": [{"start": s.isoformat(), "end": e.isoformat()} for s, e in busy],
+            "free": [{"start": s.isoformat(), "end": e.isoformat()} for s, e in free],
+        }
+    )
+
+
+@venue_pages.route("/venues/near")
+def venues_nearby():
+    # venues within ?radius= km of ?lat=&lon=, nearest first, as JSON
+    config = current_app.config
+    latitude = request.args.get("lat", type=float)
+    longitude = request.args.get("lon", type=float)
+    radius = request.args.get("radius", config["NEAR_RADIUS_KM"], type=float)
+    limit = request.args.get("limit", config["NEAR_LIMIT"], type=int)
+    if latitude is None or longitude is None:
+        return jsonify({"error": "lat and lon are required"}), 400
+    if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+        return jsonify({"error": "lat or lon out of range"}), 400
+    if not 0 < radius <= config["NEAR_RADIUS_MAX_KM"]:
+        return (
+            jsonify(
+                {
+                    "error": "radius must be above 0 and at most "
+                    f"{config['NEAR_RADIUS_MAX_KM']} km"
+                }
+            ),
+            400,
+        )
+    limit = max(1, min(limit, config["NEAR_LIMIT_MAX"]))
+    return jsonify(
+        {
+            "lat": latitude,
+            "lon": longitude,
+            "radius_km": radius,
+            "venues": venues_near(latitude, longitude, radius, limit),
+        }
+    )
+
+
+#  Create Venue
+#  ----------------------------------------------------------------
+
+
+@venue_pages.route("/venues/create", methods=["GET"])
+def create_venue_form():
+    from forms import VenueForm
+
+    form = VenueForm()
+    return render_template("forms/new_venue.html", form=form)
+
+
+@venue_pages.route("/venues/create", methods=["POST"])
+def create_venue_submission():
+    from forms import VenueForm
+
+    form = VenueForm()
+    venue = Venue()
+    form.populate_obj(venue)
+    try:
+        db.session.add(venue)
+        db.session.flush()
+        indexes_changed("venue", venue.id)
+        db.session.commit()
+        flash("Venue " + request.form["name"] + " was successfully listed!")
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.info(e)
+        flash(
+            f'An error occurred. Venue {request.form["name"]} could not be listed.',
+            "error",
+        )
+    return render_template("pages/home.html", form=form, data=venue)
+
+
+@venue_pages.route("/venues/<venue_id>", methods=["DELETE"])
+def delete_venue(venue_id):
+    venue = Venue.query.get(venue_id)
+    if venue is None:
+        return not_found_error(f"Venue with id {venue_id} not found")
+    artist_ids = counterpart_ids(Show.venue_id, Show.artist_id, venue.id)
+    try:
+        db.session.delete(venue)
+        pages_changed("venue", venue.id)
+        pages_changed("artist", *artist_ids)
+        indexes_changed("venue", venue.id)
+        db.session.commit()
+        flash("Venue " + request.form["name"] + " was successfully deleted!")
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.info(e)
+        flash(
+            f'An error occurred. Venue {request.form["name"]} could not be deleted.',
+            "error",
+        )
+
+    # TODO: BONUS CHALLENGE: Implement a button to delete a Venue on a Venue Page, have it so that
+    # clicking that button delete it from the db then redirect the user to the homepage
+    # A response, so that the deleting client is pinned to the primary; 303 as
+    # a 302 would be followed with DELETE
+    return redirect(url_for("index"), 303)
+
+
+#  Update
+#  ----------------------------------------------------------------
+
+
+@venue_pages.route("/venues/<int:venue_id>/edit", methods=["GET"])
+def edit_venue(venue_id):
+    from forms import VenueForm
+
+    venue = Venue.query.get(venue_id)
+    if venue is None:
+        return not_found_error(f"Venue with id {venue_id} not found")
+    form = VenueForm(obj=venue)
+    return render_template("forms/edit_venue.html", form=form, venue=venue)
+
+
+@venue_pages.route("/venues/<int:venue_id>/edit", methods=["POST"])
+def edit_venue_submission(venue_id):
+    from forms import VenueForm
+
+    venue = Venue.query.get(venue_id)
+    if venue is None:
+        return not_found_error(f"Venue with id {venue_id} not found")
+    form = VenueForm(data=as_dict(venue))
+    form.populate_obj(venue)
+    try:
+        db.session.add(venue)
+        # The venue's name and image also show on the pages of its artists
+        pages_changed("venue", venue_id, counterparts=True)
+        indexes_changed("venue", venue_id)
+        db.session.commit()
+        flash("Venue " + request.form["name"] + " was successfully edited!")
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.info(e)
+        flash(
+            f'An error occurred. Edited venue {request.form["name"]} could not be saved.',
+            "error",
+        )
+    return redirect(url_for(".show_venue", venue_id=venue_id))
@@ -0,0 +1,97 @@
+# ----------------------------------------------------------------------------#
+# Views.
+# ----------------------------------------------------------------------------#
+"""The home and error pages, and what the page blueprints share.
+
+The venue, artist and show pages are the ``venues``, ``artists`` and
+``shows`` blueprints of ``venues.py``, ``artists.py`` and ``shows.py``,
+registered by ``app.create_app()``.  Their endpoints are named after the
+blueprint, e.g. ``url_for("venues.show_venue", venue_id=1)``.
+
+What a write changes besides its rows -- cached pages, the in-process
+indexes -- is brought up to date by jobs (``jobs.py``) the routes queue with
+``pages_changed()`` and ``indexes_changed()`` before they commit.
+"""
+
+from flask import current_app, render_template, request
+
+from autocomplete import autocomplete
+from cache import page_cache
+from jobs import job_queue
+from matches import matcher
+from models import Show
+from partitions import history_start
+from queries import counterpart_ids
+
+# The artists of a venue and the venues of an artist, their shows together
+COUNTERPARTS = {
+    "venue": (Show.venue_id, Show.artist_id, "artist"),
+    "artist": (Show.artist_id, Show.venue_id, "venue"),
+}
+
+
+def index():
+    return render_template("pages/home.html")
+
+
+def not_found_error(error):
+    return render_template("errors/404.html"), 404
+
+
+def server_error(error):
+    return render_template("errors/500.html"), 500
+
+
+def parse_date(value):
+    """Parse a date or datetime query argument, raises ValueError if invalid"""
+    import dateutil.parser
+
+    return dateutil.parser.isoparse(value)
+
+
+def past_shows_since():
+    """Since when a venue or artist page lists past shows, None for ever"""
+    if request.args.get("history") == "all":
+        return None
+    return history_start(current_app.config["PAST_SHOWS_MONTHS"])
+
+
+@job_queue.task("invalidate_pages")
+def invalidate_pages(kind, ids, counterparts=False):
+    """Drop the cached pages of the venues or artists, and with counterparts
+    those of the artists or venues they have shows with"""
+    page_cache.invalidate(kind, *ids)
+    if counterparts:
+        column, other, other_kind = COUNTERPARTS[kind]
+        for id in ids:
+            page_cache.invalidate(other_kind, *counterpart_ids(column, other, id))
+
+
+@job_queue.task("update_indexes")
+def update_indexes(kind, ids):
+    """Read the venues or artists into the in-process indexes again"""
+    for extension in (autocomplete, matcher):
+        extension.changed(kind, *ids)
+
+
+def pages_changed(kind, *ids, counterparts=False):
+    """Have the pages of venues or artists invalidated once the transaction
+    commits, by any process when the cache is shared"""
+    job_queue.after_commit(
+        invalidate_pages, kind, list(ids), counterparts, durable=page_cache.shared
+    )
+
+
+def indexes_changed(kind, *ids):
+    """Have the indexes of this process updated once the transaction changing
+    venues or artists commits"""
+    job_queue.after_commit(update_indexes, kind, list(ids))
+
+
+def as_dict(instance):
+    """Get the db.Model instance as a python dict"""
+    try:
+        instance_dict = instance.__dict__
+    except AttributeError:
+        return None
+    return {k: instance_dict[k] for k in instance_dict if k[0] != "_"}